@@ -0,0 +1,70 @@
+"""
+Measure the hack assembler phases on Pong.asm and a large synthetic program.
+
+    python benchmarks/bench_assembler.py [synthetic lines]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from hack_assembler.parser import parse_file
+from hack_assembler.assembler import (build_symbol_table, encode_program,
+                                      render_text)
+
+import programs
+
+# Jumps only to the first blocks, so the label values fit in A instruction
+# even when the program is larger than the ROM.
+SYNTHETIC_BLOCK = """\
+(LOOP.{0})
+@SP
+AM=M-1
+D=M
+@Main.{1}
+M=D
+@LOOP.{1}
+D;JGT
+"""
+
+
+def write_synthetic_program(path, lines):
+    with open(path, 'wb') as asm_file:
+        block_lines = SYNTHETIC_BLOCK.count("\n")
+        for index in xrange(lines // block_lines):
+            asm_file.write(SYNTHETIC_BLOCK.format(index, index % 1000))
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+
+def bench(name, path):
+    assembly_lines, parse_time = timed(parse_file, path)
+    symbol_table, symbols_time = timed(build_symbol_table, assembly_lines)
+    words, encode_time = timed(encode_program, assembly_lines, symbol_table)
+    _, render_time = timed(render_text, words)
+    total = parse_time + symbols_time + encode_time + render_time
+    print "%-10s %8d words parse %6.3f symbols %6.3f encode %6.3f " \
+          "render %6.3f total %6.3f sec" % (name, len(words), parse_time,
+                                            symbols_time, encode_time,
+                                            render_time, total)
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    bench("Pong", os.path.join(programs.HACK_RESOURCES_DIR, "Pong.asm"))
+
+    fd, synthetic_path = tempfile.mkstemp(suffix=".asm")
+    os.close(fd)
+    try:
+        write_synthetic_program(synthetic_path, lines)
+        bench("synthetic", synthetic_path)
+    finally:
+        os.remove(synthetic_path)
+
+
+if __name__ == "__main__":
+    main()
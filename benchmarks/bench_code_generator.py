@@ -0,0 +1,120 @@
+"""
+Measure the vm translator throughput (vm instructions per second) over a
+synthetic program of about a million instructions, parsing and code
+generation apart, for the code generator options.
+
+    python benchmarks/bench_code_generator.py [instructions]
+"""
+import sys
+import time
+
+from vm_translator.code_generator import CodeGenerator
+from vm_translator.optimizer import optimize
+from vm_translator.parser import parse_vm_file_content
+
+# Body of the synthetic functions, a mix of the jack compiler output
+# (%(name)s is the function name).
+FUNCTION_TEMPLATE = """\
+function %(name)s 2
+push argument 0
+push constant 1
+add
+pop local 0
+push local 0
+push argument 1
+lt
+not
+if-goto %(name)s.END
+push this 2
+push that 7
+sub
+neg
+pop this 3
+push pointer 0
+pop temp 0
+push static 4
+push constant 3
+and
+pop static 5
+label %(name)s.LOOP
+push local 1
+push constant 10
+gt
+if-goto %(name)s.END
+push local 1
+push constant 1
+add
+pop local 1
+push argument 0
+push local 1
+call %(callee)s 2
+pop temp 1
+push local 0
+push local 1
+eq
+push constant 0
+or
+pop local 0
+goto %(name)s.LOOP
+label %(name)s.END
+push local 0
+return
+"""
+
+OPTIONS = (
+    ("default", {}),
+    ("shared calls", dict(shared_calls=True)),
+    ("cache top", dict(cache_top=True)),
+    ("track sp", dict(cache_top=True, track_sp=True)),
+)
+
+
+def make_program(instructions):
+    """
+    :return: The content of vm file of about the given number of
+    instructions.
+    """
+    function_size = FUNCTION_TEMPLATE.count("\n")
+    functions = []
+    for index in xrange(max(1, instructions // function_size)):
+        functions.append(FUNCTION_TEMPLATE % dict(
+            name="Bench.f%d" % index, callee="Bench.f%d" % (index // 2)))
+    return "".join(functions)
+
+
+def translate(instructions, options):
+    code_generator = CodeGenerator(**options)
+    code_generator.set_current_file("Bench.vm")
+    for instruction in instructions:
+        code_generator.process_instruction(instruction)
+    return code_generator.get_file_code()
+
+
+def report(name, count, seconds):
+    print "%-20s %8d instructions %7.3f sec %10.0f instructions/sec" % (
+        name, count, seconds, count / seconds)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    content = make_program(count)
+
+    start = time.time()
+    instructions = parse_vm_file_content(content)
+    report("parse", len(instructions), time.time() - start)
+
+    for name, options in OPTIONS:
+        start = time.time()
+        translate(instructions, options)
+        report(name, len(instructions), time.time() - start)
+
+    start = time.time()
+    optimized = optimize(instructions)
+    report("optimize", len(instructions), time.time() - start)
+    start = time.time()
+    translate(optimized, dict(cache_top=True, track_sp=True))
+    report("optimized track sp", len(optimized), time.time() - start)
+
+
+if __name__ == "__main__":
+    main()
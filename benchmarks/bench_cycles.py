@@ -0,0 +1,121 @@
+"""
+Compare the number of cycles programs run with the vm translator options,
+until they halt (the infinite loop at the end of Sys.init of the vm
+fixtures, the end of the MemoryAccess fixtures, or Sys.halt of jack
+programs).
+
+    python benchmarks/bench_cycles.py [max cycles]
+"""
+import functools
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+
+from hack_emulator import consts
+from hack_emulator.jit import JitEmulator
+from vm_translator.inliner import MAX_INLINE_SIZE
+from vm_translator.optimizer import PATTERNS
+
+import programs
+
+OPTIONS = [
+    ("default", dict()),
+    ("shared", dict(shared_calls=True)),
+    ("optimize", dict(optimizations=PATTERNS)),
+    ("shared+opt", dict(shared_calls=True, optimizations=PATTERNS)),
+    ("cache", dict(cache_top=True)),
+    ("sp", dict(track_sp=True)),
+    ("sh+opt+sp", dict(shared_calls=True, optimizations=PATTERNS,
+                       track_sp=True)),
+    ("inline", dict(inline_max_size=MAX_INLINE_SIZE)),
+    ("sh+opt+lt", dict(shared_calls=True, optimizations=PATTERNS,
+                       light_calls=True)),
+    ("sh+opt+in", dict(shared_calls=True, optimizations=PATTERNS,
+                       intrinsics=True)),
+    ("all", dict(shared_calls=True, optimizations=PATTERNS,
+                 remove_dead_functions=True, cache_top=True, track_sp=True,
+                 inline_max_size=MAX_INLINE_SIZE, light_calls=True,
+                 intrinsics=True)),
+]
+
+VM_FIXTURES = [
+    "MemoryAccess/BasicTest",
+    "MemoryAccess/PointerTest",
+    "MemoryAccess/StaticTest",
+    "FunctionCalls/NestedCall",
+    "FunctionCalls/FibonacciElement",
+    "FunctionCalls/StaticsTest",
+]
+
+# Compiled with the OS, run without input until Sys.halt.
+JACK_FIXTURES = [
+    "1_Seven",
+    "2_ConvertToBin",
+    "3.5_Arrays",
+    "6_ComplexArrays",
+    "5_Pong",
+]
+
+HALT_FUNCTION = "Sys.halt"
+
+
+def run(translate, max_cycles):
+    """
+    :param translate: function(asm_path, **translate_options).
+    :return: tuple of (cycles, digest of the screen) or None if the program
+    does not fit in the ROM.
+    """
+    work_dir = tempfile.mkdtemp(prefix="cycles_")
+    try:
+        asm_path = os.path.join(work_dir, "Program.asm")
+        translate(asm_path)
+        try:
+            rom, symbol_table = programs.assemble_program(asm_path)
+        except AssertionError:
+            # The assembler rejects programs larger than the ROM.
+            return None
+    finally:
+        shutil.rmtree(work_dir)
+
+    if HALT_FUNCTION in symbol_table:
+        programs.halt_at(rom, symbol_table[HALT_FUNCTION])
+    emulator = JitEmulator(rom)
+    cycles = emulator.run(max_cycles)
+    screen = emulator.ram[consts.SCREEN:consts.KBD].tostring()
+    return cycles, hashlib.md5(screen).hexdigest()
+
+
+def measure(name, translate, max_cycles):
+    results = [run(functools.partial(translate, **translate_options),
+                   max_cycles)
+               for _, translate_options in OPTIONS]
+
+    screens = set(result[1] for result in results if result is not None)
+    columns = " ".join("%11d" % result[0] if result is not None
+                       else "%11s" % "-"
+                       for result in results)
+    print "%-32s %s%s" % (name, columns,
+                          "  screen differs!" if len(screens) > 1 else "")
+
+
+def main():
+    max_cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 9
+    print "%-32s %s" % ("program", " ".join("%11s" % name
+                                            for name, _ in OPTIONS))
+    for fixture in VM_FIXTURES:
+        vm_dir = os.path.join(programs.VM_FIXTURES_DIR, fixture)
+        measure(fixture, functools.partial(programs.translate_vm_program,
+                                           vm_dir=vm_dir), max_cycles)
+
+    for fixture in JACK_FIXTURES:
+        source_dir = os.path.join(programs.COMPILER_FIXTURES_DIR, fixture)
+        measure(fixture, functools.partial(
+            programs.translate_jack_program,
+            source_dirs=[programs.JACK_OS_DIR, source_dir]), max_cycles)
+    print "(- does not fit in the ROM)"
+
+
+if __name__ == "__main__":
+    main()
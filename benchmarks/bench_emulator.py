@@ -0,0 +1,32 @@
+"""
+Measure the hack emulator throughput (millions of instructions per second).
+
+    python benchmarks/bench_emulator.py [cycles]
+"""
+import sys
+import time
+
+from hack_emulator.emulator import HackEmulator
+
+import programs
+
+
+def bench(name, rom, cycles):
+    emulator = HackEmulator(rom)
+    start = time.time()
+    executed = emulator.run(cycles)
+    elapsed = time.time() - start
+    print "%-10s %10d instructions %6.2f sec %6.2f MIPS%s" % (
+        name, executed, elapsed, executed / elapsed / 10 ** 6,
+        " (halted)" if emulator.halted else "")
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 5 * 10 ** 6
+    bench("Pong", programs.load_hack_resource("Pong"), cycles)
+    bench("jack2048",
+          programs.build_jack2048(**programs.FIT_ROM_OPTIONS), cycles)
+
+
+if __name__ == "__main__":
+    main()
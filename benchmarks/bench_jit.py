@@ -0,0 +1,38 @@
+"""
+Compare the hack emulator interpreter with the basic block JIT.
+
+    python benchmarks/bench_jit.py [cycles]
+"""
+import sys
+import time
+
+from hack_emulator.emulator import HackEmulator
+from hack_emulator.jit import JitEmulator
+
+import programs
+
+
+def timed_run(emulator, cycles):
+    start = time.time()
+    executed = emulator.run(cycles)
+    return executed, time.time() - start
+
+
+def bench(name, rom, cycles):
+    executed, interpreter_time = timed_run(HackEmulator(rom), cycles)
+    _, jit_time = timed_run(JitEmulator(rom), cycles)
+    print "%-12s %10d instructions interpreter %6.2f sec jit %6.2f sec " \
+          "(x%.1f)" % (name, executed, interpreter_time, jit_time,
+                       interpreter_time / jit_time)
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 5 * 10 ** 6
+    bench("Pong.hack", programs.load_hack_resource("Pong"), cycles)
+    for fixture in ("5_Pong", "7_jack2048"):
+        bench(fixture, programs.build_compiler_fixture(
+            fixture, **programs.FIT_ROM_OPTIONS), cycles)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Measure the assembler parser throughput (lines per second) on PongL.asm and
+a large synthetic program.
+
+    python benchmarks/bench_parser.py [synthetic lines]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from hack_assembler.parser import iter_parse_lines
+
+import programs
+from bench_assembler import write_synthetic_program
+
+REPEAT = 10
+
+
+def bench(name, path, repeat=1):
+    lines = open(path, 'rt').read().splitlines()
+    start = time.time()
+    for _ in xrange(repeat):
+        for _ in iter_parse_lines(lines):
+            pass
+    elapsed = (time.time() - start) / repeat
+    print "%-10s %8d lines %7.3f sec %10.0f lines/sec" % (
+        name, len(lines), elapsed, len(lines) / elapsed)
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    bench("PongL", os.path.join(programs.HACK_RESOURCES_DIR, "PongL.asm"),
+          repeat=REPEAT)
+
+    fd, synthetic_path = tempfile.mkstemp(suffix=".asm")
+    os.close(fd)
+    try:
+        write_synthetic_program(synthetic_path, lines)
+        bench("synthetic", synthetic_path)
+    finally:
+        os.remove(synthetic_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compare the ROM size of programs translated with the vm translator options.
+
+    python benchmarks/bench_rom_size.py
+"""
+import functools
+import os
+import shutil
+import tempfile
+
+from hack_emulator.consts import ROM_SIZE
+from vm_translator.inliner import MAX_INLINE_SIZE
+from vm_translator.optimizer import PATTERNS
+
+import programs
+
+# Map between option set name to the vm translator options.
+OPTIONS = [
+    ("default", dict()),
+    ("shared", dict(shared_calls=True)),
+    ("optimize", dict(optimizations=PATTERNS)),
+    ("shared+opt", dict(shared_calls=True, optimizations=PATTERNS)),
+    ("dead", dict(remove_dead_functions=True)),
+    ("cache", dict(cache_top=True)),
+    ("sp", dict(track_sp=True)),
+    ("inline", dict(inline_max_size=MAX_INLINE_SIZE)),
+    ("light", dict(light_calls=True)),
+    ("intrinsics", dict(intrinsics=True)),
+    ("all", dict(shared_calls=True, optimizations=PATTERNS,
+                 remove_dead_functions=True, cache_top=True, track_sp=True,
+                 inline_max_size=MAX_INLINE_SIZE, light_calls=True,
+                 intrinsics=True)),
+]
+
+VM_FIXTURES = [
+    "MemoryAccess/BasicTest",
+    "MemoryAccess/PointerTest",
+    "MemoryAccess/StaticTest",
+    "FunctionCalls/SimpleFunction",
+    "FunctionCalls/NestedCall",
+    "FunctionCalls/FibonacciElement",
+    "FunctionCalls/StaticsTest",
+]
+
+
+def measure(name, translate, options=OPTIONS):
+    """
+    :param translate: function(asm_path, **translate_options).
+    """
+    work_dir = tempfile.mkdtemp(prefix="rom_size_")
+    try:
+        sizes = []
+        for _, translate_options in options:
+            asm_path = os.path.join(work_dir, "Program.asm")
+            translate(asm_path, **translate_options)
+            sizes.append(programs.count_rom_words(asm_path))
+    finally:
+        shutil.rmtree(work_dir)
+
+    columns = " ".join("%10d%s" % (size, "*" if size > ROM_SIZE else " ")
+                       for size in sizes)
+    print "%-32s %s" % (name, columns)
+
+
+def main():
+    print "%-32s %s" % ("program", " ".join("%11s" % name
+                                            for name, _ in OPTIONS))
+    for fixture in VM_FIXTURES:
+        vm_dir = os.path.join(programs.VM_FIXTURES_DIR, fixture)
+        measure(fixture, functools.partial(programs.translate_vm_program,
+                                           vm_dir=vm_dir))
+
+    measure("jack2048 + OS",
+            functools.partial(programs.translate_jack_program,
+                              source_dirs=[programs.JACK_OS_DIR,
+                                           programs.JACK2048_DIR]))
+    print "(* does not fit in the %d words ROM)" % ROM_SIZE
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Run the jack fixtures (compiled with the OS) with the vm interpreter until
+Sys.halt, and check that the screen is the same as the one of the hack
+program (translated, assembled and run with the jit emulator).
+
+    python benchmarks/bench_vm_interpreter.py [max steps]
+"""
+import array
+import functools
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from vm_translator.interpreter import load_vm_program
+from vm_translator.optimizer import PATTERNS
+
+import bench_cycles
+import programs
+
+SCREEN = 0x4000
+KBD = 0x6000
+
+# The hack program must fit in the ROM.
+TRANSLATE_OPTIONS = dict(shared_calls=True, optimizations=PATTERNS,
+                         cache_top=True)
+
+
+def interpret(source_dirs, max_steps):
+    """
+    :return: tuple of (VMInterpreter after the run, seconds).
+    """
+    work_dir = tempfile.mkdtemp(prefix="vm_interpreter_")
+    try:
+        programs.compile_jack_program(work_dir, source_dirs)
+        interpreter = load_vm_program(work_dir)
+    finally:
+        shutil.rmtree(work_dir)
+
+    interpreter.bootstrap()
+    start = time.time()
+    interpreter.run(max_steps)
+    return interpreter, time.time() - start
+
+
+def screen_digest(interpreter):
+    # Like the digest of the emulator RAM (signed 16 bit words).
+    screen = array.array('h', interpreter.ram[SCREEN:KBD])
+    return hashlib.md5(screen.tostring()).hexdigest()
+
+
+def main():
+    max_steps = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 8
+    print "%-20s %10s %8s %10s %7s  %s" % ("program", "steps", "seconds",
+                                           "steps/sec", "screen",
+                                           "most called")
+    for fixture in bench_cycles.JACK_FIXTURES:
+        source_dirs = [programs.JACK_OS_DIR,
+                       os.path.join(programs.COMPILER_FIXTURES_DIR, fixture)]
+        interpreter, seconds = interpret(source_dirs, max_steps)
+
+        _, hack_digest = bench_cycles.run(
+            functools.partial(programs.translate_jack_program,
+                              source_dirs=source_dirs, **TRANSLATE_OPTIONS),
+            max_cycles=10 ** 9)
+        print "%-20s %10d %8.2f %10d %7s  %s" % (
+            fixture, interpreter.steps, seconds, interpreter.steps / seconds,
+            "same" if screen_digest(interpreter) == hack_digest else "DIFFERS",
+            ", ".join("%s %d" % item
+                      for item in interpreter.call_counts.most_common(3)))
+
+
+if __name__ == "__main__":
+    main()
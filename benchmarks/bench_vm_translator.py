@@ -0,0 +1,73 @@
+"""
+Measure the vm translator wall time on jack2048 + OS, and on a directory
+of copies of it, with the files translated across process pools of
+different sizes.
+
+    python benchmarks/bench_vm_translator.py [copies]
+"""
+import hashlib
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from vm_translator.main import translate_to_hack
+
+import programs
+
+
+def make_copies(vm_paths, copies, work_dir):
+    """
+    Copy the vm files under other names (the files are translated apart,
+    so the copies are as much work as different files).
+    :return: list of the copies paths.
+    """
+    paths = []
+    for copy in xrange(copies):
+        for vm_path in vm_paths:
+            name = "C%d%s" % (copy, os.path.basename(vm_path))
+            path = os.path.join(work_dir, name)
+            shutil.copy(vm_path, path)
+            paths.append(path)
+    return sorted(paths)
+
+
+def bench(name, vm_paths, asm_path):
+    # None - the default of translate_to_hack (see POOL_MIN_SIZE).
+    process_counts = [None] + sorted(set([1, 2, 4,
+                                          multiprocessing.cpu_count()]))
+    digests = set()
+    for processes in process_counts:
+        start = time.time()
+        translate_to_hack(vm_paths, asm_path, processes=processes)
+        seconds = time.time() - start
+        digests.add(hashlib.md5(open(asm_path, 'rb').read()).hexdigest())
+        print "%-20s %4d files %9s processes %7.3f sec" % (
+            name, len(vm_paths),
+            "default" if processes is None else processes, seconds)
+    if len(digests) != 1:
+        print "%s: the output differs between the pool sizes!" % name
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    print "%d cpus" % multiprocessing.cpu_count()
+    work_dir = tempfile.mkdtemp(prefix="vm_translator_")
+    try:
+        vm_paths = programs.compile_jack_program(
+            work_dir, [programs.JACK_OS_DIR, programs.JACK2048_DIR])
+        asm_path = os.path.join(work_dir, "Program.asm")
+        bench("jack2048 + OS", vm_paths, asm_path)
+
+        copies_dir = os.path.join(work_dir, "copies")
+        os.mkdir(copies_dir)
+        bench("%d copies" % copies,
+              make_copies(vm_paths, copies, copies_dir), asm_path)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Helpers for building the sample programs of the repository into hack ROMs
+for the benchmarks. Requires the hack_assembler, vm_translator,
+jack_compiler and hack_emulator packages to be installed.
+"""
+import os
+import shutil
+import tempfile
+
+from jack_compiler.compiler import JackCompiler
+from vm_translator.main import translate_to_hack
+from vm_translator.optimizer import PATTERNS
+from hack_assembler.assembler import compile_file, assemble
+from hack_assembler.optimizer import count_words
+from hack_assembler.parser import parse_file
+from hack_emulator.emulator import parse_hack, load_hack_file
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+HACK_RESOURCES_DIR = os.path.join(REPO_ROOT, 'hack_assember', 'tests',
+                                  'hack_assembler', 'resources')
+JACK_OS_DIR = os.path.join(REPO_ROOT, 'jack_os', 'src')
+JACK2048_DIR = os.path.join(REPO_ROOT, 'jack2048')
+# 0;JMP
+HALT_JUMP_WORD = 0b1110101010000111
+
+# vm translator options which fit jack2048 and the OS in the ROM (about
+# 31K words, see vm_translator/README.md).
+FIT_ROM_OPTIONS = dict(shared_calls=True, optimizations=PATTERNS)
+
+VM_FIXTURES_DIR = os.path.join(REPO_ROOT, 'vm_translator', 'tests',
+                               'resources')
+COMPILER_FIXTURES_DIR = os.path.join(REPO_ROOT, 'jack_compiler', 'tests',
+                                     'jack_syntax_analyzer', 'resources',
+                                     'compiler')
+
+
+def load_hack_resource(name):
+    return load_hack_file(os.path.join(HACK_RESOURCES_DIR, name + ".hack"))
+
+
+def build_jack_program(*source_dirs, **translate_options):
+    """
+    Compile jack program all the way down to hack ROM words.
+    :param source_dirs: Directories with .jack files. Classes in later
+    directories replace classes with the same name in earlier ones (so pass
+    the OS directory first).
+    :param translate_options: Options of the vm translator.
+    :return: array of 16 bit words.
+    """
+    work_dir = tempfile.mkdtemp(prefix="jack_program_")
+    try:
+        asm_path = os.path.join(work_dir, "Program.asm")
+        translate_jack_program(asm_path, source_dirs, **translate_options)
+        return parse_hack(compile_file(asm_path))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def translate_jack_program(asm_path, source_dirs, **translate_options):
+    """
+    Compile jack program down to assembly.
+    :param asm_path: The output asm file. The intermediate .jack and .vm
+    files are written to its directory.
+    :param source_dirs: Directories with .jack files (see build_jack_program).
+    :param translate_options: Options of the vm translator.
+    """
+    vm_paths = compile_jack_program(os.path.dirname(asm_path), source_dirs)
+    translate_to_hack(vm_paths, asm_path, **translate_options)
+
+
+def compile_jack_program(work_dir, source_dirs):
+    """
+    Compile jack program to vm files.
+    :param work_dir: The directory the .jack and .vm files are written to.
+    :param source_dirs: Directories with .jack files (see build_jack_program).
+    :return: list of the vm files paths, sorted.
+    """
+    for source_dir in source_dirs:
+        for filename in os.listdir(source_dir):
+            if filename.endswith(".jack"):
+                shutil.copy(os.path.join(source_dir, filename), work_dir)
+
+    compiler = JackCompiler()
+    vm_paths = []
+    for filename in sorted(os.listdir(work_dir)):
+        if not filename.endswith(".jack"):
+            continue
+        jack_path = os.path.join(work_dir, filename)
+        vm_path = os.path.splitext(jack_path)[0] + ".vm"
+        _, bytecode = compiler.compile(open(jack_path).read())
+        open(vm_path, 'wb').write(bytecode)
+        vm_paths.append(vm_path)
+    return vm_paths
+
+
+def translate_vm_program(asm_path, vm_dir, **translate_options):
+    """
+    Translate the vm files of a directory (like the vm translator fixtures)
+    to assembly.
+    """
+    vm_paths = sorted(os.path.join(vm_dir, filename)
+                      for filename in os.listdir(vm_dir)
+                      if filename.endswith(".vm"))
+    translate_to_hack(vm_paths, asm_path, **translate_options)
+
+
+def count_rom_words(asm_path):
+    """
+    :return: The number of ROM words of asm file (without assembling it,
+    so programs larger than the ROM are counted as well).
+    """
+    return count_words(parse_file(asm_path))
+
+
+def build_jack2048(**translate_options):
+    return build_jack_program(JACK_OS_DIR, JACK2048_DIR, **translate_options)
+
+
+def build_compiler_fixture(name, **translate_options):
+    return build_jack_program(JACK_OS_DIR,
+                              os.path.join(COMPILER_FIXTURES_DIR, name),
+                              **translate_options)
+
+
+def assemble_program(asm_path):
+    """
+    :return: tuple of (array of 16 bit words, symbol table).
+    """
+    assembly = assemble(asm_path)
+    return assembly.words, assembly.symbol_table
+
+
+def halt_at(rom, address):
+    """
+    Replace the code at the address with halt loop ("@address / 0;JMP",
+    which the emulator detects), to stop the program when it gets there
+    (for example at Sys.halt).
+    """
+    rom[address] = address
+    rom[address + 1] = HALT_JUMP_WORD
@@ -1,11 +1,27 @@
 import os
 import ast
+import array
+import collections
+import itertools
 
 from hack_assembler import consts as c
-from hack_assembler.parser import (parse_file, Label, AInstruction, CInstruction)
+from hack_assembler import optimizer
+from hack_assembler.binary import write_binary_file
+from hack_assembler.parser import (parse_file, parse_file_numbered,
+                                   iter_parse_file, Label, AInstruction,
+                                   CInstruction)
+from hack_assembler.source_map import build_source_map, write_source_map
 
 HACK_EXT = ".hack"
 
+BINARY_WORD_FORMAT = "{:016b}"
+
+# A instruction loads 15 bit values (the msb marks C instruction).
+MAX_A_INSTRUCTION_VALUE = 0x7FFF
+
+# Number of words rendered at once by the streaming assembler.
+STREAMING_CHUNK_SIZE = 0x1000
+
 PREDEFINED_SYMBOLS = dict(
     SP=0,
     LCL=1,
@@ -35,14 +51,137 @@ PREDEFINED_SYMBOLS = dict(
 )
 
 VARIABLE_BEGIN_OFFSET = 0x10
+# Variables must not collide with the screen memory map.
+VARIABLE_END_OFFSET = PREDEFINED_SYMBOLS["SCREEN"]
+
+
+class VariableTable(dict):
+    """
+    Map between variable name to its RAM address. Variables are allocated
+    at consecutive addresses in the order of declaration, starting at
+    VARIABLE_BEGIN_OFFSET.
+    """
+
+    def __init__(self):
+        super(VariableTable, self).__init__()
+        self._next_offset = VARIABLE_BEGIN_OFFSET
+
+    def declare(self, name):
+        """
+        Declare new variable at the next free address.
+        :param name: The variable name.
+        :return: The address of the variable.
+        """
+        if self._next_offset >= VARIABLE_END_OFFSET:
+            raise RuntimeError("Too many variables, can't allocate %s "
+                               "at %d (SCREEN memory map)" % (name,
+                                                              self._next_offset))
+        offset = self[name] = self._next_offset
+        self._next_offset += 1
+        return offset
+
+
+Assembly = collections.namedtuple("Assembly", ["words", "symbol_table",
+                                               "saved_words", "source_map"])
+
+
+def compile_file(path, optimize=False, source_map_path=None):
+    """
+    :param path: The asm file path.
+    :param optimize: Run the peephole optimizer.
+    :param source_map_path: If given, write the source map of the program
+    to this path (see source_map.py).
+    :return: The hack program text.
+    """
+    assembly = assemble(path, optimize, source_map=source_map_path is not None)
+    if source_map_path is not None:
+        write_source_map(source_map_path, assembly.source_map)
+    return render_text(assembly.words)
+
+
+def assemble(path, optimize=False, source_map=False):
+    """
+    Assemble asm file.
+    :param path: The asm file path.
+    :param optimize: Run the peephole optimizer (see optimizer.py) before
+    the symbol resolution.
+    :param source_map: Build the map between ROM addresses to the asm lines.
+    :return: Assembly, the source map is None unless requested.
+    """
+    saved_words = 0
+    program_source_map = None
+    if source_map:
+        assembly_lines, line_numbers = parse_file_numbered(path)
+        if optimize:
+            assembly_lines, line_numbers, saved_words = \
+                optimizer.optimize_numbered(assembly_lines, line_numbers)
+        program_source_map = build_source_map(assembly_lines, line_numbers)
+    else:
+        assembly_lines = parse_file(path)
+        if optimize:
+            assembly_lines, saved_words = optimizer.optimize(assembly_lines)
+
+    symbol_table = build_symbol_table(assembly_lines)
+    return Assembly(words=encode_program(assembly_lines, symbol_table),
+                    symbol_table=symbol_table,
+                    saved_words=saved_words,
+                    source_map=program_source_map)
+
+
+def compile_file_streaming(input_path, output_path):
+    """
+    Compile asm file to hack file without holding the program in memory.
+    The input file is read twice, once for collecting the labels and once
+    for writing the binary lines straight to the output file.
+    :param input_path: The asm file path.
+    :param output_path: The hack file path.
+    """
+    # First pass, fill the symbol table
+    symbol_table = build_symbol_table(iter_parse_file(input_path))
+
+    # Second pass, write the lines as binary (in chunks of words).
+    words = iter_encode_lines(iter_parse_file(input_path), symbol_table)
+    with open(output_path, 'wb') as hack_file:
+        separator = ""
+        while True:
+            chunk = array.array('H', itertools.islice(words, STREAMING_CHUNK_SIZE))
+            if not chunk:
+                break
+            hack_file.write(separator + render_text(chunk))
+            separator = "\n"
+
+
+def compile_file_to_binary(input_path, output_path, optimize=False,
+                           source_map_path=None):
+    """
+    Compile asm file to the packed binary format (see binary.py), with the
+    labels as the symbol section.
+    :param input_path: The asm file path.
+    :param output_path: The hackb file path.
+    :param optimize: Run the peephole optimizer.
+    :param source_map_path: If given, write the source map to this path.
+    :return: Assembly.
+    """
+    assembly = assemble(input_path, optimize,
+                        source_map=source_map_path is not None)
+    labels = dict((name, offset)
+                  for name, offset in assembly.symbol_table.iteritems()
+                  if name not in PREDEFINED_SYMBOLS)
+    write_binary_file(output_path, assembly.words, symbols=labels)
+    if source_map_path is not None:
+        write_source_map(source_map_path, assembly.source_map)
+    return assembly
+
 
-def compile_file(path):
+def build_symbol_table(assembly_lines):
+    """
+    First pass, find the offsets of the labels.
+    :param assembly_lines: Iterable of parsed assembly lines.
+    :return: dict of the predefined symbols and the labels.
+    """
     symbol_table = dict()
     symbol_table.update(PREDEFINED_SYMBOLS)
-    variable_table = dict()
 
-    assembly_lines = parse_file(path)
-    # First pass, fill the symbol table
     program_offset = 0
     for asm_line in assembly_lines:
         if isinstance(asm_line, Label):
@@ -50,29 +189,61 @@ def compile_file(path):
             symbol_table[label.name] = program_offset
         else:
             program_offset += 1
+    return symbol_table
+
 
-    # Second pass, convert the lines to binary.
-    binary = []
+def encode_program(assembly_lines, symbol_table):
+    """
+    :return: array of 16 bit words of the program.
+    """
+    return array.array('H', iter_encode_lines(assembly_lines, symbol_table))
+
+
+def iter_encode_lines(assembly_lines, symbol_table):
+    """
+    Second pass, convert the lines to 16 bit words.
+    :param assembly_lines: Iterable of parsed assembly lines.
+    :param symbol_table: The symbol table from the first pass.
+    :return: generator of ints, one per instruction.
+    """
+    variable_table = VariableTable()
+    c_instruction_to_word = C_INSTRUCTION_TO_WORD
+    # Map between A instruction value to its word, each symbol, variable or
+    # constant is resolved only once.
+    a_instruction_to_word = dict()
     for asm_line in assembly_lines:
-        if isinstance(asm_line, AInstruction):
-            binary.append(
-                compile_a_instruction(asm_line, symbol_table, variable_table)
-            )
-        elif isinstance(asm_line, CInstruction):
-            binary.append(
-                compile_c_instruction(asm_line)
-            )
+        if asm_line.__class__ is CInstruction:
+            yield c_instruction_to_word[asm_line]
+        elif asm_line.__class__ is AInstruction:
+            word = a_instruction_to_word.get(asm_line.value)
+            if word is None:
+                word = a_instruction_to_word[asm_line.value] = \
+                    encode_a_instruction(asm_line, symbol_table, variable_table)
+            yield word
 
-    return "\n".join(binary)
+
+def render_text(words):
+    """
+    Render words as the textual hack format (line of 16 binary digits per word).
+    """
+    return "\n".join(map(BINARY_WORD_FORMAT.format, words))
 
 
 def write_output_to_file(input_path, output):
-    hack_output_file = os.path.splitext(input_path)[0] + HACK_EXT
-    open(hack_output_file, 'wb').write(output)
+    open(get_output_path(input_path), 'wb').write(output)
 
-def compile_a_instruction(a_instruction, symbol_table, variable_table):
+def get_output_path(input_path, extension=HACK_EXT):
+    return os.path.splitext(input_path)[0] + extension
+
+def encode_a_instruction(a_instruction, symbol_table, variable_table):
     value = resolve_value(a_instruction.value, symbol_table, variable_table)
-    return "0" + convert_value_to_binary(value)
+    assert 0 <= value <= MAX_A_INSTRUCTION_VALUE, \
+        "A instruction value out of range. %s" % value
+    return value
+
+def compile_a_instruction(a_instruction, symbol_table, variable_table):
+    return BINARY_WORD_FORMAT.format(
+        encode_a_instruction(a_instruction, symbol_table, variable_table))
 
 def resolve_value(value, symbol_table, variable_table):
     if value in symbol_table:
@@ -89,29 +260,11 @@ def resolve_value(value, symbol_table, variable_table):
             return int(value)
         except ValueError:
             # Declare this value as variable.
-            variable_offset = VARIABLE_BEGIN_OFFSET
-            declared_variable_offset = variable_table.values()
-            while variable_offset in declared_variable_offset:
-                variable_offset += 1
-
-            # Set the symbol to be at this free offset
-            variable_table[value] = variable_offset
-            return variable_offset
-
-
-def convert_value_to_binary(value):
-    """
-    Convert integer values to binary. Don't support negative values.
-    """
-    assert value >= 0, "Negative values not supported. %s" % value
-    return bin(value)[2:].zfill(15)
+            return variable_table.declare(value)
 
 
 def compile_c_instruction(c_instruction):
-    dest = DEST_TO_BINARY[c_instruction.dest]
-    comp = COMP_TO_BINARY[c_instruction.comp]
-    jump = JUMP_TO_BINARY[c_instruction.jmp]
-    return "111" + comp + dest + jump
+    return BINARY_WORD_FORMAT.format(C_INSTRUCTION_TO_WORD[c_instruction])
 
 
 DEST_TO_BINARY =  {
@@ -170,3 +323,23 @@ COMP_TO_BINARY = {
     c.COMP_D_AND_M: "1000000",
     c.COMP_D_OR_M: "1010101",
 }
+
+
+def _build_c_instruction_table():
+    """
+    Build map between every (comp, dest, jmp) combination to its encoded
+    16 bit word.
+    """
+    table = dict()
+    for comp, comp_bits in COMP_TO_BINARY.iteritems():
+        for dest, dest_bits in DEST_TO_BINARY.iteritems():
+            for jmp, jump_bits in JUMP_TO_BINARY.iteritems():
+                table[CInstruction(comp=comp, dest=dest, jmp=jmp)] = \
+                    int("111" + comp_bits + dest_bits + jump_bits, 2)
+    return table
+
+
+# Precomputed encoding of all the C instructions (28 x 8 x 8 entries).
+# CInstruction is a tuple of (comp, dest, jmp) so parsed instructions are
+# looked up directly.
+C_INSTRUCTION_TO_WORD = _build_c_instruction_table()
@@ -0,0 +1,93 @@
+"""
+Assemble many asm files across a process pool.
+"""
+import collections
+import functools
+import glob
+import multiprocessing
+import os
+import time
+
+from hack_assembler.assembler import (assemble, compile_file_to_binary,
+                                      render_text, write_output_to_file,
+                                      get_output_path)
+from hack_assembler.binary import HACK_BINARY_EXT
+from hack_assembler.source_map import SOURCE_MAP_EXT, write_source_map
+
+ASM_EXT = ".asm"
+
+AssembleResult = collections.namedtuple("AssembleResult", ["input_path",
+                                                           "output_path",
+                                                           "words",
+                                                           "output_size",
+                                                           "saved_words",
+                                                           "seconds"])
+
+
+def find_asm_files(args):
+    """
+    Expand the command line arguments to asm files. Arguments may be
+    files, directories (all the asm files in the directory) or glob
+    patterns.
+    :return: list of paths, directories and patterns expanded in sorted order.
+    """
+    paths = []
+    for arg in args:
+        if os.path.isdir(arg):
+            paths.extend(sorted(glob.glob(os.path.join(arg, "*" + ASM_EXT))))
+        elif glob.has_magic(arg):
+            paths.extend(sorted(glob.glob(arg)))
+        else:
+            paths.append(arg)
+    return paths
+
+
+def assemble_file(input_path, binary=False, optimize=False,
+                  source_map=False):
+    """
+    Assemble single asm file to hack file (or hackb file if binary).
+    :param optimize: Run the peephole optimizer.
+    :param source_map: Write also the source map (.map file).
+    :return: AssembleResult.
+    """
+    start = time.time()
+    source_map_path = None
+    if source_map:
+        source_map_path = get_output_path(input_path, SOURCE_MAP_EXT)
+
+    if binary:
+        output_path = get_output_path(input_path, HACK_BINARY_EXT)
+        assembly = compile_file_to_binary(input_path, output_path, optimize,
+                                          source_map_path)
+    else:
+        output_path = get_output_path(input_path)
+        assembly = assemble(input_path, optimize, source_map)
+        write_output_to_file(input_path, render_text(assembly.words))
+        if source_map:
+            write_source_map(source_map_path, assembly.source_map)
+
+    return AssembleResult(input_path=input_path,
+                          output_path=output_path,
+                          words=len(assembly.words),
+                          output_size=os.path.getsize(output_path),
+                          saved_words=assembly.saved_words,
+                          seconds=time.time() - start)
+
+
+def assemble_files(paths, binary=False, optimize=False, source_map=False,
+                   processes=None):
+    """
+    Assemble asm files across a process pool, file per task.
+    :param paths: The asm files paths.
+    :param processes: Number of worker processes (default, one per cpu).
+    :return: list of AssembleResult in the same order as the paths.
+    """
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(functools.partial(assemble_file, binary=binary,
+                                          optimize=optimize,
+                                          source_map=source_map),
+                        paths, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,109 @@
+"""
+Packed binary ROM format (.hackb).
+
+All the fields are little endian:
+
+    magic           4 bytes  "HCKB"
+    version         uint16
+    reserved        uint16
+    word count      uint32
+    symbols size    uint32   size in bytes of the symbol section
+    symbol section           (value uint16, name length uint16, name) per
+                             symbol, padded with zeros to 4 bytes boundary
+    words           uint16 * word count
+
+The words start at 4 bytes aligned offset, and are read as a single block
+into an array, without parsing them.
+"""
+import array
+import struct
+import sys
+from collections import namedtuple
+
+HACK_BINARY_EXT = ".hackb"
+
+MAGIC = "HCKB"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHHII")
+_SYMBOL_HEADER = struct.Struct("<HH")
+_ALIGNMENT = 4
+
+
+def pack_symbols(symbols):
+    """
+    :param symbols: dict between symbol name to its value.
+    :return: The packed symbol section (padded).
+    """
+    section = []
+    for name, value in sorted(symbols.iteritems(), key=lambda item: item[1]):
+        section.append(_SYMBOL_HEADER.pack(value, len(name)))
+        section.append(name)
+    section = "".join(section)
+    return section + "\0" * (-len(section) % _ALIGNMENT)
+
+
+def unpack_symbols(section):
+    symbols = dict()
+    offset = 0
+    while offset + _SYMBOL_HEADER.size <= len(section):
+        value, name_length = _SYMBOL_HEADER.unpack_from(section, offset)
+        offset += _SYMBOL_HEADER.size
+        if not name_length:
+            # Reached the padding.
+            break
+        symbols[section[offset:offset + name_length]] = value
+        offset += name_length
+    return symbols
+
+
+def write_binary_file(path, words, symbols=None):
+    """
+    Write the program in the packed binary format.
+    :param path: The output file path.
+    :param words: sequence of 16 bit words.
+    :param symbols: Optional dict between symbol name to its value.
+    """
+    words = array.array('H', words)
+    if sys.byteorder != "little":
+        words.byteswap()
+    symbol_section = pack_symbols(symbols) if symbols else ""
+
+    with open(path, 'wb') as binary_file:
+        binary_file.write(_HEADER.pack(MAGIC, VERSION, 0, len(words),
+                                       len(symbol_section)))
+        binary_file.write(symbol_section)
+        words.tofile(binary_file)
+
+
+HackBinary = namedtuple("HackBinary", ["words", "symbols"])
+
+
+def load_binary_file(path):
+    """
+    Load packed binary file.
+    :param path: The file path.
+    :return: HackBinary of the words (array of unsigned 16 bit words) and
+    the symbols (dict between symbol name to its value).
+    """
+    with open(path, 'rb') as binary_file:
+        data = binary_file.read()
+
+    if len(data) < _HEADER.size:
+        raise RuntimeError("Not a packed hack binary file: %s" % path)
+    magic, version, _, word_count, symbols_size = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise RuntimeError("Not a packed hack binary file: %s" % path)
+    if version != VERSION:
+        raise RuntimeError("Unsupported packed hack binary version %d: %s"
+                           % (version, path))
+
+    words_offset = _HEADER.size + symbols_size
+    if len(data) < words_offset + 2 * word_count:
+        raise RuntimeError("Truncated packed hack binary file: %s" % path)
+
+    words = array.array('H', data[words_offset:words_offset + 2 * word_count])
+    if sys.byteorder != "little":
+        words.byteswap()
+    return HackBinary(words=words,
+                      symbols=unpack_symbols(data[_HEADER.size:words_offset]))
@@ -0,0 +1,122 @@
+"""
+Turn hack programs back into assembly, annotated with the ROM addresses
+and (when a source map is given) the asm lines they came from.
+"""
+import os
+
+from hack_assembler.assembler import (COMP_TO_BINARY, DEST_TO_BINARY,
+                                      JUMP_TO_BINARY, HACK_EXT)
+from hack_assembler.binary import HACK_BINARY_EXT, load_binary_file
+from hack_assembler.source_map import SOURCE_MAP_EXT, load_source_map
+from hack_assembler import consts as c
+
+C_INSTRUCTION_MASK = 0xE000
+COMP_SHIFT = 6
+DEST_SHIFT = 3
+
+# The encoding tables of the assembler, inverted (bits as int to mnemonic).
+BINARY_TO_COMP = dict((int(bits, 2), comp)
+                      for comp, bits in COMP_TO_BINARY.iteritems())
+BINARY_TO_DEST = dict((int(bits, 2), dest)
+                      for dest, bits in DEST_TO_BINARY.iteritems())
+BINARY_TO_JUMP = dict((int(bits, 2), jmp)
+                      for jmp, bits in JUMP_TO_BINARY.iteritems())
+
+# Column of the address comments.
+COMMENT_COLUMN = 24
+
+
+def disassemble_word(word):
+    """
+    :param word: unsigned 16 bit word.
+    :return: The assembly text of the instruction.
+    """
+    if not word & 0x8000:
+        return "@%d" % word
+
+    if word & C_INSTRUCTION_MASK != C_INSTRUCTION_MASK:
+        raise RuntimeError("Illegal C instruction: {:016b}".format(word))
+    comp = BINARY_TO_COMP.get((word >> COMP_SHIFT) & 0x7F)
+    if comp is None:
+        raise RuntimeError("Unknown compute bits: {:016b}".format(word))
+    dest = BINARY_TO_DEST[(word >> DEST_SHIFT) & 0x7]
+    jmp = BINARY_TO_JUMP[word & 0x7]
+
+    text = comp
+    if dest != c.DEST_null:
+        text = dest + c.DST_SEP + text
+    if jmp != c.JUMP_null:
+        text = text + c.JMP_SEP + jmp
+    return text
+
+
+def disassemble(words, source_map=None, symbols=None):
+    """
+    Disassemble the program, one line per instruction with a comment of its
+    address (and source line), and the labels declared before it.
+    :param words: sequence of 16 bit words.
+    :param source_map: Optional SourceMap of the program.
+    :param symbols: Optional dict between label name to address (like the
+    symbols of packed binary files), used when there is no source map.
+    :return: The assembly text.
+    """
+    address_to_labels = dict()
+    if source_map is not None:
+        for address, name in source_map.labels:
+            address_to_labels.setdefault(address, []).append(name)
+    elif symbols:
+        for name, address in sorted(symbols.iteritems(),
+                                    key=lambda item: item[1]):
+            address_to_labels.setdefault(address, []).append(name)
+
+    lines = []
+    for address, word in enumerate(words):
+        for name in address_to_labels.get(address, ()):
+            lines.append("(%s)" % name)
+
+        comment = "// %d" % address
+        if source_map is not None:
+            comment += " line %d" % source_map.lookup(address).line
+        if (not word & 0x8000 and word in address_to_labels and
+                address + 1 < len(words) and words[address + 1] & 0x8000 and
+                words[address + 1] & 0x7):
+            # Jump target.
+            comment += " -> %s" % address_to_labels[word][-1]
+
+        lines.append(("    " + disassemble_word(word)).ljust(COMMENT_COLUMN) +
+                     comment)
+    return "\n".join(lines)
+
+
+def load_words(path):
+    """
+    Load the words of .hack or .hackb file.
+    :return: tuple of (list of words, dict of the symbols of .hackb file or
+    None).
+    """
+    if path.endswith(HACK_BINARY_EXT):
+        binary = load_binary_file(path)
+        return list(binary.words), binary.symbols
+    return [int(line, 2) for line in open(path, 'rt').read().split()], None
+
+
+def disassemble_file(path, source_map_path=None):
+    """
+    Disassemble .hack or .hackb file. The source map is looked up next to
+    the file (<name>.map) unless given.
+    :return: The assembly text.
+    """
+    if source_map_path is None:
+        source_map_path = os.path.splitext(path)[0] + SOURCE_MAP_EXT
+        if not os.path.isfile(source_map_path):
+            source_map_path = None
+
+    words, symbols = load_words(path)
+    source_map = None
+    if source_map_path is not None:
+        source_map = load_source_map(source_map_path)
+    return disassemble(words, source_map=source_map, symbols=symbols)
+
+
+def is_hack_file(path):
+    return path.endswith(HACK_EXT) or path.endswith(HACK_BINARY_EXT)
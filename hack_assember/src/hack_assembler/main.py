@@ -1,10 +1,57 @@
 import sys
-from hack_assembler.assembler import compile_file, write_output_to_file
+import time
+
+from hack_assembler.assembler import compile_file_streaming, get_output_path
+from hack_assembler.batch import find_asm_files, assemble_file, assemble_files
+from hack_assembler.disassembler import disassemble_file, is_hack_file
+
+BINARY_FLAG = "--binary"
+OPTIMIZE_FLAG = "--optimize"
+SOURCE_MAP_FLAG = "--source-map"
+FLAGS = (BINARY_FLAG, OPTIMIZE_FLAG, SOURCE_MAP_FLAG)
+
+
+def print_summary(results, elapsed):
+    for result in results:
+        print "%-40s %7d words %9d bytes %7.3f sec" % (
+            result.input_path, result.words, result.output_size,
+            result.seconds),
+        if result.saved_words:
+            print "(optimizer saved %d words)" % result.saved_words,
+        print
+    print "%d files, %d words, %d bytes in %.3f sec" % (
+        len(results), sum(result.words for result in results),
+        sum(result.output_size for result in results), elapsed)
+
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print "Usage: %s <asm.file>" % sys.argv[0]
+    args = [arg for arg in sys.argv[1:] if arg not in FLAGS]
+    binary = BINARY_FLAG in sys.argv
+    optimize = OPTIMIZE_FLAG in sys.argv
+    source_map = SOURCE_MAP_FLAG in sys.argv
+    if not args:
+        print "Usage: %s [%s] [%s] [%s] <asm.file / directory / glob> ..." % (
+            sys.argv[0], BINARY_FLAG, OPTIMIZE_FLAG, SOURCE_MAP_FLAG)
+        print "       %s <hack.file> (disassemble)" % sys.argv[0]
         sys.exit(1)
 
-    path = sys.argv[-1]
-    write_output_to_file(path, compile_file(path))
\ No newline at end of file
+    paths = find_asm_files(args)
+    if len(args) == 1 and is_hack_file(args[0]):
+        print disassemble_file(args[0])
+    elif args == paths and len(paths) == 1:
+        path = paths[0]
+        if binary or optimize or source_map:
+            # The optimizer and the source map need the whole program,
+            # no streaming.
+            result = assemble_file(path, binary=binary, optimize=optimize,
+                                   source_map=source_map)
+            if optimize:
+                print "Optimizer saved %d words (%d words left)" % (
+                    result.saved_words, result.words)
+        else:
+            compile_file_streaming(path, get_output_path(path))
+    else:
+        start = time.time()
+        results = assemble_files(paths, binary=binary, optimize=optimize,
+                                 source_map=source_map)
+        print_summary(results, time.time() - start)
@@ -0,0 +1,207 @@
+"""
+Peephole optimizer over the parsed assembly lines.
+
+Runs between the parsing and the symbol resolution, and rewrites the
+redundant sequences which are common in the VM translator output:
+
+    @SP / M=M+1 / @SP / ...             @SP reloaded while A already holds it.
+    @SP / M=M+1 / @SP / AM=M-1          push followed by pop, SP is unchanged.
+    @SP / A=M / M=D / @SP / A=M / D=M   the popped value is already in D.
+    @0 / D=A                            D=0 (when A is overwritten next).
+    @LABEL / 0;JMP / (LABEL)            jump to the next instruction.
+
+The rules never match across a label (a label may be reached with any
+register values), so the labels and the addresses they mark keep their
+meaning. The rules assume the stack pointer doesn't point to itself
+(RAM[SP] != SP), which holds for any program using the VM stack.
+"""
+from hack_assembler import consts as c
+from hack_assembler.parser import Label, AInstruction, CInstruction
+
+_SP = AInstruction(value="SP")
+
+
+def _c(dest, comp, jmp=c.JUMP_null):
+    return CInstruction(comp=comp, dest=dest, jmp=jmp)
+
+
+_INCREMENT_M = _c(c.DEST_M, c.COMP_M_PLUS_1)
+_DECREMENT_AM = _c(c.DEST_AM, c.COMP_M_MINUS_1)
+_LOAD_A_FROM_M = _c(c.DEST_A, c.COMP_M)
+_STORE_D = _c(c.DEST_M, c.COMP_D)
+_LOAD_D_FROM_M = _c(c.DEST_D, c.COMP_M)
+_LOAD_D_FROM_A = _c(c.DEST_D, c.COMP_A)
+
+# Constants which the ALU can produce without loading them to A.
+_CONSTANT_TO_COMP = {
+    "0": c.COMP_0,
+    "1": c.COMP_1,
+}
+
+
+def count_words(assembly_lines):
+    """
+    :return: The number of ROM words of the parsed assembly lines.
+    """
+    return sum(1 for asm_line in assembly_lines
+               if not isinstance(asm_line, Label))
+
+
+def optimize(assembly_lines):
+    """
+    Apply the peephole rules until none of them matches.
+    :param assembly_lines: list of parsed assembly lines.
+    :return: tuple of (optimized list of assembly lines, ROM words saved).
+    """
+    optimized, _, saved_words = optimize_numbered(
+        assembly_lines, [None] * len(assembly_lines))
+    return optimized, saved_words
+
+
+def optimize_numbered(assembly_lines, line_numbers):
+    """
+    Like optimize, and keeps track of the source line of each line.
+    :param assembly_lines: list of parsed assembly lines.
+    :param line_numbers: list of the source line number of each assembly
+    line. Instructions which replace a sequence get the line of its first
+    instruction.
+    :return: tuple of (optimized list of assembly lines, their line numbers,
+    ROM words saved).
+    """
+    original_words = count_words(assembly_lines)
+    while True:
+        optimized, optimized_line_numbers = _remove_redundant_a_loads(
+            *_apply_rules(assembly_lines, line_numbers))
+        if len(optimized) == len(assembly_lines):
+            break
+        assembly_lines, line_numbers = optimized, optimized_line_numbers
+    return (optimized, optimized_line_numbers,
+            original_words - count_words(optimized))
+
+
+def _apply_rules(assembly_lines, line_numbers):
+    optimized = []
+    optimized_line_numbers = []
+    index = 0
+    while index < len(assembly_lines):
+        for rule in _RULES:
+            match = rule(assembly_lines, index)
+            if match is not None:
+                replacement, length = match
+                optimized.extend(replacement)
+                optimized_line_numbers.extend(
+                    [line_numbers[index]] * len(replacement))
+                index += length
+                break
+        else:
+            optimized.append(assembly_lines[index])
+            optimized_line_numbers.append(line_numbers[index])
+            index += 1
+    return optimized, optimized_line_numbers
+
+
+def _remove_redundant_a_loads(assembly_lines, line_numbers):
+    """
+    Remove A instructions which load the value A already holds.
+    """
+    optimized = []
+    optimized_line_numbers = []
+    # The value of A when it is known, that is since the last A instruction
+    # within the same straight line code.
+    known_a = None
+    for asm_line, line_number in zip(assembly_lines, line_numbers):
+        if isinstance(asm_line, AInstruction):
+            if asm_line.value == known_a:
+                continue
+            known_a = asm_line.value
+        elif isinstance(asm_line, Label):
+            known_a = None
+        elif c.DEST_A in asm_line.dest:
+            known_a = None
+        optimized.append(asm_line)
+        optimized_line_numbers.append(line_number)
+    return optimized, optimized_line_numbers
+
+
+def _window(assembly_lines, index, length):
+    return tuple(assembly_lines[index:index + length])
+
+
+def _next_instruction(assembly_lines, index):
+    """
+    :return: The first instruction (not label) at or after the index,
+    or None at the end of the program.
+    """
+    for offset in xrange(index, len(assembly_lines)):
+        if not isinstance(assembly_lines[offset], Label):
+            return assembly_lines[offset]
+    return None
+
+
+def _a_is_overwritten(assembly_lines, index):
+    """
+    :return: True if the value of A at the index is never read, since the
+    next executed instruction loads A.
+    """
+    return isinstance(_next_instruction(assembly_lines, index), AInstruction)
+
+
+def _push_pop_rule(assembly_lines, index):
+    # SP is incremented and decremented right back, A ends with the old SP.
+    if _window(assembly_lines, index, 4) == (_SP, _INCREMENT_M,
+                                             _SP, _DECREMENT_AM):
+        return [_SP, _LOAD_A_FROM_M], 4
+    return None
+
+
+def _store_reload_rule(assembly_lines, index):
+    # The value stored at the top of the stack is read right back to D.
+    if _window(assembly_lines, index, 6) == (_SP, _LOAD_A_FROM_M, _STORE_D,
+                                             _SP, _LOAD_A_FROM_M,
+                                             _LOAD_D_FROM_M):
+        return [_SP, _LOAD_A_FROM_M, _STORE_D], 6
+    return None
+
+
+def _constant_rule(assembly_lines, index):
+    # "@0 / D=A" computes the constant in the ALU, if A isn't needed.
+    window = _window(assembly_lines, index, 2)
+    if (len(window) == 2 and
+            isinstance(window[0], AInstruction) and
+            window[0].value in _CONSTANT_TO_COMP and
+            window[1] == _LOAD_D_FROM_A and
+            _a_is_overwritten(assembly_lines, index + 2)):
+        return [_c(c.DEST_D, _CONSTANT_TO_COMP[window[0].value])], 2
+    return None
+
+
+def _jump_to_next_rule(assembly_lines, index):
+    # Jump (without destination) to one of the labels which directly
+    # follow it. The labels are kept, A must not be read after them since
+    # the jumping path arrives there with A set to the label.
+    window = _window(assembly_lines, index, 2)
+    if (len(window) != 2 or
+            not isinstance(window[0], AInstruction) or
+            not isinstance(window[1], CInstruction) or
+            window[1].dest != c.DEST_null or
+            window[1].jmp == c.JUMP_null):
+        return None
+
+    labels = set()
+    for offset in xrange(index + 2, len(assembly_lines)):
+        if not isinstance(assembly_lines[offset], Label):
+            break
+        labels.add(assembly_lines[offset].name)
+
+    if window[0].value in labels and _a_is_overwritten(assembly_lines,
+                                                       index + 2):
+        return [], 2
+    return None
+
+
+_RULES = (
+    _push_pop_rule,
+    _store_reload_rule,
+    _constant_rule,
+    _jump_to_next_rule,
+)
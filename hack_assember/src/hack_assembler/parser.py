@@ -1,4 +1,5 @@
 import collections
+import re
 
 from hack_assembler import consts
 
@@ -11,70 +12,133 @@ def parse_file(path):
     data = open(path, 'rt').read()
     return parse_data(data)
 
-def parse_data(raw_program):
-    program = []
-    for program_line in read_lines(raw_program):
-        res = parse_program_line(program_line)
-        if res:
-            program.append(res)
-    return program
-
-def read_lines(raw_program):
-    for line in raw_program.splitlines():
-        stripped_line = line.strip()
-        if stripped_line:
-            yield stripped_line
-
-def strip_comments(program_line):
-    line = program_line.split("//")[0]
-    return line.strip()
+def iter_parse_file(path):
+    """
+    Lazily parse file, line by line. Memory usage doesn't depend on the
+    file size.
+    :param path: The file path.
+    :return: generator of Label / AInstruction / CInstruction.
+    """
+    with open(path, 'rt') as asm_file:
+        for res in iter_parse_lines(asm_file):
+            yield res
+
+def parse_file_numbered(path):
+    """
+    Parse file, and keep the line number of each parsed line.
+    :param path: The file path.
+    :return: tuple of (list of Label / AInstruction / CInstruction,
+    list of their line numbers, starting at 1).
+    """
+    assembly_lines = []
+    line_numbers = []
+    for line_number, line in enumerate(open(path, 'rt').read().splitlines(),
+                                       1):
+        res = parse_program_line(line)
+        if res is not None:
+            assembly_lines.append(res)
+            line_numbers.append(line_number)
+    return assembly_lines, line_numbers
 
-def parse_program_line(program_line):
-    program_line = strip_comments(program_line)
-    if not program_line:
-        return None
+def parse_data(raw_program):
+    return list(iter_parse_lines(raw_program.splitlines()))
 
-    elif parse_label(program_line):
-        return parse_label(program_line)
+def iter_parse_lines(lines):
+    parse_line = parse_program_line
+    for line in lines:
+        res = parse_line(line)
+        if res is not None:
+            yield res
 
-    elif parse_a_instruction(program_line):
-        return parse_a_instruction(program_line)
+def parse_program_line(program_line):
+    """
+    Classify and decompose single line with one regex match.
+    :return: Label / AInstruction / CInstruction or None for empty lines
+    and comments.
+    """
+    match = _match_line(program_line)
+    assert match is not None, "Illegal instruction: %s" % program_line.strip()
+    label, value, dest, comp, jmp = match.groups()
+
+    if value is not None:
+        return AInstruction(value)
+
+    elif comp is not None:
+        # C instructions repeat a lot, decode each combination only once.
+        instruction = _C_INSTRUCTIONS.get((comp, dest, jmp))
+        if instruction is None:
+            instruction = _C_INSTRUCTIONS[comp, dest, jmp] = \
+                _decode_c_instruction(comp, dest, jmp)
+        return instruction
+
+    elif label is not None:
+        # We can enforce names restrictions
+        # here (all in alpha numeric ascii, etc..)
+        return Label(label)
 
-    else:
-        return parse_c_instruction(program_line)
+    return None
 
 def parse_label(line):
-    if line.startswith("(") and line.endswith(")"):
-        name = line[1:-1]
-        name = name.strip()
-        # We can enforce names restrictions
-        # here (all in alpha numeric ascii, etc..)
-        return Label(name=name)
+    """
+    :return: Label if the line is a label, None otherwise.
+    """
+    instruction = parse_program_line(line)
+    if isinstance(instruction, Label):
+        return instruction
 
 def parse_a_instruction(line):
-    if line.startswith("@"):
-        value = line[1:]
-        return AInstruction(value=value)
+    """
+    :return: AInstruction if the line is an A instruction, None otherwise.
+    """
+    instruction = parse_program_line(line)
+    if isinstance(instruction, AInstruction):
+        return instruction
 
 def parse_c_instruction(line):
-    if consts.JMP_SEP in line:
-        line, jmp = line.split(consts.JMP_SEP)
-        jmp = jmp.strip()
-        assert jmp in consts.LEGAL_JUMP, 'Illegal jump.'
+    """
+    :return: CInstruction of the line.
+    """
+    instruction = parse_program_line(line)
+    assert isinstance(instruction, CInstruction), \
+        "Illegal instruction: %s" % line.strip()
+    return instruction
+
+def _decode_c_instruction(comp, dest, jmp):
+    """
+    :param comp: The compute mnemonic.
+    :param dest: The destination mnemonic or None.
+    :param jmp: The jump mnemonic or None.
+    :return: CInstruction.
+    """
+    if dest is None:
+        dest = consts.DEST_null
     else:
+        assert dest in _LEGAL_DEST, "Illegal destination"
+    if jmp is None:
         jmp = consts.JUMP_null
-
-    if consts.DST_SEP in line:
-        dest, line = line.split(consts.DST_SEP)
-        dest = dest.strip()
-        assert dest in consts.LEGAL_DEST, "Illegal destination"
     else:
-        dest=consts.DEST_null
-
-    comp = line.strip()
-    assert comp in consts.LEGAL_COMP, "Illegal compute"
-    return CInstruction(comp=comp,
-                        dest=dest,
-                        jmp=jmp)
-
-
+        assert jmp in _LEGAL_JUMP, 'Illegal jump.'
+    assert comp in _LEGAL_COMP, "Illegal compute"
+    return CInstruction(comp=comp, dest=dest, jmp=jmp)
+
+_LEGAL_DEST = frozenset(consts.LEGAL_DEST)
+_LEGAL_JUMP = frozenset(consts.LEGAL_JUMP)
+_LEGAL_COMP = frozenset(consts.LEGAL_COMP)
+
+# Single pattern for all the line kinds, at most one of the label, value
+# and comp groups matches. Comments and surrounding whitespace are skipped.
+_LINE_REGEX = re.compile(r"""
+    \s*
+    (?:
+        \(\s*(?P<label>[^)]*?)\s*\)             # (LABEL)
+      | @(?P<value>[^\s/]*)                     # @value
+      | (?:(?P<dest>[^=;/\s]+)\s*=\s*)?         # dest=
+        (?P<comp>[^=;/\s]+)                    # comp
+        (?:\s*;\s*(?P<jmp>[^;/\s]+))?           # ;jmp
+    )?
+    \s*(?://.*)?$                              # comment
+""", re.VERBOSE)
+_match_line = _LINE_REGEX.match
+
+# Cache of the decoded C instructions, keyed by the regex groups.
+_C_INSTRUCTIONS = dict()
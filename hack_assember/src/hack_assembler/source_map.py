@@ -0,0 +1,126 @@
+"""
+Map between ROM addresses and the asm source (line and nearest preceding
+label), for resolving addresses of profiles and disassembly.
+
+The map file is a text file, sorted by address:
+
+    hack-source-map <version> <word count>
+    <address> <line>        run, the following addresses are at the
+                            following lines (until the next run)
+    <address> (<label>)     label declared at this address
+
+Consecutive instructions on consecutive lines share a single run, so the
+map of the VM translator output is mostly labels.
+"""
+import bisect
+import collections
+
+from hack_assembler.parser import Label
+
+SOURCE_MAP_EXT = ".map"
+
+_HEADER = "hack-source-map"
+VERSION = 1
+
+SourceLocation = collections.namedtuple("SourceLocation", ["line", "label"])
+
+
+class SourceMap(object):
+
+    def __init__(self, words, runs, labels):
+        """
+        :param words: The number of words of the program.
+        :param runs: list of (address, line) sorted by address.
+        :param labels: list of (address, label name) sorted by address, in
+        declaration order.
+        """
+        self.words = words
+        self.runs = runs
+        self.labels = labels
+        self._run_addresses = [address for address, _ in runs]
+        self._label_addresses = [address for address, _ in labels]
+
+    def __len__(self):
+        return self.words
+
+    def lookup(self, address):
+        """
+        :param address: ROM address.
+        :return: SourceLocation of the instruction at the address, the label
+        is None if no label precedes it.
+        """
+        if not 0 <= address < self.words:
+            raise IndexError("ROM address out of range: %d" % address)
+
+        run_address, run_line = self.runs[
+            bisect.bisect_right(self._run_addresses, address) - 1]
+        label_index = bisect.bisect_right(self._label_addresses, address) - 1
+        label = self.labels[label_index][1] if label_index >= 0 else None
+        return SourceLocation(line=run_line + address - run_address,
+                              label=label)
+
+    def labels_at(self, address):
+        """
+        :return: list of the labels declared at the address.
+        """
+        begin = bisect.bisect_left(self._label_addresses, address)
+        end = bisect.bisect_right(self._label_addresses, address)
+        return [name for _, name in self.labels[begin:end]]
+
+
+def build_source_map(assembly_lines, line_numbers):
+    """
+    :param assembly_lines: list of parsed assembly lines.
+    :param line_numbers: list of the source line of each assembly line.
+    :return: SourceMap.
+    """
+    runs = []
+    labels = []
+    address = 0
+    previous_line = None
+    for asm_line, line_number in zip(assembly_lines, line_numbers):
+        if isinstance(asm_line, Label):
+            labels.append((address, asm_line.name))
+            continue
+        if previous_line is None or line_number != previous_line + 1:
+            runs.append((address, line_number))
+        previous_line = line_number
+        address += 1
+    return SourceMap(address, runs, labels)
+
+
+def write_source_map(path, source_map):
+    entries = [(address, 1, str(line)) for address, line in source_map.runs]
+    entries.extend((address, 0, "(%s)" % name)
+                   for address, name in source_map.labels)
+    # Stable sort, the labels stay in declaration order.
+    entries.sort(key=lambda entry: entry[:2])
+
+    with open(path, 'wb') as map_file:
+        map_file.write("%s %d %d\n" % (_HEADER, VERSION, source_map.words))
+        for address, _, value in entries:
+            map_file.write("%d %s\n" % (address, value))
+
+
+def load_source_map(path):
+    """
+    :param path: The map file path.
+    :return: SourceMap.
+    """
+    with open(path, 'rt') as map_file:
+        header = map_file.readline().split()
+        if len(header) != 3 or header[0] != _HEADER:
+            raise RuntimeError("Not a hack source map: %s" % path)
+        if int(header[1]) != VERSION:
+            raise RuntimeError("Unsupported hack source map version %s: %s"
+                               % (header[1], path))
+
+        runs = []
+        labels = []
+        for line in map_file:
+            address, value = line.rstrip("\n").split(" ", 1)
+            if value.startswith("("):
+                labels.append((int(address), value[1:-1]))
+            else:
+                runs.append((int(address), int(value)))
+    return SourceMap(int(header[2]), runs, labels)
@@ -2,8 +2,12 @@ import os
 
 import pytest
 
-from hack_assembler.parser import parse_a_instruction
-from hack_assembler.assembler import compile_a_instruction, HACK_EXT, compile_file
+from hack_assembler.parser import (parse_a_instruction, parse_c_instruction,
+    parse_label, parse_program_line, parse_file, Label)
+from hack_assembler.assembler import (compile_a_instruction, HACK_EXT,
+    compile_c_instruction, C_INSTRUCTION_TO_WORD, encode_program,
+    build_symbol_table, compile_file, compile_file_streaming, resolve_value, VariableTable, PREDEFINED_SYMBOLS,
+    VARIABLE_BEGIN_OFFSET, VARIABLE_END_OFFSET)
 
 
 @pytest.mark.parametrize(
@@ -20,6 +24,36 @@ def test_convert_a_instruction_direct_value(asm_line, expected_output):
     assert compile_a_instruction(instruction, {}, {}) == expected_output
 
 
+@pytest.mark.parametrize(
+    ("asm_line", "expected_output"),
+    [
+        ("AM=M-1", "1111110010101000"),
+        ("D;JGT", "1110001100000001"),
+        ("0;JMP", "1110101010000111"),
+        ("AMD=D|A;JLE", "1110010101111110"),
+    ]
+
+)
+def test_convert_c_instruction(asm_line, expected_output):
+    instruction = parse_c_instruction(asm_line)
+    assert instruction == parse_program_line(asm_line)
+    assert compile_c_instruction(instruction) == expected_output
+
+
+def test_parse_line_kinds():
+    assert parse_label("(LOOP)") == Label("LOOP")
+    assert parse_label("@LOOP") is None
+    assert parse_a_instruction("D=M") is None
+    with pytest.raises(AssertionError):
+        parse_c_instruction("@LOOP")
+
+
+def test_c_instruction_table():
+    # Every comp / dest / jump combination.
+    assert len(C_INSTRUCTION_TO_WORD) == 28 * 8 * 8
+    assert all(word >> 13 == 0b111 for word in C_INSTRUCTION_TO_WORD.values())
+
+
 RESOURCE_DIR = os.path.join(os.path.dirname(__file__), 'resources')
 
 @pytest.mark.parametrize(("program",),
@@ -35,4 +69,53 @@ RESOURCE_DIR = os.path.join(os.path.dirname(__file__), 'resources')
 def test_compile_program(program):
     asm_file =  os.path.join(RESOURCE_DIR, program + ".asm")
     hack_file = os.path.join(RESOURCE_DIR, program + HACK_EXT)
-    assert compile_file(asm_file).splitlines() == open(hack_file).read().splitlines()
\ No newline at end of file
+    assert compile_file(asm_file).splitlines() == open(hack_file).read().splitlines()
+
+
+@pytest.mark.parametrize(("program",),
+            [
+                ("Add",),
+                ("MaxL",),
+                ("PongL",),
+            ])
+def test_encode_program(program):
+    assembly_lines = parse_file(os.path.join(RESOURCE_DIR, program + ".asm"))
+    hack_file = os.path.join(RESOURCE_DIR, program + HACK_EXT)
+    words = encode_program(assembly_lines, build_symbol_table(assembly_lines))
+    assert list(words) == [int(line, 2) for line in open(hack_file)]
+
+
+@pytest.mark.parametrize(("program",),
+            [
+                ("Add",),
+                ("MaxL",),
+                ("Pong",),
+                ("PongL",),
+            ])
+def test_compile_program_streaming(program, tmpdir):
+    asm_file =  os.path.join(RESOURCE_DIR, program + ".asm")
+    output_file = tmpdir.join(program + HACK_EXT)
+    compile_file_streaming(asm_file, output_file.strpath)
+    assert output_file.read() == compile_file(asm_file)
+
+def test_variables_allocation():
+    variable_table = VariableTable()
+    symbol_table = dict(PREDEFINED_SYMBOLS)
+    for index in xrange(100):
+        name = "Main.%d" % index
+        assert resolve_value(name, symbol_table, variable_table) == \
+               VARIABLE_BEGIN_OFFSET + index
+        # Declared variables keep their address.
+        assert resolve_value(name, symbol_table, variable_table) == \
+               VARIABLE_BEGIN_OFFSET + index
+
+
+def test_variables_overflow_into_screen():
+    variable_table = VariableTable()
+    for index in xrange(VARIABLE_END_OFFSET - VARIABLE_BEGIN_OFFSET):
+        variable_table.declare("var%d" % index)
+    assert variable_table["var0"] == VARIABLE_BEGIN_OFFSET
+    assert max(variable_table.values()) == PREDEFINED_SYMBOLS["SCREEN"] - 1
+
+    with pytest.raises(RuntimeError):
+        resolve_value("one_too_many", {}, variable_table)
@@ -0,0 +1,53 @@
+import os
+import shutil
+
+import pytest
+
+from hack_assembler.assembler import compile_file
+from hack_assembler.batch import find_asm_files, assemble_files
+from hack_assembler.binary import load_binary_file
+
+RESOURCE_DIR = os.path.join(os.path.dirname(__file__), 'resources')
+
+PROGRAMS = ["Add", "Max", "MaxL", "Pong", "PongL", "Rect", "RectL"]
+
+
+@pytest.fixture
+def asm_dir(tmpdir):
+    for program in PROGRAMS:
+        shutil.copy(os.path.join(RESOURCE_DIR, program + ".asm"),
+                    tmpdir.strpath)
+    return tmpdir
+
+
+def test_find_asm_files(asm_dir):
+    paths = [asm_dir.join(program + ".asm").strpath for program in PROGRAMS]
+
+    assert find_asm_files([asm_dir.strpath]) == paths
+    assert find_asm_files([asm_dir.join("*L.asm").strpath]) == \
+        [path for path in paths if path.endswith("L.asm")]
+    assert find_asm_files([paths[1], paths[0]]) == [paths[1], paths[0]]
+
+
+@pytest.mark.parametrize(("processes",), [(1,), (3,)])
+def test_assemble_files(asm_dir, processes):
+    paths = find_asm_files([asm_dir.strpath])
+    results = assemble_files(paths, processes=processes)
+
+    assert [result.input_path for result in results] == paths
+    for result in results:
+        expected = compile_file(result.input_path)
+        assert open(result.output_path).read() == expected
+        assert result.words == len(expected.splitlines())
+        assert result.output_size == len(expected)
+
+
+def test_assemble_files_to_binary(asm_dir):
+    paths = find_asm_files([asm_dir.strpath])
+    results = assemble_files(paths, binary=True, processes=2)
+
+    for result in results:
+        words = load_binary_file(result.output_path).words
+        assert ["{:016b}".format(word) for word in words] == \
+            compile_file(result.input_path).splitlines()
+        assert len(words) == result.words
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from hack_assembler.assembler import compile_file, compile_file_to_binary
+from hack_assembler.binary import (write_binary_file, load_binary_file,
+                                   pack_symbols, unpack_symbols,
+                                   HACK_BINARY_EXT)
+
+RESOURCE_DIR = os.path.join(os.path.dirname(__file__), 'resources')
+
+
+@pytest.mark.parametrize(("program",),
+            [
+                ("Add",),
+                ("Max",),
+                ("MaxL",),
+                ("Pong",),
+                ("Rect",),
+                ("RectL",),
+                ("PongL",),
+            ])
+def test_round_trip(program, tmpdir):
+    hack_file = os.path.join(RESOURCE_DIR, program + ".hack")
+    words = [int(line, 2) for line in open(hack_file).read().splitlines()]
+    binary_file = tmpdir.join(program + HACK_BINARY_EXT)
+
+    write_binary_file(binary_file.strpath, words)
+    # Header, and 2 bytes per word.
+    assert binary_file.size() == 16 + 2 * len(words)
+
+    binary = load_binary_file(binary_file.strpath)
+    assert binary.words.tolist() == words
+    assert binary.symbols == {}
+
+
+def test_compile_file_to_binary(tmpdir):
+    asm_file = os.path.join(RESOURCE_DIR, "MaxL.asm")
+    binary_file = tmpdir.join("MaxL" + HACK_BINARY_EXT)
+    compile_file_to_binary(asm_file, binary_file.strpath)
+
+    binary = load_binary_file(binary_file.strpath)
+    expected_words = [int(line, 2) for line in
+                      compile_file(asm_file).splitlines()]
+    assert binary.words.tolist() == expected_words
+    assert binary.symbols == {}
+
+    asm_file = os.path.join(RESOURCE_DIR, "Max.asm")
+    compile_file_to_binary(asm_file, binary_file.strpath)
+    assert load_binary_file(binary_file.strpath).symbols == \
+        {"OUTPUT_FIRST": 10, "OUTPUT_D": 12, "INFINITE_LOOP": 14}
+
+
+def test_pack_symbols():
+    symbols = {"LOOP": 4, "Sys.init": 12345, "END": 0x7FFF}
+    section = pack_symbols(symbols)
+    assert len(section) % 4 == 0
+    assert unpack_symbols(section) == symbols
+
+
+def test_load_illegal_file(tmpdir):
+    not_binary = tmpdir.join("Add" + HACK_BINARY_EXT)
+    not_binary.write(open(os.path.join(RESOURCE_DIR, "Add.hack")).read())
+    with pytest.raises(RuntimeError):
+        load_binary_file(not_binary.strpath)
+
+    truncated = tmpdir.join("Truncated" + HACK_BINARY_EXT)
+    write_binary_file(truncated.strpath, [1, 2, 3])
+    truncated.write(truncated.read("rb")[:-2], "wb")
+    with pytest.raises(RuntimeError):
+        load_binary_file(truncated.strpath)
+
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from hack_assembler.assembler import compile_file, compile_file_to_binary
+from hack_assembler.binary import HACK_BINARY_EXT
+from hack_assembler.disassembler import (disassemble_word, disassemble,
+                                         disassemble_file)
+from hack_assembler.parser import parse_data
+
+RESOURCE_DIR = os.path.join(os.path.dirname(__file__), 'resources')
+
+
+@pytest.mark.parametrize(("word", "expected_text"),
+    [
+        (0b0000000000001100, "@12"),
+        (0b1111110010101000, "AM=M-1"),
+        (0b1110001100000001, "D;JGT"),
+        (0b1110101010000111, "0;JMP"),
+        (0b1110010101111110, "AMD=D|A;JLE"),
+        (0b1110101010000000, "0"),
+    ])
+def test_disassemble_word(word, expected_text):
+    assert disassemble_word(word) == expected_text
+
+
+@pytest.mark.parametrize(("word",),
+    [
+        (0b1000000000000000,),
+        # Valid ALU bits without mnemonic.
+        (0b1110000001000000,),
+    ])
+def test_disassemble_illegal_word(word):
+    with pytest.raises(RuntimeError):
+        disassemble_word(word)
+
+
+@pytest.mark.parametrize(("program",),
+            [
+                ("Add",),
+                ("Max",),
+                ("Pong",),
+                ("Rect",),
+            ])
+def test_disassemble_round_trip(program, tmpdir):
+    asm_file = os.path.join(RESOURCE_DIR, program + ".asm")
+    hack_file = tmpdir.join(program + ".hack")
+    map_file = tmpdir.join(program + ".map")
+    hack_file.write(compile_file(asm_file, source_map_path=map_file.strpath))
+
+    # The source map next to the hack file is used for the labels.
+    disassembled_file = tmpdir.join(program + "Dis.asm")
+    disassembled_file.write(disassemble_file(hack_file.strpath))
+    assert compile_file(disassembled_file.strpath) == hack_file.read()
+
+    labels = [line for line in parse_data(open(asm_file).read())
+              if line.__class__.__name__ == "Label"]
+    assert [line for line in parse_data(disassembled_file.read())
+            if line.__class__.__name__ == "Label"] == labels
+
+
+def test_disassemble_binary_symbols(tmpdir):
+    asm_file = os.path.join(RESOURCE_DIR, "Max.asm")
+    binary_file = tmpdir.join("Max" + HACK_BINARY_EXT)
+    compile_file_to_binary(asm_file, binary_file.strpath)
+
+    text = disassemble_file(binary_file.strpath)
+    assert "(OUTPUT_FIRST)\n    @0" in text
+    assert "@10                 // 4 -> OUTPUT_FIRST" in text
+
+
+def test_disassemble_annotations():
+    text = disassemble([0b0000000000000000, 0b1110101010000111])
+    assert text.splitlines() == ["    @0                  // 0",
+                                 "    0;JMP               // 1"]
@@ -0,0 +1,126 @@
+import os
+
+import pytest
+
+from hack_assembler.assembler import compile_file
+from hack_assembler.optimizer import optimize, count_words
+from hack_assembler.parser import parse_data, parse_file, Label
+
+RESOURCE_DIR = os.path.join(os.path.dirname(__file__), 'resources')
+
+
+@pytest.mark.parametrize(("program", "expected_program"),
+    [
+        # @SP reloaded after the increment.
+        ("@SP\nM=M+1\n@SP\nA=M-1\nM=-M",
+         "@SP\nM=M+1\nA=M-1\nM=-M"),
+        # Push followed by pop.
+        ("@7\nD=A\n@SP\nA=M\nM=D\n@SP\nM=M+1\n"
+         "@SP\nAM=M-1\nD=M\nA=A-1\nM=D+M",
+         "@7\nD=A\n@SP\nA=M\nM=D\nA=A-1\nM=D+M"),
+        # Constant computed by the ALU.
+        ("@0\nD=A\n@SP\nA=M\nM=D",
+         "D=0\n@SP\nA=M\nM=D"),
+        ("@1\nD=A\n@R13\nM=D",
+         "D=1\n@R13\nM=D"),
+        # Jump to the next instruction, the labels are kept.
+        ("@END\n0;JMP\n(OTHER)\n(END)\n@END\n0;JMP",
+         "(OTHER)\n(END)\n@END\n0;JMP"),
+    ])
+def test_optimize(program, expected_program):
+    optimized, saved_words = optimize(parse_data(program))
+    expected = parse_data(expected_program)
+    assert optimized == expected
+    assert saved_words == count_words(parse_data(program)) - \
+        count_words(expected)
+
+
+@pytest.mark.parametrize(("program",),
+    [
+        # A is read after the constant.
+        ("@0\nD=A\nM=D\n@END\n0;JMP",),
+        # A may differ when reached through the label.
+        ("@SP\nM=M+1\n(LOOP)\n@SP\nA=M-1\nM=-M",),
+        # A was changed by the C instruction.
+        ("@SP\nA=M\n@SP\nM=M+1",),
+        # A is read after the jump target.
+        ("@NEXT\nD;JGT\n(NEXT)\nM=D",),
+        # The jump target is not the next instruction.
+        ("@END\nD;JGT\nD=0\n(END)\n@END\n0;JMP",),
+    ])
+def test_optimize_nothing_to_do(program):
+    optimized, saved_words = optimize(parse_data(program))
+    assert optimized == parse_data(program)
+    assert saved_words == 0
+
+
+@pytest.mark.parametrize(("asm_file",),
+            [
+                ("Add",),
+                ("Max",),
+                ("Pong",),
+                ("Rect",),
+            ])
+def test_optimize_keeps_labels(asm_file):
+    asm_file = os.path.join(RESOURCE_DIR, asm_file + ".asm")
+    assembly_lines = parse_file(asm_file)
+    optimized, saved_words = optimize(assembly_lines)
+
+    assert [line for line in optimized if isinstance(line, Label)] == \
+        [line for line in assembly_lines if isinstance(line, Label)]
+    assert len(compile_file(asm_file, optimize=True).splitlines()) == \
+        len(compile_file(asm_file).splitlines()) - saved_words
+
+
+
+VM_RESOURCE_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..",
+                               "vm_translator", "tests", "resources")
+
+
+# The programs which call functions keep return addresses in the RAM, which
+# move with the optimized code, so only the programs without calls are
+# compared RAM for RAM.
+@pytest.mark.parametrize(("vm_program", "translate_options"),
+            [
+                ("StackArithmetic/SimpleAdd", dict()),
+                ("StackArithmetic/StackTest", dict()),
+                ("MemoryAccess/BasicTest", dict()),
+                ("MemoryAccess/PointerTest", dict()),
+                ("MemoryAccess/StaticTest", dict()),
+                ("ProgramFlow/BasicLoop", dict()),
+                ("ProgramFlow/FibonacciSeries", dict()),
+                ("FunctionCalls/SimpleFunction", dict()),
+                ("StackArithmetic/StackTest", dict(cache_top=True)),
+                ("ProgramFlow/FibonacciSeries", dict(cache_top=True,
+                                                     track_sp=True)),
+            ])
+def test_optimize_keeps_behavior(vm_program, translate_options, tmpdir):
+    from hack_emulator.emulator import HackEmulator, parse_hack
+    from hack_emulator.script import parse_script
+    from vm_translator.main import translate_to_hack
+
+    program_dir = os.path.join(VM_RESOURCE_DIR, vm_program)
+    name = os.path.basename(program_dir)
+    asm_path = tmpdir.join(name + ".asm").strpath
+    translate_to_hack(sorted(os.path.join(program_dir, filename)
+                             for filename in os.listdir(program_dir)
+                             if filename.endswith(".vm")),
+                      asm_path, processes=1, **translate_options)
+    # The initial RAM of the program, set by its test script.
+    script = open(os.path.join(program_dir, name + ".tst")).read()
+    initial_ram = [(int(command[1][len("RAM["):-1]), int(command[2]))
+                   for command in parse_script(script) if command[0] == "set"]
+
+    emulators = []
+    for optimize in (False, True):
+        emulator = HackEmulator(parse_hack(compile_file(asm_path,
+                                                        optimize=optimize)))
+        for address, value in initial_ram:
+            emulator.ram[address] = value
+        emulator.run(100000)
+        assert emulator.halted
+        emulators.append(emulator)
+
+    # Compared as lists, the assertion message of arrays that big is slow.
+    assert emulators[0].ram.tolist() == emulators[1].ram.tolist()
+    assert emulators[1].cycles <= emulators[0].cycles
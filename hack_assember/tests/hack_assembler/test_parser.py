@@ -20,12 +20,37 @@ from hack_assembler.parser import (parse_program_line,
                              ("@12", AInstruction(value="12")),
 
                              ("(LOOP_BEGIN)", Label(name="LOOP_BEGIN")),
+
+                             ("  MD = M-1 ; JNE  // dec", CInstruction(
+                                 dest=c.DEST_MD, comp=c.COMP_M_MINUS_1,
+                                 jmp=c.JUMP_JNE)),
+
+                             ("\t@sys.init//call", AInstruction(value="sys.init")),
+
+                             ("( END )  ", Label(name="END")),
+
+                             ("// comment only", None),
+
+                             ("   ", None),
                          ])
 
 def test_parse_program_line(line, expected_result):
     assert parse_program_line(line) == expected_result
 
 
+@pytest.mark.parametrize(("line",),
+                         [
+                             ("X=D",),
+                             ("D=D*A",),
+                             ("0;JMPX",),
+                             ("D=A=M",),
+                             ("(LOOP",),
+                         ])
+def test_parse_illegal_program_line(line):
+    with pytest.raises(AssertionError):
+        parse_program_line(line)
+
+
 RESOURCE_DIR = os.path.join(os.path.dirname(__file__), 'resources')
 
 @pytest.mark.parametrize(("asm_file",),
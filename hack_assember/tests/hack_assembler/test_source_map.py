@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from hack_assembler.assembler import assemble, compile_file
+from hack_assembler.optimizer import optimize_numbered
+from hack_assembler.parser import parse_data, parse_file_numbered
+from hack_assembler.source_map import (build_source_map, write_source_map,
+                                       load_source_map, SourceLocation)
+
+RESOURCE_DIR = os.path.join(os.path.dirname(__file__), 'resources')
+
+
+@pytest.mark.parametrize(("address", "expected_location"),
+    [
+        (0, SourceLocation(line=8, label=None)),
+        (5, SourceLocation(line=13, label=None)),
+        (10, SourceLocation(line=19, label="OUTPUT_FIRST")),
+        (11, SourceLocation(line=20, label="OUTPUT_FIRST")),
+        (13, SourceLocation(line=23, label="OUTPUT_D")),
+        (15, SourceLocation(line=26, label="INFINITE_LOOP")),
+    ])
+def test_lookup(address, expected_location):
+    source_map = assemble(os.path.join(RESOURCE_DIR, "Max.asm"),
+                          source_map=True).source_map
+    assert source_map.lookup(address) == expected_location
+
+
+def test_lookup_out_of_range():
+    source_map = assemble(os.path.join(RESOURCE_DIR, "Max.asm"),
+                          source_map=True).source_map
+    assert len(source_map) == 16
+    with pytest.raises(IndexError):
+        source_map.lookup(16)
+
+
+def test_labels_at():
+    assembly_lines = parse_data("(A)\n(B)\n@A\n(C)\n0;JMP")
+    source_map = build_source_map(assembly_lines, [1, 2, 3, 4, 5])
+    assert source_map.labels_at(0) == ["A", "B"]
+    assert source_map.labels_at(1) == ["C"]
+    assert source_map.lookup(0) == SourceLocation(line=3, label="B")
+    assert source_map.lookup(1) == SourceLocation(line=5, label="C")
+
+
+@pytest.mark.parametrize(("program",),
+            [
+                ("Add",),
+                ("Max",),
+                ("Pong",),
+                ("PongL",),
+            ])
+def test_write_and_load(program, tmpdir):
+    asm_file = os.path.join(RESOURCE_DIR, program + ".asm")
+    map_file = tmpdir.join(program + ".map")
+    compile_file(asm_file, source_map_path=map_file.strpath)
+
+    source_map = load_source_map(map_file.strpath)
+    expected = build_source_map(*parse_file_numbered(asm_file))
+    assert len(source_map) == len(expected)
+    assert source_map.runs == expected.runs
+    assert source_map.labels == expected.labels
+
+    # Every address points to an instruction line.
+    source_lines = open(asm_file).read().splitlines()
+    for address in xrange(0, len(source_map), 97):
+        line = source_lines[source_map.lookup(address).line - 1].strip()
+        assert line and not line.startswith("(") and not line.startswith("//")
+
+
+def test_optimized_source_map():
+    program = "@SP\nM=M+1\n(LOOP)\n@SP\nM=M+1\n@SP\nAM=M-1\nD=M\n"
+    assembly_lines = parse_data(program)
+    optimized, line_numbers, saved_words = optimize_numbered(
+        assembly_lines, range(1, len(assembly_lines) + 1))
+    source_map = build_source_map(optimized, line_numbers)
+
+    assert saved_words == 2
+    assert [source_map.lookup(address) for address in xrange(5)] == [
+        SourceLocation(line=1, label=None),
+        SourceLocation(line=2, label=None),
+        SourceLocation(line=4, label="LOOP"),
+        # "@SP / A=M" replaced the sequence starting at line 4.
+        SourceLocation(line=4, label="LOOP"),
+        SourceLocation(line=8, label="LOOP"),
+    ]
@@ -0,0 +1,32 @@
+# Size (in 16 bit words) of the instruction and the data memories.
+# Both are addressed by the 15 lower bits of the A register.
+ROM_SIZE = 0x8000
+RAM_SIZE = 0x8000
+
+# Memory mapped I/O.
+SCREEN = 0x4000
+KBD = 0x6000
+
+# Instruction decoding masks (see the Hack machine language specification).
+C_INSTRUCTION_MASK = 0x8000
+A_BIT_MASK = 0x1000
+COMP_SHIFT = 6
+COMP_MASK = 0x3f
+DEST_SHIFT = 3
+DEST_MASK = 0x7
+JUMP_MASK = 0x7
+
+# dest bits
+DEST_A = 0x4
+DEST_D = 0x2
+DEST_M = 0x1
+
+# jump bits
+JUMP_LT = 0x4
+JUMP_EQ = 0x2
+JUMP_GT = 0x1
+JUMP_JMP = JUMP_LT | JUMP_EQ | JUMP_GT
+
+# Default amount of cycles to execute before giving up on a program that
+# never halts.
+DEFAULT_CYCLE_BUDGET = 10 ** 7
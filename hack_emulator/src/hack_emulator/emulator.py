@@ -0,0 +1,239 @@
+import array
+
+from hack_emulator import consts as c
+
+HACK_EXT = ".hack"
+HACK_BINARY_EXT = ".hackb"
+
+# Marks a decoded jump which never leaves the current loop (see decode_rom).
+HALT = "HALT"
+
+
+def _wrap(value):
+    """
+    Wrap python integer to signed 16 bit word.
+    """
+    return ((value + 0x8000) & 0xFFFF) - 0x8000
+
+
+def _make_alu_function(comp_bits):
+    """
+    Build the function of a general ALU control bits combination
+    (zx, nx, zy, ny, f, no). Used only for the combinations which have no
+    mnemonic in the assembly language.
+    """
+    zx, nx, zy, ny, f, no = [(comp_bits >> shift) & 1 for shift in
+                             (5, 4, 3, 2, 1, 0)]
+
+    def compute(x, y):
+        if zx: x = 0
+        if nx: x = ~x
+        if zy: y = 0
+        if ny: y = ~y
+        out = _wrap(x + y) if f else x & y
+        if no: out = ~out
+        return out
+
+    return compute
+
+
+# Map between the comp control bits (without the "a" bit) to the function
+# over x (always D) and y (A or M). All the values are signed 16 bit words,
+# the functions wrap only the results which may overflow.
+COMP_BITS_TO_FUNCTION = {
+    0b101010: lambda x, y: 0,
+    0b111111: lambda x, y: 1,
+    0b111010: lambda x, y: -1,
+    0b001100: lambda x, y: x,
+    0b110000: lambda x, y: y,
+    0b001101: lambda x, y: ~x,
+    0b110001: lambda x, y: ~y,
+    0b001111: lambda x, y: -x if x != -0x8000 else x,
+    0b110011: lambda x, y: -y if y != -0x8000 else y,
+    0b011111: lambda x, y: x + 1 if x != 0x7FFF else -0x8000,
+    0b110111: lambda x, y: y + 1 if y != 0x7FFF else -0x8000,
+    0b001110: lambda x, y: x - 1 if x != -0x8000 else 0x7FFF,
+    0b110010: lambda x, y: y - 1 if y != -0x8000 else 0x7FFF,
+    0b000010: lambda x, y: ((x + y + 0x8000) & 0xFFFF) - 0x8000,
+    0b010011: lambda x, y: ((x - y + 0x8000) & 0xFFFF) - 0x8000,
+    0b000111: lambda x, y: ((y - x + 0x8000) & 0xFFFF) - 0x8000,
+    0b000000: lambda x, y: x & y,
+    0b010101: lambda x, y: x | y,
+}
+
+# Map between jump bits to the jump decision given the sign of the
+# computation result. The decision is a tuple indexed by
+# (out == 0, out > 0, out < 0).
+JUMP_BITS_TO_CONDITION = dict(
+    (jump_bits, (bool(jump_bits & c.JUMP_EQ),
+                 bool(jump_bits & c.JUMP_GT),
+                 bool(jump_bits & c.JUMP_LT)))
+    for jump_bits in xrange(1, c.JUMP_MASK + 1)
+)
+
+
+def parse_hack(data):
+    """
+    Parse the textual hack program (as produced by the assembler).
+    :param data: The content of .hack file.
+    :return: array of unsigned 16 bit words.
+    """
+    rom = array.array('H')
+    for line in data.splitlines():
+        line = line.strip()
+        if line:
+            rom.append(int(line, 2))
+    return rom
+
+
+def load_hack_file(path):
+    """
+    Load .hack file, or packed binary .hackb file (see hack_assembler.binary).
+    :param path: The file path.
+    :return: array of unsigned 16 bit words.
+    """
+    if path.endswith(HACK_BINARY_EXT):
+        from hack_assembler.binary import load_binary_file
+        return load_binary_file(path).words
+    return parse_hack(open(path, 'rt').read())
+
+
+def decode_instruction(word):
+    """
+    Decode single instruction word.
+    :param word: unsigned 16 bit word.
+    :return: int for A instruction (the value to load) or tuple of
+    (compute function, reads M, dest bits, jump condition) for C instruction.
+    """
+    if not word & c.C_INSTRUCTION_MASK:
+        return word
+
+    comp_bits = (word >> c.COMP_SHIFT) & c.COMP_MASK
+    compute = COMP_BITS_TO_FUNCTION.get(comp_bits)
+    if compute is None:
+        compute = _make_alu_function(comp_bits)
+
+    reads_m = bool(word & c.A_BIT_MASK)
+    dest = (word >> c.DEST_SHIFT) & c.DEST_MASK
+    jump = JUMP_BITS_TO_CONDITION.get(word & c.JUMP_MASK, None)
+    return (compute, reads_m, bool(dest & c.DEST_M), bool(dest & c.DEST_D),
+            bool(dest & c.DEST_A), jump)
+
+
+def decode_rom(rom):
+    """
+    Decode the whole ROM into a dispatch table, one entry per address.
+    Tight self loops (the "@END / 0;JMP" idiom which ends hack programs,
+    without dest and with A set to the loop address), and the empty ROM
+    after the program are decoded as HALT. The loop halts only when it is
+    reached with A set to its address (see HackEmulator.run).
+    :param rom: sequence of 16 bit words.
+    :return: list of size ROM_SIZE of decoded instructions.
+    """
+    assert len(rom) <= c.ROM_SIZE, "Program too large: %d words" % len(rom)
+
+    halt = (lambda x, y: 0, False, False, False, False, HALT)
+    program = [decode_instruction(word) for word in rom]
+
+    for address in xrange(1, len(program)):
+        previous, instruction = rom[address - 1], program[address]
+        if (not previous & c.C_INSTRUCTION_MASK and
+                previous == address - 1 and
+                not isinstance(instruction, int) and
+                not any(instruction[2:5]) and
+                instruction[5] == JUMP_BITS_TO_CONDITION[c.JUMP_JMP]):
+            program[address] = halt
+
+    program.extend([halt] * (c.ROM_SIZE - len(program)))
+    return program
+
+
+class HackEmulator(object):
+
+    def __init__(self, rom=()):
+        self.ram = array.array('h', [0]) * c.RAM_SIZE
+        self.load_rom(rom)
+
+    def load_rom(self, rom):
+        """
+        Load new program and reset the CPU. The RAM is left as is.
+        :param rom: sequence of 16 bit words.
+        """
+        self.rom = array.array('H', rom)
+        self._program = decode_rom(self.rom)
+        self.reset()
+
+    def load_hack_file(self, path):
+        self.load_rom(load_hack_file(path))
+
+    def reset(self):
+        """
+        Reset the CPU registers (like the reset pin of the computer).
+        """
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+        self.halted = False
+
+    def run(self, max_cycles=c.DEFAULT_CYCLE_BUDGET):
+        """
+        Execute the program until it halts or until max_cycles instructions
+        were executed.
+        :param max_cycles: The cycle budget for this run.
+        :return: The number of executed instructions.
+        """
+        program = self._program
+        ram = self.ram
+        rom_length = len(self.rom)
+        a, d, pc = self.a, self.d, self.pc
+        executed = 0
+
+        while executed < max_cycles:
+            instruction = program[pc]
+            executed += 1
+
+            # A instruction
+            if instruction.__class__ is int:
+                a = instruction
+                pc += 1
+                continue
+
+            # C instruction
+            compute, reads_m, writes_m, writes_d, writes_a, jump = instruction
+            out = compute(d, ram[a]) if reads_m else compute(d, a)
+
+            if writes_m:
+                ram[a] = out
+            if writes_d:
+                d = out
+
+            # The jump target is the value of A before this instruction.
+            if jump is None:
+                pc += 1
+            elif jump is HALT:
+                if pc < rom_length and a != pc - 1:
+                    # Jumped straight into the loop with other A, it is
+                    # plain 0;JMP.
+                    pc = a & 0x7FFF
+                    continue
+                executed -= 1
+                self.halted = True
+                break
+            elif jump[(out > 0) - (out < 0)]:
+                pc = a & 0x7FFF
+            else:
+                pc += 1
+
+            if writes_a:
+                a = out
+
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        return executed
+
+    def step(self):
+        """
+        Execute single instruction.
+        """
+        return self.run(max_cycles=1)
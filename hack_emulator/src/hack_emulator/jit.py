@@ -0,0 +1,263 @@
+"""
+Basic block JIT for the hack emulator.
+
+Blocks are discovered lazily: the first time the program counter reaches an
+address, the straight line code starting at it (up to and including the
+first jump, or up to the next static jump target) is translated to python
+source, compiled and kept in a block cache keyed by the address.
+"""
+from hack_emulator import consts as c
+from hack_emulator.emulator import HackEmulator, HALT, _make_alu_function
+
+# Upper bound for the length of a single block, keeps the compile time of
+# long straight line code (like big data initialization routines) bounded.
+MAX_BLOCK_LENGTH = 512
+
+# Map between the comp control bits (without the "a" bit) to python
+# expression over x (always d) and y (a or M). Every template uses y at most
+# once, so y may be a memory read.
+COMP_BITS_TO_SOURCE = {
+    0b101010: "0",
+    0b111111: "1",
+    0b111010: "-1",
+    0b001100: "{x}",
+    0b110000: "{y}",
+    0b001101: "~{x}",
+    0b110001: "~{y}",
+    0b001111: "((0x8000 - {x}) & 0xFFFF) - 0x8000",
+    0b110011: "((0x8000 - {y}) & 0xFFFF) - 0x8000",
+    0b011111: "(({x} + 0x8001) & 0xFFFF) - 0x8000",
+    0b110111: "(({y} + 0x8001) & 0xFFFF) - 0x8000",
+    0b001110: "(({x} + 0x7FFF) & 0xFFFF) - 0x8000",
+    0b110010: "(({y} + 0x7FFF) & 0xFFFF) - 0x8000",
+    0b000010: "(({x} + {y} + 0x8000) & 0xFFFF) - 0x8000",
+    0b010011: "(({x} - {y} + 0x8000) & 0xFFFF) - 0x8000",
+    0b000111: "(({y} - {x} + 0x8000) & 0xFFFF) - 0x8000",
+    0b000000: "{x} & {y}",
+    0b010101: "{x} | {y}",
+}
+
+# Map between jump bits to python condition over the computation result.
+JUMP_BITS_TO_CONDITION_SOURCE = {
+    c.JUMP_GT: "out > 0",
+    c.JUMP_EQ: "out == 0",
+    c.JUMP_GT | c.JUMP_EQ: "out >= 0",
+    c.JUMP_LT: "out < 0",
+    c.JUMP_LT | c.JUMP_GT: "out != 0",
+    c.JUMP_LT | c.JUMP_EQ: "out <= 0",
+    c.JUMP_JMP: None,
+}
+
+
+def find_jump_targets(rom):
+    """
+    Find the static jump targets, the values loaded to A just before a jump.
+    (Dynamic targets such as return addresses become blocks when reached)
+    :param rom: sequence of 16 bit words.
+    :return: set of addresses.
+    """
+    targets = set([0])
+    for address in xrange(1, len(rom)):
+        word, previous = rom[address], rom[address - 1]
+        if (word & c.C_INSTRUCTION_MASK and word & c.JUMP_MASK and
+                not previous & c.C_INSTRUCTION_MASK):
+            targets.add(previous)
+    return targets
+
+
+class BlockCompiler(object):
+
+    def __init__(self, rom, program):
+        """
+        :param rom: sequence of 16 bit words.
+        :param program: The decoded ROM (see emulator.decode_rom), used to
+        detect halt loops.
+        """
+        self._rom = rom
+        self._program = program
+        self._jump_targets = find_jump_targets(rom)
+        self._namespace = {}
+
+    def is_halt(self, address):
+        instruction = self._program[address]
+        return not isinstance(instruction, int) and instruction[-1] is HALT
+
+    def compile_block(self, address):
+        """
+        Compile the block starting at the given address.
+        :return: tuple of (function(ram, a, d) -> (a, d, pc), block length)
+        or None if the address is a halt loop.
+        """
+        if self.is_halt(address):
+            return None
+
+        name = "block_%d" % address
+        lines, length = self._block_source(address)
+        source = "def %s(ram, a, d):\n    %s\n" % (name, "\n    ".join(lines))
+        exec compile(source, "<hack block %d>" % address, "exec") in self._namespace
+        return self._namespace[name], length
+
+    def _block_source(self, begin):
+        lines = []
+        # The value of A if it is known at compile time.
+        known_a = None
+        address = begin
+
+        while True:
+            word = self._rom[address]
+            address += 1
+
+            if not word & c.C_INSTRUCTION_MASK:
+                known_a = word
+                lines.append("a = %d" % word)
+            else:
+                jump_bits = word & c.JUMP_MASK
+                # The jump target is the value of A before this instruction.
+                if word & (c.DEST_A << c.DEST_SHIFT):
+                    target = "target & 0x7FFF"
+                elif known_a is not None:
+                    target = str(known_a)
+                else:
+                    target = "a & 0x7FFF"
+
+                known_a = self._c_instruction_source(word, known_a, lines)
+                if jump_bits:
+                    self._jump_source(jump_bits, target, address, lines)
+                    return lines, address - begin
+
+            if (address - begin >= MAX_BLOCK_LENGTH or
+                    address >= len(self._rom) or
+                    address in self._jump_targets or
+                    self.is_halt(address)):
+                lines.append("return a, d, %d" % address)
+                return lines, address - begin
+
+    def _c_instruction_source(self, word, known_a, lines):
+        """
+        Append the source of C instruction (without the jump).
+        :return: The value of A after the instruction if known.
+        """
+        comp_bits = (word >> c.COMP_SHIFT) & c.COMP_MASK
+        dest = (word >> c.DEST_SHIFT) & c.DEST_MASK
+        jump_bits = word & c.JUMP_MASK
+
+        if word & c.A_BIT_MASK:
+            y = "ram[%d]" % known_a if known_a is not None else "ram[a]"
+        else:
+            y = "a"
+
+        template = COMP_BITS_TO_SOURCE.get(comp_bits)
+        if template is None:
+            alu_name = "alu_%d" % comp_bits
+            self._namespace[alu_name] = _make_alu_function(comp_bits)
+            template = alu_name + "({x}, {y})"
+        expression = template.format(x="d", y=y)
+
+        if jump_bits and dest & c.DEST_A:
+            lines.append("target = a")
+
+        ram_cell = "ram[%s]" % (known_a if known_a is not None else "a")
+        destinations = [target for bit, target in ((c.DEST_M, ram_cell),
+                                                   (c.DEST_D, "d"),
+                                                   (c.DEST_A, "a"))
+                        if dest & bit]
+
+        if jump_bits or len(destinations) > 1:
+            lines.append("out = " + expression)
+            lines.extend("%s = out" % target for target in destinations)
+        elif destinations:
+            lines.append("%s = %s" % (destinations[0], expression))
+
+        return None if dest & c.DEST_A else known_a
+
+    def _jump_source(self, jump_bits, target, next_address, lines):
+        condition = JUMP_BITS_TO_CONDITION_SOURCE[jump_bits]
+        if condition is None:
+            lines.append("return a, d, " + target)
+        else:
+            lines.append("if %s: return a, d, %s" % (condition, target))
+            lines.append("return a, d, %d" % next_address)
+
+
+class JitEmulator(HackEmulator):
+    """
+    Hack emulator which executes compiled basic blocks. Behaves exactly
+    as HackEmulator, the last partial block of a run (when the cycle budget
+    ends in the middle of a block) is executed by the interpreter.
+    """
+
+    def __init__(self, rom=(), self_check=False):
+        """
+        :param self_check: Execute each block also in the interpreter
+        and compare the results (slow, for debugging the JIT).
+        """
+        self.self_check = self_check
+        super(JitEmulator, self).__init__(rom)
+
+    def load_rom(self, rom):
+        super(JitEmulator, self).load_rom(rom)
+        self._compiler = BlockCompiler(self.rom, self._program)
+        self._blocks = [None] * c.ROM_SIZE
+        if self.self_check:
+            self._reference = HackEmulator(self.rom)
+
+    def run(self, max_cycles=c.DEFAULT_CYCLE_BUDGET):
+        blocks = self._blocks
+        compile_block = self._compiler.compile_block
+        ram = self.ram
+        a, d, pc = self.a, self.d, self.pc
+        executed = 0
+
+        if self.self_check:
+            self._sync_reference()
+
+        while True:
+            block = blocks[pc]
+            if block is None:
+                block = blocks[pc] = compile_block(pc) or (None, 0)
+
+            function, length = block
+            if function is None:
+                if pc < len(self.rom) and a != pc - 1:
+                    # Jumped straight into the halt loop with other A (see
+                    # HackEmulator.run).
+                    if executed + 1 > max_cycles:
+                        break
+                    pc = a & 0x7FFF
+                    executed += 1
+                    continue
+                self.halted = True
+                break
+            if executed + length > max_cycles:
+                break
+
+            a, d, pc = function(ram, a, d)
+            executed += length
+
+            if self.self_check:
+                self._check_against_reference(a, d, pc, length)
+
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+
+        # Finish the cycle budget in the middle of the block.
+        if not self.halted and executed < max_cycles:
+            executed += super(JitEmulator, self).run(max_cycles - executed)
+        return executed
+
+    def _sync_reference(self):
+        reference = self._reference
+        reference.ram[:] = self.ram
+        reference.a, reference.d, reference.pc = self.a, self.d, self.pc
+
+    def _check_against_reference(self, a, d, pc, length):
+        reference = self._reference
+        block_address = reference.pc
+        reference.run(length)
+        if ((a, d, pc) != (reference.a, reference.d, reference.pc) or
+                self.ram != reference.ram):
+            raise RuntimeError(
+                "Block at %d diverged from the interpreter: "
+                "(A, D, PC) = %s expected %s" % (
+                    block_address, (a, d, pc),
+                    (reference.a, reference.d, reference.pc)))
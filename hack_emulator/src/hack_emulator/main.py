@@ -0,0 +1,49 @@
+import sys
+import time
+
+from hack_emulator.consts import DEFAULT_CYCLE_BUDGET
+from hack_emulator.emulator import HackEmulator, load_hack_file
+from hack_emulator.jit import JitEmulator
+from hack_emulator.script import TST_EXT, run_test_scripts
+
+JIT_FLAG = "--jit"
+
+
+def run_program(path, max_cycles, emulator_class):
+    emulator = emulator_class(load_hack_file(path))
+    start = time.time()
+    executed = emulator.run(max_cycles)
+    elapsed = time.time() - start
+
+    print "Executed %d instructions in %.2f seconds (%.2f MIPS)" % (
+        executed, elapsed, executed / elapsed / 10 ** 6 if elapsed else 0)
+    print "%s at pc=%d, A=%d, D=%d" % (
+        "Halted" if emulator.halted else "Cycle budget exhausted",
+        emulator.pc, emulator.a, emulator.d)
+
+
+def run_scripts(tst_paths):
+    results = run_test_scripts(tst_paths)
+    for result in results:
+        if result.passed:
+            print "PASS %s" % result.tst_path
+        else:
+            print "FAIL %s (comparison failure at line %d)" % (
+                result.tst_path, result.failure_line)
+    return all(result.passed for result in results)
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != JIT_FLAG]
+    if args and all(arg.endswith(TST_EXT) for arg in args):
+        sys.exit(0 if run_scripts(args) else 1)
+
+    if len(args) not in (1, 2):
+        print "Usage: %s [%s] <hack.file> [max cycles]" % (sys.argv[0],
+                                                           JIT_FLAG)
+        print "       %s <tst.file> [<tst.file> ...]" % sys.argv[0]
+        sys.exit(1)
+
+    max_cycles = int(args[1]) if len(args) == 2 else DEFAULT_CYCLE_BUDGET
+    run_program(args[0], max_cycles,
+                JitEmulator if JIT_FLAG in sys.argv else HackEmulator)
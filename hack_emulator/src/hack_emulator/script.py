@@ -0,0 +1,305 @@
+"""
+Interpreter for the nand2tetris test script language (.tst files).
+
+Supports the subset used by the CPU emulator scripts: load, output-file,
+compare-to, output-list, output, set, repeat, ticktock (and tick / tock).
+The output is written to the output file just like the java CPUEmulator,
+and then compared with the compare file.
+"""
+import collections
+import multiprocessing
+import os
+import re
+
+from hack_emulator.emulator import HackEmulator, load_hack_file, parse_hack
+
+TST_EXT = ".tst"
+
+# Tokens are the punctuation characters or any run of other characters.
+_TOKEN_REGEX = re.compile(r"[{},;]|[^\s{},;]+")
+_COMMENT_REGEX = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+
+# <variable>%<format><left padding>.<width>.<right padding>
+_OUTPUT_COLUMN_REGEX = re.compile(r"^(.+)%([BDXS])(\d+)\.(\d+)\.(\d+)$")
+_RAM_REGEX = re.compile(r"^RAM\[(\d+)\]$")
+
+REPEAT = "repeat"
+TICKTOCK = "ticktock"
+
+OutputColumn = collections.namedtuple("OutputColumn", ["variable", "format",
+                                                       "left", "width",
+                                                       "right"])
+
+ScriptResult = collections.namedtuple("ScriptResult", ["tst_path", "passed",
+                                                       "failure_line"])
+
+
+def parse_script(script):
+    """
+    Parse test script into list of commands.
+    :param script: The content of .tst file.
+    :return: list of commands, where command is a tuple of words or
+    ("repeat", count, [commands]) for repeat blocks.
+    """
+    tokens = _TOKEN_REGEX.findall(_COMMENT_REGEX.sub(" ", script))
+    commands, _ = _parse_commands(tokens, 0, in_block=False)
+    return commands
+
+
+def _parse_commands(tokens, position, in_block):
+    """
+    Parse commands until the end of the current block.
+    :return: tuple of (commands, position after the block)
+    """
+    commands = []
+    words = []
+    while position < len(tokens):
+        token = tokens[position]
+        position += 1
+
+        if token in (",", ";"):
+            if words:
+                commands.append(tuple(words))
+                words = []
+        elif token == "{":
+            if len(words) != 2 or words[0] != REPEAT:
+                raise RuntimeError("Unsupported block: %s" % " ".join(words))
+            body, position = _parse_commands(tokens, position, in_block=True)
+            commands.append((REPEAT, int(words[1]), body))
+            words = []
+        elif token == "}":
+            if not in_block:
+                raise RuntimeError("Unexpected '}' in test script")
+            break
+        else:
+            words.append(token)
+    else:
+        if in_block:
+            raise RuntimeError("Missing '}' in test script")
+
+    if words:
+        commands.append(tuple(words))
+    return commands, position
+
+
+def parse_output_column(column):
+    match = _OUTPUT_COLUMN_REGEX.match(column)
+    if not match:
+        raise RuntimeError("Illegal output-list column: %s" % column)
+    variable, output_format, left, width, right = match.groups()
+    return OutputColumn(variable, output_format, int(left), int(width),
+                        int(right))
+
+
+def format_value(value, column):
+    """
+    Format single value of output line according to its column format.
+    """
+    if column.format == "D":
+        text = str(value)
+    elif column.format == "X":
+        text = "%04X" % (value & 0xFFFF)
+    elif column.format == "B":
+        text = bin(value & 0xFFFF)[2:].zfill(16)
+    else:
+        text = str(value)
+    text = text[-column.width:].rjust(column.width)
+    return " " * column.left + text + " " * column.right
+
+
+def format_header(column):
+    """
+    Format the column header, the variable name centered over the column.
+    """
+    total_width = column.left + column.width + column.right
+    name = column.variable[:total_width]
+    left = (total_width - len(name)) // 2
+    return " " * left + name + " " * (total_width - len(name) - left)
+
+
+def load_program(path):
+    """
+    Load .hack or .asm file (assembled on load, just like the CPU emulator
+    does).
+    :return: array of 16 bit words.
+    """
+    if path.endswith(".asm"):
+        from hack_assembler.assembler import compile_file
+        return parse_hack(compile_file(path))
+    return load_hack_file(path)
+
+
+class ScriptRunner(object):
+
+    def __init__(self, tst_path, emulator_class=HackEmulator):
+        self._tst_path = tst_path
+        self._script_dir = os.path.dirname(os.path.abspath(tst_path))
+        self._emulator_class = emulator_class
+        self._emulator = self._create_emulator()
+        self._output_path = None
+        self._compare_path = None
+        self._output_columns = []
+        self._output_lines = []
+        self._tick = False
+
+        self._COMMAND_TO_PROCESS_METHOD = {
+            "load": self._process_load,
+            "output-file": self._process_output_file,
+            "compare-to": self._process_compare_to,
+            "output-list": self._process_output_list,
+            "output": self._process_output,
+            "set": self._process_set,
+            "ticktock": self._process_ticktock,
+            "tick": self._process_tick,
+            "tock": self._process_tock,
+            "echo": lambda *args: None,
+        }
+
+    def run(self):
+        """
+        Run the test script, write its output file and compare it.
+        :return: ScriptResult.
+        """
+        self._execute(parse_script(open(self._tst_path).read()))
+
+        if self._output_path is not None:
+            open(self._output_path, 'wb').write(
+                "".join(line + "\n" for line in self._output_lines))
+
+        failure_line = None
+        if self._compare_path is not None:
+            expected_lines = open(self._compare_path).read().splitlines()
+            for index, (line, expected) in enumerate(
+                    map(None, self._output_lines, expected_lines)):
+                if line != expected:
+                    failure_line = index + 1
+                    break
+
+        return ScriptResult(tst_path=self._tst_path,
+                            passed=failure_line is None,
+                            failure_line=failure_line)
+
+    def _create_emulator(self):
+        """
+        Create the emulator the script drives, runners of other emulators
+        override it.
+        :return: The emulator.
+        """
+        return self._emulator_class()
+
+    def _execute(self, commands):
+        for command in commands:
+            if command[0] == REPEAT:
+                _, count, body = command
+                if all(inner == (TICKTOCK,) for inner in body):
+                    # Fast path, let the emulator run the whole loop.
+                    self._clock(count * len(body))
+                else:
+                    for _ in xrange(count):
+                        self._execute(body)
+            else:
+                process_command = self._COMMAND_TO_PROCESS_METHOD.get(command[0])
+                if process_command is None:
+                    raise RuntimeError("Unsupported test script command: %s" %
+                                       " ".join(command))
+                process_command(*command[1:])
+
+    def _path(self, filename):
+        return os.path.join(self._script_dir, filename)
+
+    def _process_load(self, filename):
+        self._emulator.load_rom(load_program(self._path(filename)))
+
+    def _process_output_file(self, filename):
+        self._output_path = self._path(filename)
+
+    def _process_compare_to(self, filename):
+        self._compare_path = self._path(filename)
+
+    def _process_output_list(self, *columns):
+        self._output_columns = [parse_output_column(column)
+                                for column in columns]
+        self._output_lines.append(
+            "|%s|" % "|".join(format_header(column)
+                              for column in self._output_columns))
+
+    def _process_output(self):
+        self._output_lines.append(
+            "|%s|" % "|".join(format_value(self._get(column.variable), column)
+                              for column in self._output_columns))
+
+    def _process_set(self, variable, value):
+        self._set(variable, int(value))
+
+    def _process_ticktock(self):
+        self._clock(1)
+
+    def _process_tick(self):
+        self._tick = True
+
+    def _process_tock(self):
+        if self._tick:
+            self._tick = False
+            self._clock(1)
+
+    def _clock(self, ticks):
+        """
+        Execute ticks instructions. The CPU emulator keeps executing the halt
+        loop, so the ticks after the halt are counted as cycles as well.
+        :param ticks: Number of clock cycles.
+        """
+        executed = self._emulator.run(ticks)
+        if self._emulator.halted:
+            self._emulator.cycles += ticks - executed
+
+    def _get(self, variable):
+        ram_match = _RAM_REGEX.match(variable)
+        if ram_match:
+            return self._emulator.ram[int(ram_match.group(1))]
+        elif variable == "PC":
+            return self._emulator.pc
+        elif variable == "A":
+            return self._emulator.a
+        elif variable == "D":
+            return self._emulator.d
+        elif variable == "time":
+            return self._emulator.cycles
+        raise RuntimeError("Unsupported variable: %s" % variable)
+
+    def _set(self, variable, value):
+        ram_match = _RAM_REGEX.match(variable)
+        if ram_match:
+            self._emulator.ram[int(ram_match.group(1))] = value
+        elif variable == "PC":
+            self._emulator.pc = value
+            self._emulator.halted = False
+        elif variable == "A":
+            self._emulator.a = value
+        elif variable == "D":
+            self._emulator.d = value
+        else:
+            raise RuntimeError("Unsupported variable: %s" % variable)
+
+
+def run_test_script(tst_path):
+    """
+    Run single test script.
+    :param tst_path: Path to .tst file.
+    :return: ScriptResult.
+    """
+    return ScriptRunner(tst_path).run()
+
+
+def run_test_scripts(tst_paths, processes=None):
+    """
+    Run test scripts across a process pool.
+    :param tst_paths: Paths to .tst files.
+    :param processes: Number of worker processes (default, one per cpu).
+    :return: list of ScriptResult in the same order as the paths.
+    """
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(run_test_script, tst_paths)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,9 @@
+from setuptools import setup, find_packages
+
+setup(
+    name="hack_emulator",
+    packages=find_packages(),
+    version=0.1,
+    install_requires=["hack_assembler"],
+    author="Dan Evgi, Tom Huberman"
+)
@@ -0,0 +1,22 @@
+// Test script for Max.asm, computes R2 = max(R0, R1)
+
+load Max.asm,
+output-file Max.out,
+compare-to Max.cmp,
+output-list RAM[0]%D2.6.2 RAM[1]%D2.6.2 RAM[2]%D2.6.2;
+
+set RAM[0] 3,
+set RAM[1] 5;
+repeat 14 {
+  ticktock;
+}
+output;
+
+set PC 0,
+set RAM[0] 7,
+set RAM[1] -2;
+repeat 7 {
+  tick, tock;
+  ticktock;
+}
+output;
@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+from hack_emulator import consts as c
+from hack_emulator.emulator import (HackEmulator, load_hack_file, parse_hack,
+                                    COMP_BITS_TO_FUNCTION, _make_alu_function)
+
+RESOURCE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                            'hack_assember', 'tests', 'hack_assembler',
+                            'resources')
+
+
+def load_program(program):
+    return HackEmulator(load_hack_file(os.path.join(RESOURCE_DIR,
+                                                    program + ".hack")))
+
+
+SAMPLE_VALUES = (0, 1, -1, 2, 12345, -12345, 0x7FFF, -0x8000)
+
+@pytest.mark.parametrize(("comp_bits",), [(bits,) for bits in
+                                          sorted(COMP_BITS_TO_FUNCTION)])
+def test_comp_functions_match_alu(comp_bits):
+    alu = _make_alu_function(comp_bits)
+    compute = COMP_BITS_TO_FUNCTION[comp_bits]
+    for x in SAMPLE_VALUES:
+        for y in SAMPLE_VALUES:
+            assert compute(x, y) == alu(x, y)
+
+
+def test_add():
+    emulator = load_program("Add")
+    emulator.run()
+    assert emulator.halted
+    assert emulator.ram[0] == 5
+
+
+@pytest.mark.parametrize(("program",), [("Max",), ("MaxL",)])
+@pytest.mark.parametrize(("x", "y"), [(3, 5), (5, 3), (-4, 2), (7, 7)])
+def test_max(program, x, y):
+    emulator = load_program(program)
+    emulator.ram[0] = x
+    emulator.ram[1] = y
+    emulator.run()
+    assert emulator.halted
+    assert emulator.ram[2] == max(x, y)
+
+
+def test_rect():
+    emulator = load_program("Rect")
+    emulator.ram[0] = 4
+    emulator.run()
+    assert emulator.halted
+    rows = [emulator.ram[c.SCREEN + row * 32] for row in xrange(6)]
+    assert rows == [-1, -1, -1, -1, 0, 0]
+
+
+# @0 / M=M+1;JMP - self loop which increments RAM[0].
+INCREMENT_LOOP = """0000000000000000
+1111110111001111"""
+
+# @7 / D=A / @5 / A=D;JMP (jumps to 5 with A=7) / @4 / 0;JMP / @6 / @7 /
+# 0;JMP - the loop at 4 is entered at its jump with other A.
+JUMP_INTO_LOOP = """0000000000000111
+1110110000010000
+0000000000000101
+1110001100100111
+0000000000000100
+1110101010000111
+0000000000000110
+0000000000000111
+1110101010000111"""
+
+
+def test_self_loop_with_side_effect():
+    emulator = HackEmulator(parse_hack(INCREMENT_LOOP))
+    assert emulator.run(max_cycles=100) == 100
+    assert not emulator.halted
+    assert emulator.ram[0] == 50
+
+
+def test_jump_into_halt_loop():
+    emulator = HackEmulator(parse_hack(JUMP_INTO_LOOP))
+    emulator.run()
+    assert emulator.halted
+    assert (emulator.pc, emulator.cycles) == (8, 6)
+
+
+def test_cycle_budget():
+    emulator = load_program("Pong")
+    assert emulator.run(max_cycles=200000) == 200000
+    assert not emulator.halted
+    assert emulator.cycles == 200000
+
+    emulator.run(max_cycles=100)
+    assert emulator.cycles == 200100
+
+
+def test_step():
+    emulator = load_program("Add")
+    emulator.step()
+    assert (emulator.pc, emulator.a) == (1, 2)
+    emulator.step()
+    assert (emulator.pc, emulator.d) == (2, 2)
+
+
+def test_load_binary_file(tmpdir):
+    from hack_assembler.binary import write_binary_file
+
+    binary_file = tmpdir.join("Max.hackb")
+    write_binary_file(binary_file.strpath,
+                      load_hack_file(os.path.join(RESOURCE_DIR, "Max.hack")))
+
+    emulator = HackEmulator(load_hack_file(binary_file.strpath))
+    emulator.ram[0] = 12
+    emulator.ram[1] = 34
+    emulator.run()
+    assert emulator.halted
+    assert emulator.ram[2] == 34
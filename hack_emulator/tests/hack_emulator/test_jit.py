@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from hack_emulator import consts as c
+from hack_emulator.emulator import HackEmulator, load_hack_file, parse_hack
+from hack_emulator.jit import JitEmulator, find_jump_targets
+
+RESOURCE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                            'hack_assember', 'tests', 'hack_assembler',
+                            'resources')
+
+
+def load_rom(program):
+    return load_hack_file(os.path.join(RESOURCE_DIR, program + ".hack"))
+
+
+def test_find_jump_targets():
+    # MaxL jumps to OUTPUT_FIRST (10), OUTPUT_D (12) and INFINITE_LOOP (14)
+    assert find_jump_targets(load_rom("MaxL")) == set([0, 10, 12, 14])
+
+
+@pytest.mark.parametrize(("x", "y"), [(3, 5), (5, 3), (-4, 2)])
+def test_max(x, y):
+    emulator = JitEmulator(load_rom("Max"))
+    emulator.ram[0] = x
+    emulator.ram[1] = y
+    emulator.run()
+    assert emulator.halted
+    assert emulator.ram[2] == max(x, y)
+
+
+def test_rect():
+    emulator = JitEmulator(load_rom("RectL"), self_check=True)
+    emulator.ram[0] = 3
+    emulator.run()
+    assert emulator.halted
+    rows = [emulator.ram[c.SCREEN + row * 32] for row in xrange(5)]
+    assert rows == [-1, -1, -1, 0, 0]
+
+
+@pytest.mark.parametrize(("program", "max_cycles"), [
+    ("0000000000000000\n1111110111001111", 100),
+    # Enters the halt loop at 4 at its jump with A=7 (see test_emulator).
+    ("0000000000000111\n1110110000010000\n0000000000000101\n"
+     "1110001100100111\n0000000000000100\n1110101010000111\n"
+     "0000000000000110\n0000000000000111\n1110101010000111", 100),
+])
+def test_self_loops(program, max_cycles):
+    emulator = JitEmulator(parse_hack(program))
+    reference = HackEmulator(parse_hack(program))
+    assert emulator.run(max_cycles) == reference.run(max_cycles)
+    assert (emulator.halted, emulator.pc, emulator.ram[0]) == (
+        reference.halted, reference.pc, reference.ram[0])
+
+
+def test_self_check():
+    emulator = JitEmulator(load_rom("Pong"), self_check=True)
+    assert emulator.run(max_cycles=50000) == 50000
+
+
+@pytest.mark.parametrize(("cycles",), [(1,), (999,), (123457,)])
+def test_same_state_as_interpreter(cycles):
+    rom = load_rom("Pong")
+    interpreter, jit = HackEmulator(rom), JitEmulator(rom)
+    assert interpreter.run(cycles) == jit.run(cycles) == cycles
+    assert ((interpreter.a, interpreter.d, interpreter.pc) ==
+            (jit.a, jit.d, jit.pc))
+    assert interpreter.ram == jit.ram
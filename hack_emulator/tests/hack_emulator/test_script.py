@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from hack_emulator.script import (parse_script, parse_output_column,
+                                  format_header, format_value,
+                                  run_test_script, run_test_scripts)
+
+RESOURCE_DIR = os.path.join(os.path.dirname(__file__), 'resources')
+MAX_TST = os.path.join(RESOURCE_DIR, 'Max', 'Max.tst')
+
+
+def test_parse_script():
+    script = """
+    // comment
+    load Max.asm, /* block
+    comment */ output-list RAM[0]%D1.6.1;
+    set RAM[0] 3,
+    repeat 10 {
+      ticktock;
+      output;
+    }
+    """
+    assert parse_script(script) == [
+        ("load", "Max.asm"),
+        ("output-list", "RAM[0]%D1.6.1"),
+        ("set", "RAM[0]", "3"),
+        ("repeat", 10, [("ticktock",), ("output",)]),
+    ]
+
+
+@pytest.mark.parametrize(("script",), [("repeat 3 { ticktock;",),
+                                       ("ticktock; }",),
+                                       ("while x { ticktock; }",)])
+def test_parse_illegal_script(script):
+    with pytest.raises(RuntimeError):
+        parse_script(script)
+
+
+@pytest.mark.parametrize(
+    ("column", "value", "expected_header", "expected_value"),
+    [
+        ("RAM[0]%D1.6.1", 262, " RAM[0] ", "    262 "),
+        ("RAM[261]%D1.6.1", -3, "RAM[261]", "     -3 "),
+        ("RAM[256]%D2.6.2", -91, " RAM[256] ", "     -91  "),
+        ("A%X1.4.1", -1, "  A   ", " FFFF "),
+        ("D%B1.16.1", 5, "        D         ", " 0000000000000101 "),
+    ]
+)
+def test_format_column(column, value, expected_header, expected_value):
+    output_column = parse_output_column(column)
+    assert format_header(output_column) == expected_header
+    assert format_value(value, output_column) == expected_value
+
+
+def test_run_test_script():
+    result = run_test_script(MAX_TST)
+    assert result.passed
+    out_path = os.path.join(RESOURCE_DIR, 'Max', 'Max.out')
+    cmp_path = os.path.join(RESOURCE_DIR, 'Max', 'Max.cmp')
+    assert open(out_path).read() == open(cmp_path).read()
+
+
+def test_run_test_scripts_in_parallel():
+    results = run_test_scripts([MAX_TST] * 4, processes=2)
+    assert [result.passed for result in results] == [True] * 4
+
+
+@pytest.mark.parametrize(("clock",), [("repeat 20 { ticktock; }",),
+                                      ("repeat 10 { ticktock; tick, tock; }",)])
+def test_time_after_halt(tmpdir, clock):
+    # Max halts after 13 instructions, the clock keeps ticking in the halt
+    # loop just like in the CPU emulator.
+    tmpdir.join("Max.asm").write(
+        open(os.path.join(RESOURCE_DIR, 'Max', 'Max.asm')).read())
+    tst_path = tmpdir.join("Time.tst")
+    tst_path.write("load Max.asm, output-file Time.out,"
+                   "output-list time%D1.6.1 RAM[2]%D1.6.1;"
+                   "set RAM[0] 3, set RAM[1] 5;" + clock + "output;")
+    assert run_test_script(tst_path.strpath).passed
+    assert tmpdir.join("Time.out").read().splitlines()[1] == \
+        "|     20 |      5 |"
@@ -4,5 +4,6 @@ setup(
     name="vm_translator",
     packages=find_packages(),
     version=0.1,
+    install_requires=["hack_emulator"],
     author="Dan Evgi, Tom Huberman"
 )
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Whole program call graph, for removing the functions which are never
+called (directly or indirectly) from Sys.init, and for finding the pointers
+the call frame of each function must save.
+"""
+from vm_translator import consts
+
+
+def split_functions(instructions):
+    """
+    Split the instructions of vm file to functions.
+    :param instructions: list of instructions of single vm file.
+    :return: tuple of (instructions before the first function, list of
+    (function name, instructions) with the function declaration).
+    """
+    head = []
+    functions = []
+    for instruction in instructions:
+        if instruction.command == consts.FUNCTION:
+            functions.append((instruction.function_name, [instruction]))
+        elif functions:
+            functions[-1][1].append(instruction)
+        else:
+            head.append(instruction)
+    return head, functions
+
+
+def build_call_graph(programs):
+    """
+    :param programs: list of (path, instructions) of the program vm files.
+    :return: dict between function name to the set of the functions it calls.
+    """
+    call_graph = dict()
+    for _, instructions in programs:
+        _, functions = split_functions(instructions)
+        for function_name, body in functions:
+            call_graph[function_name] = set(
+                instruction.function_name for instruction in body
+                if instruction.command == consts.CALL)
+    return call_graph
+
+
+def find_reachable_functions(call_graph, roots=(consts.SYS_INIT,)):
+    """
+    :return: set of the functions reachable from the roots.
+    """
+    reachable = set()
+    pending = [root for root in roots if root in call_graph]
+    while pending:
+        function_name = pending.pop()
+        if function_name in reachable:
+            continue
+        reachable.add(function_name)
+        # Calls to functions which are not defined are left to fail later.
+        pending.extend(callee for callee in call_graph[function_name]
+                       if callee in call_graph)
+    return reachable
+
+
+def remove_dead_functions(programs):
+    """
+    Remove the functions which are not reachable from Sys.init. Programs
+    without Sys.init (which start at their first instruction) are returned
+    as is.
+    :param programs: list of (path, instructions) of the program vm files.
+    :return: list of (path, instructions).
+    """
+    call_graph = build_call_graph(programs)
+    if consts.SYS_INIT not in call_graph:
+        return programs
+
+    reachable = find_reachable_functions(call_graph)
+    live_programs = []
+    for path, instructions in programs:
+        head, functions = split_functions(instructions)
+        live_instructions = list(head)
+        for function_name, body in functions:
+            if function_name in reachable:
+                live_instructions.extend(body)
+        live_programs.append((path, live_instructions))
+    return live_programs
+
+
+def find_frame_pointers(programs):
+    """
+    Find the pointers (THIS and THAT) the call frames of each function must
+    save and restore: the pointers the function sets itself (pop pointer).
+    The functions it calls restore the pointers they set on return, so the
+    pointers are intact after every call. The functions which are not
+    called by the program (Sys.init, or the functions the test scripts
+    call) keep the full frame.
+    :param programs: list of (path, instructions) of the program vm files.
+    :return: dict between function name to tuple of the pointers (in the
+    order of consts.POINTERS).
+    """
+    call_graph = build_call_graph(programs)
+    called = set()
+    for callees in call_graph.itervalues():
+        called |= callees
+
+    frame_pointers = dict()
+    for _, instructions in programs:
+        _, functions = split_functions(instructions)
+        for function_name, body in functions:
+            if function_name not in called:
+                frame_pointers[function_name] = consts.POINTERS
+                continue
+            indices = set(instruction.index for instruction in body
+                          if instruction.command == consts.POP and
+                          instruction.segment == consts.POINTER)
+            frame_pointers[function_name] = tuple(
+                pointer for index, pointer in enumerate(consts.POINTERS)
+                if index in indices)
+    return frame_pointers
@@ -1,15 +1,98 @@
 import os
 import itertools
+from collections import namedtuple
+from cStringIO import StringIO
 
-from vm_translator.parser import MemoryInstruction, FunctionProtocolInstruction
+from vm_translator.parser import (MemoryInstruction,
+                                  FunctionProtocolInstruction,
+                                  ReturnInstruction)
 from vm_translator import consts
 
+# Labels of the shared call and return routines (see
+# CodeGenerator.shared_calls). "$" never appears in jack function names.
+SHARED_CALL_LABEL = "VM$call"
+SHARED_RETURN_LABEL = "VM$return"
+
+# Label of the shared multiply routine (see CodeGenerator.intrinsics).
+SHARED_MULTIPLY_LABEL = "VM$multiply"
+
+# The number of arguments of the jack OS functions which are translated to
+# inline code rather than calls (see CodeGenerator.intrinsics).
+INTRINSICS = {
+    consts.MATH_MULTIPLY: 2,
+    consts.MATH_ABS: 1,
+    consts.MEMORY_PEEK: 1,
+    consts.MEMORY_POKE: 2,
+}
+
+# The size of call frame without the pointers (the return address, LCL
+# and ARG).
+FRAME_BASE_SIZE = 3
+
+# Largest segment index which is reached with "A=A+1" increments rather
+# than with the index addition through R13.
+MAX_INDEX_INCREMENTS = 5
+
+# Largest segment index which push reaches with increments
+# (@base / A=M+1 / A=A+1), shorter than the index addition
+# (@base / D=M / @index / A=D+A).
+MAX_PUSH_INDEX_INCREMENTS = 2
+
+# The translation of vm file (or files), before it is linked into complete
+# program (see CodeGenerator.get_program_code).
+FileCode = namedtuple("FileCode", ["assembly_lines", "call_sys_init",
+                                   "shared_routines_used"])
+
+# Number of assembly lines joined into single write of the output (see
+# CodeGenerator.write_program_code).
+WRITE_CHUNK_LINES = 4096
+
 class CodeGenerator(object):
 
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, shared_calls=False, cache_top=False,
+                 track_sp=False, frame_pointers=None, intrinsics=False):
+        """
+        :param debug: Add the vm instructions as comments.
+        :param shared_calls: Translate calls and returns to jumps into single
+        shared copy of the call / return protocol (smaller ROM, few more
+        cycles per call).
+        :param cache_top: Keep the top of the stack in D between instructions
+        when possible, it is stored to the stack only before labels, jumps,
+        calls and returns.
+        :param track_sp: Keep the stack pointer changes of straight line code
+        at translation time, stack cells are addressed relative to SP and SP
+        is updated once before labels, jumps, calls and returns.
+        :param frame_pointers: dict between function name to the pointers
+        (of consts.POINTERS) its call frames save and restore, the frames
+        of the functions which are not in it (or all the functions, if it is
+        None) save both (see call_graph.find_frame_pointers).
+        :param intrinsics: Translate the calls of Math.multiply, Math.abs,
+        Memory.peek and Memory.poke (see INTRINSICS) to inline code, and
+        Math.multiply to jump into shared unrolled shift and add routine,
+        with the results of the jack OS functions.
+        """
         self._assembly_lines = []
         self.debug = debug
+        self.shared_calls = shared_calls
+        self.cache_top = cache_top
+        self.track_sp = track_sp
+        self.frame_pointers = frame_pointers
+        self.intrinsics = intrinsics
         self._current_file = None
+        self._label_prefix = ""
+
+        # The difference between the stack pointer and the value of SP
+        # (see track_sp).
+        self._sp_offset = 0
+
+        # This flag states if the top of the stack is held by D rather
+        # than at the stack (SP points to the cell it would be stored at).
+        self._top_in_d = False
+
+        # The shared routines any call, return or intrinsic used, so they
+        # are added to the end of the program: the frame pointers of the
+        # call and return routines, and SHARED_MULTIPLY_LABEL.
+        self._shared_routines_used = set()
 
         # This flag states if Sys.init function was processed during translation
         # and if so make sure later that it will be called during the bootstrap.
@@ -22,19 +105,9 @@ class CodeGenerator(object):
         # (This is important for scoping labels and flow control instructions)
         self._current_func = ""
 
-    def process_instruction(self, instruction):
-        """
-        Process signle instruction inside given file. Not that the file
-        must be set before the instructions are processed.
-        :param instruction: instance of Instruction like object (see Parser)
-        """
-        if self.debug:
-            self._asm("// Instruction: %s at file %s" % (repr(instruction),
-                                                         self._current_file))
-
         # Map between vm instruction, to the correct hack translation
-        # routine.
-        INSTRUCTION_COMMAND_TO_PROCESS_METHOD = {
+        # routine (built once, process_instruction runs per instruction).
+        command_to_process_method = {
             # Binray arithmatic commands.
             consts.ADD: self._process_binray_arithmetic_command,
             consts.SUB: self._process_binray_arithmetic_command,
@@ -62,10 +135,40 @@ class CodeGenerator(object):
             # Function Protocol Instructions
             consts.FUNCTION: self._process_function_declaration,
             consts.CALL: self._process_function_call,
-            consts.RETURN: self._process_return
+            consts.RETURN: self._process_return,
+
+            # Fused instructions
+            consts.CONSTANT_ARITHMETIC: self._process_constant_arithmetic,
+            consts.MOVE: self._process_move,
+            consts.CONDITIONAL_GOTO: self._process_conditional_goto,
+            consts.TAIL_CALL: self._process_tail_call,
+        }
+        # Indexed by the opcode of the instruction.
+        self._opcode_to_process_method = [None] * len(consts.COMMANDS)
+        for command, process_method in command_to_process_method.iteritems():
+            self._opcode_to_process_method[consts.OPCODES[command]] = \
+                process_method
+
+        # Map between intrinsic function, to its translation routine (see
+        # intrinsics).
+        self._intrinsic_to_process_method = {
+            consts.MATH_MULTIPLY: self._process_multiply,
+            consts.MATH_ABS: self._process_abs,
+            consts.MEMORY_PEEK: self._process_peek,
+            consts.MEMORY_POKE: self._process_poke,
         }
 
-        process_instruction = INSTRUCTION_COMMAND_TO_PROCESS_METHOD[instruction.command]
+    def process_instruction(self, instruction):
+        """
+        Process signle instruction inside given file. Not that the file
+        must be set before the instructions are processed.
+        :param instruction: instance of Instruction like object (see Parser)
+        """
+        if self.debug:
+            self._asm("// Instruction: %s at file %s" % (repr(instruction),
+                                                         self._current_file))
+
+        process_instruction = self._opcode_to_process_method[instruction.opcode]
         return process_instruction(instruction)
 
     def set_current_file(self, file_path):
@@ -75,22 +178,81 @@ class CodeGenerator(object):
         :param file_path: The path of the file we process.
         """
         self._current_file = os.path.basename(file_path)
+        # The unique labels are unique within the file, so files can be
+        # translated apart.
+        self._label_prefix = os.path.splitext(self._current_file)[0] + "."
 
     def get_assembly_code(self):
         """
         Get the complete assembly code for the program.
         :return: String represents the final HACK program.
         """
-        return os.linesep.join(self._assembly_lines)
+        linker = CodeGenerator(debug=self.debug,
+                               shared_calls=self.shared_calls,
+                               cache_top=self.cache_top,
+                               track_sp=self.track_sp,
+                               frame_pointers=self.frame_pointers,
+                               intrinsics=self.intrinsics)
+        return linker.get_program_code([self.get_file_code()])
+
+    def get_file_code(self):
+        """
+        Get the code of the files translated so far, without the bootstrap
+        and the shared routines.
+        :return: FileCode.
+        """
+        # The end of the file (the tests check the stack in RAM).
+        self._flush_stack()
+        return FileCode(assembly_lines=self._assembly_lines,
+                        call_sys_init=self._call_sys_init,
+                        shared_routines_used=self._shared_routines_used)
+
+    def get_program_code(self, file_codes):
+        """
+        Link the code of files into complete program, the bootstrap code
+        first and the shared routines last. Must be called on new generator
+        with the options the files were translated with.
+        :param file_codes: list of FileCode in the order of the program.
+        :return: String represents the final HACK program.
+        """
+        output = StringIO()
+        self.write_program_code(
+            output, file_codes,
+            any(file_code.call_sys_init for file_code in file_codes))
+        return output.getvalue()
+
+    def write_program_code(self, output, file_codes, call_sys_init):
+        """
+        Link the code of files like get_program_code, written to the output
+        in chunks as the files come, so only single file is held at a time.
+        :param output: File like object.
+        :param file_codes: Iterable of FileCode in the order of the program.
+        :param call_sys_init: Whether any of the files declares Sys.init
+        (the bootstrap code is written before the files are translated,
+        see parser.declares_function).
+        """
+        if call_sys_init:
+            self._push_bootstrap_code()
+        separate = _write_lines(output, self._assembly_lines, False)
+        shared_routines_used = set(self._shared_routines_used)
+        for file_code in file_codes:
+            if file_code.call_sys_init and not call_sys_init:
+                raise RuntimeError("Sys.init is declared, but the program "
+                                   "was linked without bootstrap code")
+            separate = _write_lines(output, file_code.assembly_lines,
+                                    separate)
+            shared_routines_used |= file_code.shared_routines_used
+
+        if shared_routines_used:
+            _write_lines(output,
+                         self._get_shared_routines_code(shared_routines_used),
+                         separate)
 
     def _push_bootstrap_code(self):
         """
         Push the bootstrap code. This code set the initial position of the stack and
         call Sys.init function.
         """
-
-        program_so_far = self._assembly_lines
-        self._assembly_lines = []
         self._asm(
             "@256",
             "D=A",
@@ -100,37 +262,147 @@ class CodeGenerator(object):
         self._process_function_call(FunctionProtocolInstruction(
             command=consts.CALL,
             function_name=consts.SYS_INIT,
-            number_of_arguments='0'
+            number_of_arguments=0
 
         ))
-        self._assembly_lines = self._assembly_lines + program_so_far
 
     def _asm(self, *asm_lines):
         self._assembly_lines.extend(asm_lines)
 
+    def _push_d(self):
+        """
+        Push the value of D to the stack.
+        """
+        if self.track_sp:
+            self._load_stack_address(0)
+            self._asm("M=D")
+            self._sp_offset += 1
+        else:
+            self._asm(
+                "@SP",
+                "A=M",
+                "M=D",
+                "@SP",
+                "M=M+1"
+            )
+
+    def _pop_to_d(self, compute="D=M"):
+        """
+        Pop the top of the stack, A is set to its cell.
+        :param compute: The hack computation of D given the popped value
+        as M.
+        """
+        if self._sp_offset:
+            self._sp_offset -= 1
+            self._load_stack_address(0)
+        else:
+            # Decrementing SP right away costs nothing (see track_sp).
+            self._asm(
+                "@SP",
+                "AM=M-1"
+            )
+        self._asm(compute)
+
+    def _load_top_address(self):
+        """
+        Set A to the cell of the top of the stack.
+        """
+        if self.track_sp:
+            self._load_stack_address(-1)
+        else:
+            self._asm(
+                "@SP",
+                "A=M-1"
+            )
+
+    def _load_stack_address(self, offset):
+        """
+        Set A to the address of the stack pointer plus the offset (see
+        track_sp), without changing D.
+        """
+        if abs(self._sp_offset + offset) > MAX_INDEX_INCREMENTS:
+            self._commit_sp()
+        offset += self._sp_offset
+
+        self._asm("@SP")
+        if offset == 0:
+            self._asm("A=M")
+        elif offset > 0:
+            self._asm("A=M+1", *["A=A+1"] * (offset - 1))
+        else:
+            self._asm("A=M-1", *["A=A-1"] * (-offset - 1))
+
+    def _commit_sp(self, keep_d=True):
+        """
+        Update SP to the stack pointer (see track_sp).
+        :param keep_d: Don't change D (SP is incremented one by one).
+        """
+        offset = self._sp_offset
+        if not keep_d and abs(offset) > 3:
+            self._asm(
+                "@%d" % abs(offset),
+                "D=A",
+                "@SP",
+                "M=D+M" if offset > 0 else "M=M-D"
+            )
+        elif offset:
+            increment = "M=M+1" if offset > 0 else "M=M-1"
+            self._asm("@SP", *[increment] * abs(offset))
+        self._sp_offset = 0
+
+    def _flush_stack(self):
+        """
+        Bring the stack to RAM and SP to the stack pointer, as expected at
+        labels, jumps, calls and returns (D is not kept).
+        """
+        if self._sp_offset:
+            self._spill_top()
+            self._commit_sp(keep_d=False)
+        else:
+            self._spill_top(update_sp=True)
+
+    def _spill_top(self, update_sp=False):
+        """
+        Store the top of the stack held by D (see cache_top) to the stack.
+        :param update_sp: Increment SP rather than the stack pointer offset
+        (see track_sp).
+        """
+        if self._top_in_d:
+            if self.track_sp and not update_sp:
+                self._push_d()
+            else:
+                self._asm(
+                    "@SP",
+                    "AM=M+1",
+                    "A=A-1",
+                    "M=D"
+                )
+            self._top_in_d = False
+
+    def _fill_top(self):
+        """
+        Pop the top of the stack to D, unless it is already held by D.
+        """
+        if not self._top_in_d:
+            self._pop_to_d()
+            self._top_in_d = True
+
     def _process_binray_arithmetic_command(self, instruction):
         """
         Translate to hack single binary arithmetic instruction.
         :param instruction: The instruction to translate.
         """
-        # Map between command to the appropriate hack instruction
-        # assuming D is the value on the top of the stack, and A
-        # is set to the second cell (thus M is both the location
-        # to write the instruction results to and value needs to be read)
-        BINARY_ARITHMETIC_TO_HACK_INSTRUCTION = {
-            consts.ADD: "M=D+M",
-            consts.SUB: "M=M-D",
-            consts.AND: "M=D&M",
-            consts.OR: "M=D|M"
-        }
+        if self.cache_top:
+            # Compute the result to D rather than to the stack.
+            self._fill_top()
+            self._pop_to_d(
+                self._BINARY_ARITHMETIC_TO_D_INSTRUCTION[instruction.command])
+            return
 
-        binary_op_on_D_and_M = BINARY_ARITHMETIC_TO_HACK_INSTRUCTION[instruction.command]
+        self._pop_to_d()
         self._asm(
-            "@SP",
-            "AM=M-1",
-            "D=M",
             "A=A-1",
-            binary_op_on_D_and_M
+            self._BINARY_ARITHMETIC_TO_HACK_INSTRUCTION[instruction.command]
         )
 
     def _process_unary_arithmetic_command(self, instruction):
@@ -138,86 +410,154 @@ class CodeGenerator(object):
         Translate to hack single unary arithmetic instruction.
         :param instruction: The instruction to translate.
         """
-        # Map between command to the appropriate hack instruction
-        # assuming A is set to the top of the stack.
-        UNARY_ARITHMETIC_TO_HACK_INSTRUCTION = {
-            consts.NEG: "M=-M",
-            consts.NOT: "M=!M"
-        }
-        unary_op_on_M = UNARY_ARITHMETIC_TO_HACK_INSTRUCTION[instruction.command]
+        if self._top_in_d:
+            self._asm(
+                self._UNARY_ARITHMETIC_TO_D_INSTRUCTION[instruction.command])
+            return
+
+        self._load_top_address()
         self._asm(
-            "@SP",
-            "A=M-1",
-            unary_op_on_M
-        )
+            self._UNARY_ARITHMETIC_TO_HACK_INSTRUCTION[instruction.command])
 
     def _process_compare_command(self, instruction):
-        # Map between compare command to the appropriate hack conditional
-        # jump instruction, assuming D contains X - Y
-        # where X and Y are the following stack cells (according to the book):
-        #        |...|
-        #        |_X_|
-        #        |_Y_|
-        #  SP -> |   |
-        COMPARISON_TO_HACK_JUMP_INSTRUCTION = {
-            consts.EQ: "D;JEQ", # x == y
-            consts.GT: "D;JGT", # x > y
-            consts.LT: "D;JLT" # x< y
-        }
-        conditional_jump_over_D = COMPARISON_TO_HACK_JUMP_INSTRUCTION[instruction.command]
+        conditional_jump_over_D = \
+            self._COMPARISON_TO_HACK_JUMP_INSTRUCTION[instruction.command]
 
         condition_true_label = self._get_unique_label("condition.true")
+        if self._top_in_d:
+            # D = Y, the result replaces X at the stack.
+            self._load_top_address()
+            self._top_in_d = False
+        else:
+            self._pop_to_d() # D = Y
+            self._asm("A=A-1")
         self._asm(
-            "@SP",
-            "AM=M-1",
-            "D=M", # D = Y
-            "A=A-1",
             "D=M-D", # D = X - Y
             # Set the head of the stack to be True (0xffff)
             "M=-1",
             "@" + condition_true_label,
             conditional_jump_over_D,
-            # In case of false increment the stack head value by one
-            # so it became False (0)
-            "@SP",
-            "A=M-1",
+        )
+        # In case of false increment the stack head value by one
+        # so it became False (0)
+        self._load_top_address()
+        self._asm(
             "M=M+1",
             "(%s)" % condition_true_label,
         )
 
+    def _process_constant_arithmetic(self, instruction):
+        """
+        push constant N followed by binary arithmetic command, computed
+        in place at the top of the stack.
+        """
+        if self._top_in_d:
+            # D is the top of the stack (X) and A the constant (Y).
+            self._asm(
+                "@%d" % instruction.value,
+                self._CONSTANT_ARITHMETIC_TO_D_INSTRUCTION[
+                    instruction.arithmetic]
+            )
+            return
+
+        self._asm(
+            "@%d" % instruction.value,
+            "D=A",
+        )
+        self._load_top_address()
+        self._asm(
+            self._BINARY_ARITHMETIC_TO_HACK_INSTRUCTION[instruction.arithmetic]
+        )
+
+    def _process_move(self, instruction):
+        """
+        push followed by pop, the value is moved through D without touching
+        the stack.
+        """
+        self._spill_top()
+        if self._is_direct_target(instruction.target):
+            self._load_value_to_d(instruction.source)
+            self._store_d(instruction.target)
+        else:
+            # The target address needs D as well, keep it at R13.
+            self._load_address_to_d(instruction.target)
+            self._asm("@R13", "M=D")
+            self._load_value_to_d(instruction.source)
+            self._asm("@R13", "A=M", "M=D")
+
+    def _process_conditional_goto(self, instruction):
+        """
+        if-goto fused with the computation of its condition, the jump is
+        done on D.
+        """
+        if self._top_in_d:
+            if instruction.comparison == consts.NOT:
+                self._asm("D=D+1")
+            elif instruction.comparison is not None:
+                self._pop_to_d("D=M-D")
+            self._top_in_d = False
+        elif instruction.comparison is None:
+            self._pop_to_d()
+        elif instruction.comparison == consts.NOT:
+            # ~x != 0 iff x + 1 != 0
+            self._pop_to_d("D=M+1")
+        else:
+            self._pop_to_d() # D = Y
+            self._pop_to_d("D=M-D") # D = X - Y
+        self._commit_sp()
+        self._asm(
+            "@" + self._get_label_within_function(instruction.label),
+            "D;" + instruction.jump
+        )
+
     def _process_label(self, instruction):
+        self._flush_stack()
         self._asm("(%s)" % self._get_label_within_function(instruction.label))
 
     def _process_goto(self, instruction):
+        self._flush_stack()
         self._asm("@" + self._get_label_within_function(instruction.label),
                   "0;JMP")
 
     def _process_if_goto(self, instruction):
+        self._fill_top()
+        self._top_in_d = False
+        self._commit_sp()
         self._asm(
-            "@SP",
-            "AM=M-1",
-            "D=M",
             "@" +  self._get_label_within_function(instruction.label),
             "D;JNE"
         )
 
     def _process_function_declaration(self, instruction):
+        self._flush_stack()
         self._current_func = instruction.function_name
 
         if self._current_func == consts.SYS_INIT:
-            self._push_bootstrap_code()
+            self._call_sys_init = True
 
         self._asm(
             "(%s)" % self._current_func,
         )
-        for _ in xrange(int(instruction.number_of_arguments)):
+        for _ in xrange(instruction.number_of_arguments):
             self._process_push(MemoryInstruction(command=consts.PUSH,
                                                  segment=consts.CONSTANT,
-                                                 index="0"))
+                                                 index=0))
 
     def _process_function_call(self, instruction):
+        if self._is_intrinsic(instruction):
+            return self._intrinsic_to_process_method[
+                instruction.function_name]()
+
         return_address_label = self._get_unique_label(
             name="return-from-" + instruction.function_name)
+        self._flush_stack()
+
+        if self.shared_calls:
+            return self._process_shared_function_call(instruction,
+                                                      return_address_label)
+        if self.track_sp:
+            return self._process_frame_function_call(instruction,
+                                                     return_address_label)
 
         # 1. Push return address, we use push constant with index
         # as label (which mean push the value of this label).
@@ -225,35 +565,22 @@ class CodeGenerator(object):
                                              segment=consts.CONSTANT,
                                              index=return_address_label))
 
-        # 2. Push the value of LCL
-        self._process_push(MemoryInstruction(command=consts.PUSH,
-                                             segment=consts.CONSTANT,
-                                             index="LCL"),
-                           dereference_constant=True)
-
-        # 3. Push the value of ARG
-        self._process_push(MemoryInstruction(command=consts.PUSH,
-                                             segment=consts.CONSTANT,
-                                             index="ARG"),
-                           dereference_constant=True)
-
-        # 4. Push the value of THIS
-        self._process_push(MemoryInstruction(command=consts.PUSH,
-                                             segment=consts.CONSTANT,
-                                             index="THIS"),
-                           dereference_constant=True)
-
-        # 5. Push the value of THAT
-        self._process_push(MemoryInstruction(command=consts.PUSH,
-                                             segment=consts.CONSTANT,
-                                             index="THAT"),
-                           dereference_constant=True)
+        # 2.-5. Push the values of LCL, ARG and the frame pointers (THIS and
+        # THAT unless the function leaves them as is).
+        pointers = self._frame_pointers(instruction.function_name)
+        for pointer in ("LCL", "ARG") + pointers:
+            self._process_push(MemoryInstruction(command=consts.PUSH,
+                                                 segment=consts.CONSTANT,
+                                                 index=pointer),
+                               dereference_constant=True)
+        self._spill_top()
 
-        # 6. ARG <- SP - n - 5 (n - number of arguments)
+        # 6. ARG <- SP - n - 5 (n - number of arguments, 5 - frame size)
+        frame_size = FRAME_BASE_SIZE + len(pointers)
         self._asm(
             "@SP",
             "D=M",
-            "@" + str((int(instruction.number_of_arguments) + 5)), # (n + 5)
+            "@%d" % (instruction.number_of_arguments + frame_size), # (n + 5)
             "D=D-A", # SP - (n + 5)
             "@ARG",
             "M=D",
@@ -278,13 +605,300 @@ class CodeGenerator(object):
             "(%s)" % return_address_label
         )
         
+    def _process_frame_function_call(self, instruction, return_address_label):
+        """
+        Call which pushes the frame with SP updated along (see
+        _push_call_frame_code), rather than push by push.
+        """
+        self._asm(
+            "@" + return_address_label,
+            "D=A",
+        )
+        pointers = self._frame_pointers(instruction.function_name)
+        self._push_call_frame_code(pointers)
+        self._asm(
+            # 6. ARG <- SP - n - 5 (n - number of arguments, 5 - frame size)
+            "@%d" % (instruction.number_of_arguments +
+                     FRAME_BASE_SIZE + len(pointers)),
+            "D=D-A",
+            "@ARG",
+            "M=D",
+            # 8. Goto function.
+            "@" + instruction.function_name,
+            "0;JMP",
+            # 9. Declare the return address
+            "(%s)" % return_address_label
+        )
+
+    def _process_tail_call(self, instruction):
+        """
+        call followed by return, the callee reuses the frame of the current
+        function. The arguments and the saved frame of the current function
+        (the return address, LCL, ARG, THIS and THAT of its caller) are
+        moved down to ARG, so the callee returns straight to the caller of
+        the current function and the stack does not grow.
+        """
+        pointers = self._frame_pointers(self._current_func)
+        if (pointers != self._frame_pointers(instruction.function_name) or
+                self._is_intrinsic(instruction)):
+            # The callee would not restore the pointers the frame of the
+            # current function saves (or there is no callee).
+            self._process_function_call(FunctionProtocolInstruction(
+                command=consts.CALL,
+                function_name=instruction.function_name,
+                number_of_arguments=instruction.number_of_arguments))
+            return self._process_return(ReturnInstruction(
+                command=consts.RETURN))
+
+        self._flush_stack()
+        number_of_arguments = instruction.number_of_arguments
+        frame_size = FRAME_BASE_SIZE + len(pointers)
+        frame_in_place_label = self._get_unique_label("tail-call.in-place")
+        move_up_label = self._get_unique_label("tail-call.move-up")
+        jump_label = self._get_unique_label("tail-call.jump")
+
+        # The frame moves from LCL - 5 to ARG + n, by n - m (m - the number
+        # of arguments of the current function, LCL - ARG - 5, 5 - the frame
+        # size).
+        self._asm(
+            "@LCL",
+            "D=M",
+            "@ARG",
+            "D=D-M",
+            "@%d" % (number_of_arguments + frame_size),
+            "D=D-A", # m - n
+            "@" + frame_in_place_label,
+            "D;JEQ",
+            "@" + move_up_label,
+            "D;JLT",
+        )
+        # 1. n < m, copy the frame down to ARG + n (below the arguments).
+        self._push_frame_source_code(frame_size)
+        self._asm(
+            "@ARG",
+            "D=M",
+            "@%d" % number_of_arguments,
+            "D=D+A",
+            "@R13",
+            "M=D-1",
+        )
+        self._push_copy_code(frame_size)
+        # 2. Copy the arguments down to ARG.
+        self._asm("(%s)" % frame_in_place_label)
+        self._push_arguments_source_code(number_of_arguments)
+        self._push_copy_code(number_of_arguments)
+        self._asm(
+            "@" + jump_label,
+            "0;JMP",
+        )
+
+        # n > m, the frame would overwrite the arguments. Copy it above them
+        # first, and move both down to ARG (the source is above the target,
+        # so copying upwards never overwrites it).
+        self._asm("(%s)" % move_up_label)
+        self._push_frame_source_code(frame_size)
+        self._asm(
+            "@SP",
+            "D=M",
+            "@R13",
+            "M=D-1",
+        )
+        self._push_copy_code(frame_size)
+        self._push_arguments_source_code(number_of_arguments)
+        self._push_copy_code(number_of_arguments + frame_size)
+
+        # 3. LCL <- SP, right after the frame (like after call), and goto
+        # function.
+        self._asm(
+            "(%s)" % jump_label,
+            "@ARG",
+            "D=M",
+            "@%d" % (number_of_arguments + frame_size),
+            "D=D+A",
+            "@SP",
+            "M=D",
+            "@LCL",
+            "M=D",
+            "@" + instruction.function_name,
+            "0;JMP"
+        )
+
+    def _push_frame_source_code(self, frame_size):
+        """
+        Set R14 to the cell before the saved frame (see _push_copy_code).
+        """
+        self._asm(
+            "@LCL",
+            "D=M",
+            "@%d" % (frame_size + 1),
+            "D=D-A",
+            "@R14",
+            "M=D",
+        )
+
+    def _push_arguments_source_code(self, number_of_arguments):
+        """
+        Set R14 to the cell before the arguments at the top of the stack,
+        and R13 to the cell before ARG (see _push_copy_code).
+        """
+        self._asm(
+            "@SP",
+            "D=M",
+            "@%d" % (number_of_arguments + 1),
+            "D=D-A",
+            "@R14",
+            "M=D",
+            "@ARG",
+            "D=M",
+            "@R13",
+            "M=D-1",
+        )
+
+    def _push_copy_code(self, count):
+        """
+        Copy count cells from R14 + 1 to R13 + 1 upwards, R13 and R14 are
+        left at the last cells.
+        """
+        for _ in xrange(count):
+            self._asm(
+                "@R14",
+                "AM=M+1",
+                "D=M",
+                "@R13",
+                "AM=M+1",
+                "M=D",
+            )
+
+    def _process_shared_function_call(self, instruction, return_address_label):
+        """
+        Call through the shared call routine (see _push_shared_call_routine).
+        The call site passes the function address at R13, the number of
+        arguments at R14 and the return address at D.
+        """
+        pointers = self._frame_pointers(instruction.function_name)
+        self._shared_routines_used.add(pointers)
+        self._asm(
+            "@" + instruction.function_name,
+            "D=A",
+            "@R13",
+            "M=D",
+        )
+        number_of_arguments = instruction.number_of_arguments
+        if number_of_arguments in (0, 1):
+            self._asm(
+                "@R14",
+                "M=%d" % number_of_arguments,
+            )
+        else:
+            self._asm(
+                "@%d" % number_of_arguments,
+                "D=A",
+                "@R14",
+                "M=D",
+            )
+        self._asm(
+            "@" + return_address_label,
+            "D=A",
+            "@" + _shared_label(SHARED_CALL_LABEL, pointers),
+            "0;JMP",
+            "(%s)" % return_address_label
+        )
+
     def _process_return(self, instruction):
+        self._flush_stack()
+        pointers = self._frame_pointers(self._current_func)
+        if self.shared_calls:
+            self._shared_routines_used.add(pointers)
+            self._asm(
+                "@" + _shared_label(SHARED_RETURN_LABEL, pointers),
+                "0;JMP"
+            )
+        else:
+            self._push_return_code(pointers)
+
+    def _frame_pointers(self, function_name):
+        """
+        :return: The pointers the call frames of the function save (see
+        frame_pointers).
+        """
+        if self.frame_pointers is None:
+            return consts.POINTERS
+        return self.frame_pointers.get(function_name, consts.POINTERS)
+
+    def _get_shared_routines_code(self, routines):
+        """
+        :param routines: The used routines (see _shared_routines_used).
+        :return: The assembly lines of the shared routines.
+        """
+        program_so_far = self._assembly_lines
+        self._assembly_lines = []
+        for pointers in sorted(routines):
+            if pointers == SHARED_MULTIPLY_LABEL:
+                self._push_multiply_routine()
+                continue
+            self._push_shared_call_routine(pointers)
+            self._asm("(%s)" % _shared_label(SHARED_RETURN_LABEL, pointers))
+            self._push_return_code(pointers)
+        routines = self._assembly_lines
+        self._assembly_lines = program_so_far
+        return routines
+
+    def _push_shared_call_routine(self, pointers):
+        """
+        The call protocol, given the function address at R13, the number of
+        arguments at R14 and the return address at D.
+        """
+        self._asm("(%s)" % _shared_label(SHARED_CALL_LABEL, pointers))
+        self._push_call_frame_code(pointers)
+        self._asm(
+            # 6. ARG <- SP - n - 5 (n - number of arguments)
+            "@R14",
+            "D=D-M",
+            "@%d" % (FRAME_BASE_SIZE + len(pointers)),
+            "D=D-A",
+            "@ARG",
+            "M=D",
+            # 8. Goto function.
+            "@R13",
+            "A=M",
+            "0;JMP"
+        )
+
+    def _push_call_frame_code(self, pointers):
+        """
+        Push the return address given at D, and the values of LCL, ARG and
+        the frame pointers. LCL and D are set to the new SP.
+        """
+        self._asm(
+            # 1. Push return address
+            "@SP",
+            "A=M",
+            "M=D",
+        )
+        # 2.-5. Push the values of LCL, ARG and the frame pointers
+        for pointer in ("LCL", "ARG") + pointers:
+            self._asm(
+                "@" + pointer,
+                "D=M",
+                "@SP",
+                "AM=M+1",
+                "M=D",
+            )
+        self._asm(
+            # 7. LCL <- SP (the pushes above left SP at the last cell)
+            "@SP",
+            "MD=M+1",
+            "@LCL",
+            "M=D",
+        )
+
+    def _push_return_code(self, pointers):
         FRAME = "R13"
         self._asm(
             # *(LCL - 5) -> R13
             "@LCL",
             "D=M",
-            "@5",
+            "@%d" % (FRAME_BASE_SIZE + len(pointers)),
             "A=D-A",
             "D=M",
             "@" + FRAME,
@@ -300,34 +914,202 @@ class CodeGenerator(object):
             "D=A+1",
             "@SP",
             "M=D",
-            # *(LCL - 1) -> THAT; LCL--
+        )
+        # *(LCL - 1) -> THAT, THIS and ARG; LCL--
+        for pointer in tuple(reversed(pointers)) + ("ARG",):
+            self._asm(
+                "@LCL",
+                "AM=M-1",
+                "D=M",
+                "@" + pointer,
+                "M=D",
+            )
+        self._asm(
+            # *(LCL - 1) -> LCL
             "@LCL",
-            "AM=M-1",
+            "A=M-1",
             "D=M",
-            "@THAT",
-            "M=D",
-            # *(LCL - 1) -> THIS; LCL--
             "@LCL",
-            "AM=M-1",
+            "M=D",
+            # R13 -> A
+            "@" + FRAME,
+            "A=M",
+            "0;JMP")
+
+    def _is_intrinsic(self, instruction):
+        """
+        :return: True if the call is translated to inline code (see
+        intrinsics).
+        """
+        return (self.intrinsics and
+                INTRINSICS.get(instruction.function_name) ==
+                instruction.number_of_arguments)
+
+    def _push_result(self):
+        """
+        Push the result of intrinsic, computed to D over the popped
+        arguments.
+        """
+        if self.cache_top:
+            self._top_in_d = True
+        else:
+            self._push_d()
+
+    def _process_abs(self):
+        """
+        Math.abs: x when x > 0, otherwise -x (so abs(-32768) is -32768).
+        """
+        positive_label = self._get_unique_label("abs.positive")
+        if self.cache_top:
+            self._fill_top()
+            self._asm(
+                "@" + positive_label,
+                "D;JGT",
+                "D=-D",
+                "(%s)" % positive_label,
+            )
+            return
+
+        self._load_top_address()
+        self._asm(
             "D=M",
-            "@THIS",
+            "@" + positive_label,
+            "D;JGT",
+        )
+        self._load_top_address()
+        self._asm(
+            "M=-M",
+            "(%s)" % positive_label,
+        )
+
+    def _process_peek(self):
+        """
+        Memory.peek: the value at the address.
+        """
+        if self.cache_top:
+            self._fill_top()
+            self._asm(
+                "A=D",
+                "D=M",
+            )
+            return
+
+        self._load_top_address()
+        self._asm(
+            "A=M",
+            "D=M",
+        )
+        self._load_top_address()
+        self._asm("M=D")
+
+    def _process_poke(self):
+        """
+        Memory.poke: store the value at the address, the result (of void
+        function) is 0.
+        """
+        if self._top_in_d:
+            # D is the value, the address is at the top of the stack.
+            self._top_in_d = False
+            self._load_top_address()
+        else:
+            self._pop_to_d() # D = value
+            self._asm("A=A-1")
+        self._asm(
+            "A=M",
             "M=D",
-            # *(LCL - 1) -> ARG; LCL--
-            "@LCL",
+        )
+        # The result replaces the address.
+        self._load_top_address()
+        self._asm("M=0")
+
+    def _process_multiply(self):
+        """
+        Math.multiply: call the shared multiply routine (see
+        _push_multiply_routine), with the return address at D.
+        """
+        self._shared_routines_used.add(SHARED_MULTIPLY_LABEL)
+        self._flush_stack()
+        return_address_label = self._get_unique_label("return-from-multiply")
+        self._asm(
+            "@" + return_address_label,
+            "D=A",
+            "@" + SHARED_MULTIPLY_LABEL,
+            "0;JMP",
+            "(%s)" % return_address_label,
+        )
+
+    def _push_multiply_routine(self):
+        """
+        The product of the two cells at the top of the stack (x and y),
+        which replaces them, given the return address at D. The bits of y
+        are tested from the lowest up and x is added to the result (R15)
+        shifted by the bit, like Math.multiply (the product is truncated to
+        16 bits). The loop is unrolled.
+        """
+        X, Y, RESULT = "R13", "R14", "R15"
+        self._asm(
+            "(%s)" % SHARED_MULTIPLY_LABEL,
+            # The return address is kept at the cell above y.
+            "@SP",
+            "A=M",
+            "M=D",
+            "A=A-1",
+            "D=M",
+            "@" + Y,
+            "M=D",
+            "@SP",
             "AM=M-1",
+            "A=A-1",
             "D=M",
-            "@ARG",
+            "@" + X,
             "M=D",
-            # *(LCL - 1) -> LCL
-            "@LCL",
-            "A=M-1",
+            "@" + RESULT,
+            "M=0",
+        )
+        for bit in xrange(16):
+            skip_label = "%s.skip.%d" % (SHARED_MULTIPLY_LABEL, bit)
+            if bit < 15:
+                self._asm(
+                    "@%d" % (1 << bit),
+                    "D=A",
+                    "@" + Y,
+                    "D=D&M",
+                    "@" + skip_label,
+                    "D;JEQ",
+                )
+            else:
+                # The sign bit (1 << 15 is not an A instruction).
+                self._asm(
+                    "@" + Y,
+                    "D=M",
+                    "@" + skip_label,
+                    "D;JGE",
+                )
+            self._asm(
+                "@" + X,
+                "D=M",
+                "@" + RESULT,
+                "M=D+M",
+                "(%s)" % skip_label,
+            )
+            if bit < 15:
+                self._asm(
+                    "@" + X,
+                    "D=M",
+                    "M=D+M",
+                )
+        self._asm(
+            # The result replaces x, SP points at y.
+            "@" + RESULT,
             "D=M",
-            "@LCL",
+            "@SP",
+            "A=M-1",
             "M=D",
-            # R13 -> A
-            "@" + FRAME,
+            "@SP",
+            "A=M+1",
             "A=M",
-            "0;JMP")
+            "0;JMP",
+        )
 
     def _static_symbol(self, index):
         """
@@ -349,41 +1131,68 @@ class CodeGenerator(object):
     def _get_unique_label(self, name):
         """
         Create new string which represent unique label in the generated assembly
-        program.
+        program (prefixed by the name of the current file).
         :param name: The name of the label. Uses only for ease on the eys while
         debugging.
         :return: String.
         """
-        return "%s.%d" % (name, self._label_counter.next())
+        return "%s%s.%d" % (self._label_prefix, name,
+                             self._label_counter.next())
 
     def _process_push(self, instruction, dereference_constant=False):
         # Read the value from the correct segment and store it in D
         # than store D value at the top of the stack and increment the stack.
+        if self.cache_top:
+            self._spill_top()
+            self._load_value_to_d(instruction, dereference_constant)
+            self._top_in_d = True
+            return
+
+        self._load_value_to_d(instruction, dereference_constant)
+        self._push_d()
 
+    def _load_value_to_d(self, instruction, dereference_constant=False):
+        """
+        Load the value of push instruction to D.
+        """
         # If its to pseudo segment constants
         if instruction.segment == consts.CONSTANT:
-            self._asm(
-                "@" + instruction.index,
-                "D=A" if not dereference_constant else "D=M",
-            )
+            # The call protocol pushes symbols (the return address label,
+            # LCL, ARG, THIS and THAT) as constants.
+            if isinstance(instruction.index, str):
+                self._asm(
+                    "@" + instruction.index,
+                    "D=A" if not dereference_constant else "D=M",
+                )
+            elif instruction.index < 0:
+                # Negative constants are produced only by the optimizer.
+                self._asm(
+                    "@%d" % -instruction.index,
+                    "D=-A",
+                )
+            else:
+                self._asm(
+                    "@%d" % instruction.index,
+                    "D=A",
+                )
 
         # If its to one of the index based memory segments
         elif instruction.segment in self._MEMORY_SEGMENT_TO_BASE_VARIABLE:
             base = self._MEMORY_SEGMENT_TO_BASE_VARIABLE[instruction.segment]
+            if instruction.index <= MAX_PUSH_INDEX_INCREMENTS:
+                self._load_segment_cell_address(base, instruction.index)
+                self._asm("D=M")
+            else:
+                self._asm(
+                    "@" + base,
+                    "D=M",
+                    "@%d" % instruction.index,
+                    "A=D+A",
+                    "D=M",
+                )
+        elif instruction.segment in self._REG_SEGMENT_TO_ADDRESS:
             self._asm(
-                "@" + base,
-                "D=M",
-                "@" + instruction.index,
-                "A=D+A",
-                "D=M",
-            )
-        elif instruction.segment in self._REG_SEGMENT_TO_BASE_VARIABLE_ADDRESS:
-            base = self._REG_SEGMENT_TO_BASE_VARIABLE_ADDRESS[instruction.segment]
-            self._asm(
-                "@" + base,
-                "D=A",
-                "@" + instruction.index,
-                "A=D+A",
+                "@" + self._register_symbol(instruction),
                 "D=M",
             )
         elif instruction.segment == consts.STATIC:
@@ -396,37 +1205,69 @@ class CodeGenerator(object):
         else:
             raise RuntimeError("Not supported memory instruction: %s" % repr(instruction))
 
-        # Store the value of D in @SP
-        # And increment the value of SP
-        self._asm(
-                "@SP",
-                "A=M",
-                "M=D",
-                "@SP",
-                "M=M+1"
-        )
-
     def _process_pop(self, instruction):
+        if self.cache_top:
+            return self._pop_top(instruction)
+        if self._is_direct_target(instruction):
+            self._pop_to_d()
+            self._store_d(instruction)
+            return
+
         # Set D to contain the address of the correct address to fill (depend
         # on the segment type)
         # than store the value of D at the top of the stack and increment
         # the stack pointer.
+        self._load_address_to_d(instruction)
 
+        self._asm(
+            "@R13",
+            "M=D", # R13 <- address of the cell to read from
+        )
+        self._pop_to_d()
+        self._asm(
+            "@R13",
+            "A=M",
+            "M=D"
+        )
+
+    def _pop_top(self, instruction):
+        """
+        Pop to the segment through D (see cache_top).
+        """
+        self._fill_top()
+        self._top_in_d = False
+        if self._is_direct_target(instruction):
+            self._store_d(instruction)
+        else:
+            # The target address needs D as well.
+            self._asm("@R13", "M=D")
+            self._load_address_to_d(instruction)
+            self._asm(
+                "@R14",
+                "M=D",
+                "@R13",
+                "D=M",
+                "@R14",
+                "A=M",
+                "M=D"
+            )
+
+    def _load_address_to_d(self, instruction):
+        """
+        Load the address of the cell pop instruction writes to, to D.
+        """
         if instruction.segment in self._MEMORY_SEGMENT_TO_BASE_VARIABLE:
             base = self._MEMORY_SEGMENT_TO_BASE_VARIABLE[instruction.segment]
             self._asm(
                 "@" + base,
                 "D=M",
-                "@" + instruction.index,
+                "@%d" % instruction.index,
                 "D=D+A"
             )
-        elif instruction.segment in self._REG_SEGMENT_TO_BASE_VARIABLE_ADDRESS:
-            base = self._REG_SEGMENT_TO_BASE_VARIABLE_ADDRESS[instruction.segment]
+        elif instruction.segment in self._REG_SEGMENT_TO_ADDRESS:
             self._asm(
-                "@" + base,
-                "D=A",
-                "@" + instruction.index,
-                "D=D+A"
+                "@" + self._register_symbol(instruction),
+                "D=A"
             )
         elif instruction.segment == consts.STATIC:
             static_variable = self._static_symbol(instruction.index)
@@ -437,16 +1278,106 @@ class CodeGenerator(object):
         else:
             raise RuntimeError("Unsupported instruction: %s" % repr(instruction))
 
-        self._asm(
-            "@R13",
-            "M=D", # R13 <- address of the cell to read from
-            "@SP",
-            "AM=M-1",
-            "D=M",
-            "@R13",
-            "A=M",
-            "M=D"
-        )
+    def _is_direct_target(self, instruction):
+        """
+        :return: True if the address of pop instruction can be computed in
+        A alone (see _store_d).
+        """
+        return (instruction.segment == consts.STATIC or
+                instruction.segment in self._REG_SEGMENT_TO_ADDRESS or
+                (instruction.segment in self._MEMORY_SEGMENT_TO_BASE_VARIABLE and
+                 instruction.index <= MAX_INDEX_INCREMENTS))
+
+    def _store_d(self, instruction):
+        """
+        Store D at the cell pop instruction writes to, without going through
+        R13 (the instruction must be direct target).
+        """
+        if instruction.segment == consts.STATIC:
+            self._asm("@" + self._static_symbol(instruction.index))
+        elif instruction.segment in self._REG_SEGMENT_TO_ADDRESS:
+            self._asm("@" + self._register_symbol(instruction))
+        else:
+            self._load_segment_cell_address(
+                self._MEMORY_SEGMENT_TO_BASE_VARIABLE[instruction.segment],
+                instruction.index)
+        self._asm("M=D")
+
+    def _load_segment_cell_address(self, base, index):
+        """
+        Set A to the address of the segment cell with "A=A+1" increments,
+        without changing D.
+        :param base: The variable of the segment base (LCL, ARG, THIS or
+        THAT).
+        """
+        if index == 0:
+            self._asm("@" + base, "A=M")
+        else:
+            self._asm("@" + base, "A=M+1", *["A=A+1"] * (index - 1))
+
+    def _register_symbol(self, instruction):
+        """
+        :return: The symbol of the register of pointer or temp instruction
+        (THIS, THAT or R5-R12).
+        """
+        if instruction.segment == consts.POINTER:
+            return consts.POINTERS[instruction.index]
+        return "R%d" % (self._REG_SEGMENT_TO_ADDRESS[instruction.segment] +
+                        instruction.index)
+
+    # Map between command to the appropriate hack instruction
+    # assuming D is the value on the top of the stack, and A
+    # is set to the second cell (thus M is both the location
+    # to write the instruction results to and value needs to be read)
+    _BINARY_ARITHMETIC_TO_HACK_INSTRUCTION = {
+        consts.ADD: "M=D+M",
+        consts.SUB: "M=M-D",
+        consts.AND: "M=D&M",
+        consts.OR: "M=D|M"
+    }
+
+    # The same, with the result computed to D (see cache_top).
+    _BINARY_ARITHMETIC_TO_D_INSTRUCTION = {
+        consts.ADD: "D=D+M",
+        consts.SUB: "D=M-D",
+        consts.AND: "D=D&M",
+        consts.OR: "D=D|M"
+    }
+
+    # Map between command to the appropriate hack instruction
+    # assuming A is set to the top of the stack.
+    _UNARY_ARITHMETIC_TO_HACK_INSTRUCTION = {
+        consts.NEG: "M=-M",
+        consts.NOT: "M=!M"
+    }
+
+    # The same, over the top of the stack held by D (see cache_top).
+    _UNARY_ARITHMETIC_TO_D_INSTRUCTION = {
+        consts.NEG: "D=-D",
+        consts.NOT: "D=!D"
+    }
+
+    # Map between compare command to the appropriate hack conditional
+    # jump instruction, assuming D contains X - Y
+    # where X and Y are the following stack cells (according to the book):
+    #        |...|
+    #        |_X_|
+    #        |_Y_|
+    #  SP -> |   |
+    _COMPARISON_TO_HACK_JUMP_INSTRUCTION = {
+        consts.EQ: "D;JEQ", # x == y
+        consts.GT: "D;JGT", # x > y
+        consts.LT: "D;JLT" # x< y
+    }
+
+    # Map between constant arithmetic command to the hack instruction,
+    # assuming D is the top of the stack (X) and A the constant (Y).
+    _CONSTANT_ARITHMETIC_TO_D_INSTRUCTION = {
+        consts.ADD: "D=D+A",
+        consts.SUB: "D=D-A",
+        consts.AND: "D=D&A",
+        consts.OR: "D=D|A"
+    }
 
     # Map memory segment instruction to the appropriate variable
     # which its value represents the segment base index.
@@ -457,9 +1388,34 @@ class CodeGenerator(object):
         consts.THAT: "THAT"
     }
 
-    # Map memory segment instruction to the appropriate variable
-    # which its address represents the segment base index.
-    _REG_SEGMENT_TO_BASE_VARIABLE_ADDRESS = {
-        consts.POINTER: "THIS",
-        consts.TEMP: "R5"
-    }
\ No newline at end of file
+    # The addresses of the register segments.
+    _REG_SEGMENT_TO_ADDRESS = {
+        consts.POINTER: 3,
+        consts.TEMP: 5
+    }
+
+
+def _shared_label(label, pointers):
+    """
+    :return: The label of the shared routine of frames which save the given
+    pointers (the plain label when they save both).
+    """
+    if pointers == consts.POINTERS:
+        return label
+    return "%s.%s" % (label, ".".join(pointers) or "light")
+
+
+def _write_lines(output, lines, separate):
+    """
+    Write the lines in chunks of WRITE_CHUNK_LINES, separated by
+    os.linesep (without trailing line separator).
+    :param separate: Whether lines were written before (the separator
+    goes first).
+    :return: Whether lines were written so far.
+    """
+    for begin in xrange(0, len(lines), WRITE_CHUNK_LINES):
+        if separate:
+            output.write(os.linesep)
+        output.write(os.linesep.join(lines[begin:begin + WRITE_CHUNK_LINES]))
+        separate = True
+    return separate
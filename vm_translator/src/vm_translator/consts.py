@@ -24,6 +24,55 @@ FUNCTION = "function"
 RETURN = "return"
 
 
+# List of fused instructions (produced by the optimizer, see optimizer.py)
+CONSTANT_ARITHMETIC = "constant-arithmetic"
+MOVE = "move"
+CONDITIONAL_GOTO = "conditional-goto"
+TAIL_CALL = "tail-call"
+
+
+# Integer opcodes of the commands, the instruction records carry them (see
+# parser.py) and the dispatch tables are indexed by them.
+COMMANDS = (
+    PUSH,
+    POP,
+    ADD,
+    SUB,
+    NEG,
+    EQ,
+    GT,
+    LT,
+    AND,
+    OR,
+    NOT,
+    LABEL,
+    GOTO,
+    IF_GOTO,
+    CALL,
+    FUNCTION,
+    RETURN,
+    CONSTANT_ARITHMETIC,
+    MOVE,
+    CONDITIONAL_GOTO,
+    TAIL_CALL
+)
+
+OPCODES = dict((command, opcode) for opcode, command in enumerate(COMMANDS))
+
+
+# List of the optimizer patterns (see optimizer.py), the patterns which fuse
+# instructions are named after the fused command.
+CONSTANT_UNARY = "constant-unary"
+
+OPTIMIZER_PATTERNS = (
+    CONSTANT_ARITHMETIC,
+    CONSTANT_UNARY,
+    MOVE,
+    CONDITIONAL_GOTO,
+    TAIL_CALL
+)
+
+
 # List of memory segments
 STATIC="static"
 THIS="this"
@@ -37,6 +86,10 @@ TEMP="temp"
 
 REG_SEGMENTS = (POINTER, TEMP)
 
+# The registers of the pointer segment (pointer 0 and pointer 1), the call
+# frames save and restore them.
+POINTERS = ("THIS", "THAT")
+
 
 ARITHMETIC_INSTRUCTIONS = (
     ADD,
@@ -67,4 +120,14 @@ FUNCTION_PROTOCOL_INSTRUCTIONS = (
 )
 
 # Sys.init function name (for bootsrap the program)
-SYS_INIT = "Sys.init"
\ No newline at end of file
+SYS_INIT = "Sys.init"
+
+# Sys.halt function name (the emulators stop at it)
+SYS_HALT = "Sys.halt"
+
+# The jack OS functions the code generator may translate to inline code
+# (see CodeGenerator.intrinsics)
+MATH_MULTIPLY = "Math.multiply"
+MATH_ABS = "Math.abs"
+MEMORY_PEEK = "Memory.peek"
+MEMORY_POKE = "Memory.poke"
@@ -0,0 +1,263 @@
+"""
+Inline small leaf functions into their call sites, over the parsed vm
+instructions of the whole program.
+
+The call protocol saves and restores the frame of the caller on every call
+(about 100 cycles), which dominates calls of small functions like getters
+and Math.abs. A call of a small function which calls no other functions is
+replaced with its body:
+
+    call F n        pop temp a(n-1) ... pop temp a0     (the arguments)
+                    push constant 0 / pop temp l0 ...   (the locals)
+                    push pointer p / pop temp s ...     (if F sets pointer p)
+                    <the body of F, argument i as temp a(i), local i as
+                     temp l(i), labels prefixed by F$k and return as
+                     goto F$k.return>
+                    label F$k.return                    (if F returns early)
+                    push temp s / pop pointer p ...
+
+The temp segment is scratch space between calls (the jack compiler never
+keeps a value at temp over a call), so it holds the arguments and the
+locals of the inlined function. Functions are inlined only when their
+temps (their own plus the arguments, locals and saved pointers) fit the
+temp segment, they return, their stack is balanced (exactly the return
+value at every return), and they use the static segment only if the
+caller is at the same file. Sys.halt is never inlined, the emulators stop
+at it.
+"""
+import itertools
+from collections import namedtuple
+
+from vm_translator import consts
+from vm_translator.call_graph import split_functions
+from vm_translator.parser import MemoryInstruction, ProgramFlowInstruction
+
+# Largest number of instructions (the declaration excluded) of inlined
+# functions.
+MAX_INLINE_SIZE = 16
+
+TEMP_SIZE = 8
+
+# The number of cells each instruction pushes (or pops when negative).
+STACK_EFFECT = {
+    consts.PUSH: 1,
+    consts.POP: -1,
+    consts.ADD: -1,
+    consts.SUB: -1,
+    consts.AND: -1,
+    consts.OR: -1,
+    consts.EQ: -1,
+    consts.GT: -1,
+    consts.LT: -1,
+    consts.NEG: 0,
+    consts.NOT: 0,
+    consts.LABEL: 0,
+    consts.GOTO: 0,
+    consts.IF_GOTO: -1,
+}
+
+# Function which can be inlined. body excludes the declaration, temps is
+# the set of the temp indices it uses itself, pointers the set of the
+# pointer indices it sets, arguments and locals the number of arguments
+# and locals it uses.
+Inlinee = namedtuple("Inlinee", ["path", "function_name", "body", "temps",
+                                 "pointers", "arguments", "locals",
+                                 "uses_static"])
+
+
+def inline_functions(programs, max_size=MAX_INLINE_SIZE, keep=()):
+    """
+    Replace the calls of small leaf functions with their bodies. The
+    functions themselves are kept (see call_graph.remove_dead_functions).
+    :param programs: list of (path, instructions) of the program vm files.
+    :param max_size: Largest number of instructions of inlined functions.
+    :param keep: Names of functions whose calls are left as is (like the
+    intrinsics of the code generator).
+    :return: list of (path, instructions).
+    """
+    inlinees = find_inlinees(programs, max_size, keep)
+    site_counter = itertools.count(1)
+    inlined_programs = []
+    for path, instructions in programs:
+        inlined_instructions = []
+        for instruction in instructions:
+            inlinee = None
+            if instruction.command == consts.CALL:
+                inlinee = inlinees.get(instruction.function_name)
+            if inlinee is not None and _can_inline(inlinee, path,
+                                                   instruction):
+                inlined_instructions.extend(_expand(
+                    inlinee, instruction.number_of_arguments,
+                    "%s$%d" % (inlinee.function_name, site_counter.next())))
+            else:
+                inlined_instructions.append(instruction)
+        inlined_programs.append((path, inlined_instructions))
+    return inlined_programs
+
+
+def find_inlinees(programs, max_size=MAX_INLINE_SIZE, keep=()):
+    """
+    :param programs: list of (path, instructions) of the program vm files.
+    :param keep: Names of functions which are not inlined.
+    :return: dict between function name to Inlinee, of the functions which
+    can be inlined.
+    """
+    inlinees = dict()
+    for path, instructions in programs:
+        _, functions = split_functions(instructions)
+        for function_name, function in functions:
+            declaration, body = function[0], function[1:]
+            commands = set(instruction.command for instruction in body)
+            # The emulators stop at Sys.halt, it is left as call.
+            if (function_name == consts.SYS_HALT or function_name in keep or
+                    len(body) > max_size or
+                    consts.CALL in commands or
+                    consts.RETURN not in commands or
+                    not has_balanced_stack(body)):
+                continue
+
+            memory = [instruction for instruction in body
+                      if instruction.command in consts.MEMORY_INSTRUCTIONS]
+            locals_used = _segment_size(memory, consts.LOCAL)
+            if locals_used > declaration.number_of_arguments:
+                continue
+            inlinees[function_name] = Inlinee(
+                path=path,
+                function_name=function_name,
+                body=body,
+                temps=set(instruction.index for instruction in memory
+                          if instruction.segment == consts.TEMP),
+                pointers=set(instruction.index for instruction in memory
+                             if instruction.command == consts.POP and
+                             instruction.segment == consts.POINTER),
+                arguments=_segment_size(memory, consts.ARGUMENT),
+                locals=declaration.number_of_arguments,
+                uses_static=any(instruction.segment == consts.STATIC
+                                for instruction in memory))
+    return inlinees
+
+
+def has_balanced_stack(body):
+    """
+    Check the stack depth of function body at translation time: it must be
+    the same on every path to each label, never below the start, and exactly
+    one (the return value) at every return.
+    :param body: The instructions of the function, without the declaration.
+    :return: bool.
+    """
+    label_depths = dict()
+    # None after goto and return, until a label which is jumped to.
+    depth = 0
+    for instruction in body:
+        command = instruction.command
+        if command == consts.LABEL:
+            if depth is None:
+                depth = label_depths.get(instruction.label)
+                if depth is None:
+                    return False
+            elif label_depths.setdefault(instruction.label, depth) != depth:
+                return False
+            continue
+
+        if depth is None:
+            return False
+        if command == consts.RETURN:
+            if depth != 1:
+                return False
+            depth = None
+            continue
+        if command not in STACK_EFFECT:
+            return False
+
+        depth += STACK_EFFECT[command]
+        if depth < 0:
+            return False
+        if command in (consts.GOTO, consts.IF_GOTO):
+            if label_depths.setdefault(instruction.label, depth) != depth:
+                return False
+            if command == consts.GOTO:
+                depth = None
+    return depth is None
+
+
+def _segment_size(memory_instructions, segment):
+    """
+    :return: The number of cells of the segment the instructions use (the
+    largest index plus one).
+    """
+    return max([instruction.index + 1
+                for instruction in memory_instructions
+                if instruction.segment == segment] or [0])
+
+
+def _can_inline(inlinee, path, call):
+    number_of_arguments = call.number_of_arguments
+    temps_needed = (number_of_arguments + inlinee.locals +
+                    len(inlinee.pointers) + len(inlinee.temps))
+    return (inlinee.arguments <= number_of_arguments and
+            temps_needed <= TEMP_SIZE and
+            # The static symbols are named after the file of the caller.
+            (not inlinee.uses_static or inlinee.path == path))
+
+
+def _expand(inlinee, number_of_arguments, prefix):
+    """
+    :param prefix: Unique prefix of the labels of the call site.
+    :return: list of the instructions replacing the call.
+    """
+    free_temps = [temp for temp in xrange(TEMP_SIZE)
+                  if temp not in inlinee.temps]
+    argument_temps = free_temps[:number_of_arguments]
+    local_temps = free_temps[number_of_arguments:
+                             number_of_arguments + inlinee.locals]
+    pointer_temps = zip(sorted(inlinee.pointers),
+                        free_temps[number_of_arguments + inlinee.locals:])
+    segment_to_temps = {
+        consts.ARGUMENT: argument_temps,
+        consts.LOCAL: local_temps,
+    }
+    return_label = prefix + ".return"
+
+    code = [_temp(consts.POP, temp) for temp in reversed(argument_temps)]
+    for temp in local_temps:
+        code.append(MemoryInstruction(command=consts.PUSH,
+                                      segment=consts.CONSTANT, index=0))
+        code.append(_temp(consts.POP, temp))
+    for pointer, temp in pointer_temps:
+        code.append(MemoryInstruction(command=consts.PUSH,
+                                      segment=consts.POINTER,
+                                      index=pointer))
+        code.append(_temp(consts.POP, temp))
+
+    early_return = False
+    for position, instruction in enumerate(inlinee.body):
+        if instruction.command == consts.RETURN:
+            if position != len(inlinee.body) - 1:
+                early_return = True
+                code.append(ProgramFlowInstruction(command=consts.GOTO,
+                                                   label=return_label))
+        elif instruction.command in consts.PROGRAM_FLOW_INSTRUCTIONS:
+            code.append(instruction._replace(
+                label="%s.%s" % (prefix, instruction.label)))
+        elif (instruction.command in consts.MEMORY_INSTRUCTIONS and
+                instruction.segment in segment_to_temps):
+            code.append(_temp(
+                instruction.command,
+                segment_to_temps[instruction.segment][instruction.index]))
+        else:
+            code.append(instruction)
+
+    if early_return:
+        code.append(ProgramFlowInstruction(command=consts.LABEL,
+                                           label=return_label))
+    for pointer, temp in pointer_temps:
+        code.append(_temp(consts.PUSH, temp))
+        code.append(MemoryInstruction(command=consts.POP,
+                                      segment=consts.POINTER,
+                                      index=pointer))
+    return code
+
+
+def _temp(command, temp):
+    return MemoryInstruction(command=command, segment=consts.TEMP,
+                             index=temp)
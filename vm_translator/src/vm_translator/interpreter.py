@@ -0,0 +1,471 @@
+"""
+Interpreter of vm programs, for running them without translating and
+assembling them first.
+
+The program is compiled once to a flat list of (handler, operand) pairs:
+labels and function names are resolved to indices in the list (labels
+take no step), and segment accesses to RAM addresses or to (pointer,
+index) pairs. The RAM follows the hack memory map (SP at 0, the statics
+from 16, the stack from 256, the screen and the keyboard), so the OS
+behaves just like the translated program. Return addresses are indices in
+the list.
+
+    python -m vm_translator.interpreter <vm file/ directory> [max steps]
+"""
+import collections
+import os
+import sys
+import time
+
+from vm_translator.parser import parse_vm_file
+from vm_translator import consts
+
+RAM_SIZE = 0x8000
+
+# The addresses of the pointers, and of the segments of fixed address.
+SP = 0
+LCL = 1
+ARG = 2
+THIS = 3
+THAT = 4
+TEMP_BASE = 5
+STATIC_BASE = 16
+STACK_BASE = 256
+
+_SEGMENT_TO_POINTER = {
+    consts.LOCAL: LCL,
+    consts.ARGUMENT: ARG,
+    consts.THIS: THIS,
+    consts.THAT: THAT,
+}
+
+_REG_SEGMENT_TO_ADDRESS = {
+    consts.POINTER: THIS,
+    consts.TEMP: TEMP_BASE,
+}
+
+# Functions which halt the program once called.
+HALT_FUNCTIONS = (consts.SYS_HALT,)
+
+# Default amount of steps to execute before giving up on a program that
+# never halts.
+DEFAULT_STEP_BUDGET = 10 ** 7
+
+# Marks the instructions which halt the program: the end of the program,
+# "label X / goto X" and the functions of HALT_FUNCTIONS.
+_HALT = (None, None)
+
+
+def _wrap(value):
+    """
+    Wrap python integer to signed 16 bit word.
+    """
+    return ((value + 0x8000) & 0xFFFF) - 0x8000
+
+
+class VMInterpreter(object):
+
+    def __init__(self, programs, halt_functions=HALT_FUNCTIONS):
+        """
+        :param programs: list of (path, instructions) of the program vm
+        files.
+        :param halt_functions: The names of the functions which halt the
+        program once called.
+        """
+        self.ram = [0] * RAM_SIZE
+        self.halt_functions = halt_functions
+        # The number of calls of each function.
+        self.call_counts = collections.Counter()
+
+        command_to_compile_method = {
+            consts.ADD: self._compile_arithmetic,
+            consts.SUB: self._compile_arithmetic,
+            consts.NEG: self._compile_arithmetic,
+            consts.EQ: self._compile_arithmetic,
+            consts.GT: self._compile_arithmetic,
+            consts.LT: self._compile_arithmetic,
+            consts.AND: self._compile_arithmetic,
+            consts.OR: self._compile_arithmetic,
+            consts.NOT: self._compile_arithmetic,
+            consts.PUSH: self._compile_push,
+            consts.POP: self._compile_pop,
+            consts.GOTO: self._compile_goto,
+            consts.IF_GOTO: self._compile_if_goto,
+            consts.FUNCTION: self._compile_function,
+            consts.CALL: self._compile_call,
+            consts.RETURN: self._compile_return,
+        }
+        # Indexed by the opcode of the instruction.
+        self._opcode_to_compile_method = [None] * len(consts.COMMANDS)
+        for command, compile_method in command_to_compile_method.iteritems():
+            self._opcode_to_compile_method[consts.OPCODES[command]] = \
+                compile_method
+        self._ARITHMETIC_TO_HANDLER = {
+            consts.ADD: self._add,
+            consts.SUB: self._sub,
+            consts.NEG: self._neg,
+            consts.EQ: self._eq,
+            consts.GT: self._gt,
+            consts.LT: self._lt,
+            consts.AND: self._and,
+            consts.OR: self._or,
+            consts.NOT: self._not,
+        }
+        self._code = self._compile(programs)
+        self.reset()
+
+    def reset(self):
+        """
+        Start over at Sys.init (without calling it, like the VM emulator
+        does) or at the first instruction. The RAM is left as is.
+        """
+        self.pc = self._function_entries.get(consts.SYS_INIT, 0)
+        self.steps = 0
+        self.halted = False
+
+    def bootstrap(self):
+        """
+        Set the stack and call Sys.init, like the bootstrap code of the
+        translated program. Returning from Sys.init halts.
+        """
+        self.reset()
+        self.ram[SP] = STACK_BASE
+        if consts.SYS_INIT in self._function_entries:
+            self.pc = self._call((self._function_entries[consts.SYS_INIT], 0),
+                                 self._end)
+
+    def run(self, max_steps=DEFAULT_STEP_BUDGET):
+        """
+        Execute the program until it halts or until max_steps instructions
+        were executed.
+        :param max_steps: The step budget for this run.
+        :return: The number of executed instructions.
+        """
+        code = self._code
+        pc = self.pc
+        executed = 0
+
+        while executed < max_steps:
+            handler, operand = code[pc]
+            if handler is None:
+                self.halted = True
+                break
+            executed += 1
+            pc = handler(operand, pc + 1)
+
+        self.pc = pc
+        self.steps += executed
+        return executed
+
+    def step(self):
+        """
+        Execute single instruction.
+        """
+        return self.run(max_steps=1)
+
+    def _compile(self, programs):
+        """
+        :return: list of (handler, operand) pairs.
+        """
+        # Resolve the labels and the functions to the index of the next
+        # instruction first, the jumps may go forward.
+        self._function_entries = dict()
+        self._label_indices = dict()
+        self._static_addresses = dict()
+        index = 0
+        for path, instructions in programs:
+            function_name = ""
+            for instruction in instructions:
+                if instruction.command == consts.LABEL:
+                    self._label_indices[(function_name,
+                                         instruction.label)] = index
+                    continue
+                if instruction.command == consts.FUNCTION:
+                    function_name = instruction.function_name
+                    self._function_entries[function_name] = index
+                index += 1
+
+        code = []
+        for path, instructions in programs:
+            self._current_file = os.path.basename(path)
+            self._current_func = ""
+            for instruction in instructions:
+                if instruction.command == consts.LABEL:
+                    continue
+                compile_instruction = \
+                    self._opcode_to_compile_method[instruction.opcode]
+                if compile_instruction is None:
+                    raise RuntimeError("Unsupported instruction: %r" %
+                                       (instruction,))
+                code.append(compile_instruction(instruction, len(code)))
+
+        # Falling off the end (or returning from the bootstrap) halts.
+        self._end = len(code)
+        code.append(_HALT)
+        return code
+
+    def _compile_arithmetic(self, instruction, index):
+        return self._ARITHMETIC_TO_HANDLER[instruction.command], None
+
+    def _compile_push(self, instruction, index):
+        if instruction.segment == consts.CONSTANT:
+            return self._push_constant, instruction.index
+        if instruction.segment in _SEGMENT_TO_POINTER:
+            return self._push_segment, (
+                _SEGMENT_TO_POINTER[instruction.segment],
+                instruction.index)
+        return self._push_address, self._address(instruction)
+
+    def _compile_pop(self, instruction, index):
+        if instruction.segment in _SEGMENT_TO_POINTER:
+            return self._pop_segment, (
+                _SEGMENT_TO_POINTER[instruction.segment],
+                instruction.index)
+        return self._pop_address, self._address(instruction)
+
+    def _address(self, instruction):
+        """
+        :return: The RAM address of static, pointer or temp segment cell.
+        """
+        if instruction.segment == consts.STATIC:
+            # Allocated in order of appearance, like the assembler does.
+            symbol = (self._current_file, instruction.index)
+            if symbol not in self._static_addresses:
+                self._static_addresses[symbol] = (STATIC_BASE +
+                                                  len(self._static_addresses))
+            return self._static_addresses[symbol]
+        if instruction.segment in _REG_SEGMENT_TO_ADDRESS:
+            return (_REG_SEGMENT_TO_ADDRESS[instruction.segment] +
+                    instruction.index)
+        raise RuntimeError("Not supported memory instruction: %s" %
+                           repr(instruction))
+
+    def _label_index(self, label):
+        key = (self._current_func, label)
+        if key not in self._label_indices:
+            raise RuntimeError("Unknown label %s in function %s" % (
+                label, self._current_func))
+        return self._label_indices[key]
+
+    def _compile_goto(self, instruction, index):
+        target = self._label_index(instruction.label)
+        if target == index:
+            # "label X / goto X" never leaves.
+            return _HALT
+        return self._goto, target
+
+    def _compile_if_goto(self, instruction, index):
+        return self._if_goto, self._label_index(instruction.label)
+
+    def _compile_function(self, instruction, index):
+        self._current_func = instruction.function_name
+        if instruction.function_name in self.halt_functions:
+            return _HALT
+        return self._function, (instruction.function_name,
+                                instruction.number_of_arguments)
+
+    def _compile_call(self, instruction, index):
+        if instruction.function_name not in self._function_entries:
+            # Fails only if it is called.
+            return self._call_unknown, instruction.function_name
+        return self._call, (self._function_entries[instruction.function_name],
+                            instruction.number_of_arguments)
+
+    def _compile_return(self, instruction, index):
+        return self._return, None
+
+    # The handlers get the operand and the index of the next instruction,
+    # and return the index of the instruction to execute next.
+
+    def _push_constant(self, value, pc):
+        ram = self.ram
+        sp = ram[SP]
+        ram[sp] = value
+        ram[SP] = sp + 1
+        return pc
+
+    def _push_segment(self, operand, pc):
+        pointer, index = operand
+        ram = self.ram
+        sp = ram[SP]
+        ram[sp] = ram[ram[pointer] + index]
+        ram[SP] = sp + 1
+        return pc
+
+    def _push_address(self, address, pc):
+        ram = self.ram
+        sp = ram[SP]
+        ram[sp] = ram[address]
+        ram[SP] = sp + 1
+        return pc
+
+    def _pop_segment(self, operand, pc):
+        pointer, index = operand
+        ram = self.ram
+        sp = ram[SP] - 1
+        ram[ram[pointer] + index] = ram[sp]
+        ram[SP] = sp
+        return pc
+
+    def _pop_address(self, address, pc):
+        ram = self.ram
+        sp = ram[SP] - 1
+        ram[address] = ram[sp]
+        ram[SP] = sp
+        return pc
+
+    def _add(self, _, pc):
+        ram = self.ram
+        sp = ram[SP] - 1
+        ram[sp - 1] = _wrap(ram[sp - 1] + ram[sp])
+        ram[SP] = sp
+        return pc
+
+    def _sub(self, _, pc):
+        ram = self.ram
+        sp = ram[SP] - 1
+        ram[sp - 1] = _wrap(ram[sp - 1] - ram[sp])
+        ram[SP] = sp
+        return pc
+
+    def _and(self, _, pc):
+        ram = self.ram
+        sp = ram[SP] - 1
+        ram[sp - 1] &= ram[sp]
+        ram[SP] = sp
+        return pc
+
+    def _or(self, _, pc):
+        ram = self.ram
+        sp = ram[SP] - 1
+        ram[sp - 1] |= ram[sp]
+        ram[SP] = sp
+        return pc
+
+    def _eq(self, _, pc):
+        ram = self.ram
+        sp = ram[SP] - 1
+        ram[sp - 1] = -1 if ram[sp - 1] == ram[sp] else 0
+        ram[SP] = sp
+        return pc
+
+    def _gt(self, _, pc):
+        ram = self.ram
+        sp = ram[SP] - 1
+        ram[sp - 1] = -1 if ram[sp - 1] > ram[sp] else 0
+        ram[SP] = sp
+        return pc
+
+    def _lt(self, _, pc):
+        ram = self.ram
+        sp = ram[SP] - 1
+        ram[sp - 1] = -1 if ram[sp - 1] < ram[sp] else 0
+        ram[SP] = sp
+        return pc
+
+    def _neg(self, _, pc):
+        ram = self.ram
+        top = ram[SP] - 1
+        ram[top] = _wrap(-ram[top])
+        return pc
+
+    def _not(self, _, pc):
+        ram = self.ram
+        top = ram[SP] - 1
+        ram[top] = ~ram[top]
+        return pc
+
+    def _goto(self, target, pc):
+        return target
+
+    def _if_goto(self, target, pc):
+        ram = self.ram
+        sp = ram[SP] - 1
+        ram[SP] = sp
+        return target if ram[sp] else pc
+
+    def _function(self, operand, pc):
+        function_name, number_of_locals = operand
+        self.call_counts[function_name] += 1
+        ram = self.ram
+        sp = ram[SP]
+        ram[sp:sp + number_of_locals] = [0] * number_of_locals
+        ram[SP] = sp + number_of_locals
+        return pc
+
+    def _call(self, operand, pc):
+        target, number_of_arguments = operand
+        ram = self.ram
+        sp = ram[SP]
+        ram[sp] = pc
+        ram[sp + 1] = ram[LCL]
+        ram[sp + 2] = ram[ARG]
+        ram[sp + 3] = ram[THIS]
+        ram[sp + 4] = ram[THAT]
+        ram[ARG] = sp - number_of_arguments
+        ram[LCL] = ram[SP] = sp + 5
+        return target
+
+    def _call_unknown(self, function_name, pc):
+        raise RuntimeError("Call to unknown function: %s" % function_name)
+
+    def _return(self, _, pc):
+        ram = self.ram
+        frame = ram[LCL]
+        return_address = ram[frame - 5]
+        ram[ram[ARG]] = ram[ram[SP] - 1]
+        ram[SP] = ram[ARG] + 1
+        ram[THAT] = ram[frame - 1]
+        ram[THIS] = ram[frame - 2]
+        ram[ARG] = ram[frame - 3]
+        ram[LCL] = ram[frame - 4]
+        if not 0 <= return_address < self._end:
+            # Return to address of other program (like the fake return
+            # addresses of the test scripts).
+            return self._end
+        return return_address
+
+
+def find_vm_files(input_path):
+    """
+    :return: list of the vm files of the program, a file or the files of a
+    directory in sorted order.
+    """
+    if os.path.isdir(input_path):
+        return [os.path.join(input_path, filename)
+                for filename in sorted(os.listdir(input_path))
+                if filename.endswith(".vm")]
+    return [input_path]
+
+
+def load_vm_program(input_path, **options):
+    """
+    :param input_path: vm file or directory.
+    :return: VMInterpreter of the program.
+    """
+    return VMInterpreter([(path, parse_vm_file(path))
+                          for path in find_vm_files(input_path)], **options)
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print "Usage: %s <vm file/ directory> [max steps]" % sys.argv[0]
+        sys.exit(1)
+
+    max_steps = int(sys.argv[2]) if len(sys.argv) == 3 else DEFAULT_STEP_BUDGET
+    interpreter = load_vm_program(sys.argv[1])
+    interpreter.bootstrap()
+    start = time.time()
+    executed = interpreter.run(max_steps)
+    elapsed = time.time() - start
+
+    print "Executed %d vm instructions in %.2f seconds (%.2f M/sec)" % (
+        executed, elapsed, executed / elapsed / 10 ** 6 if elapsed else 0)
+    print "Halted" if interpreter.halted else "Step budget exhausted"
+    print "Calls per function:"
+    for function_name, count in interpreter.call_counts.most_common():
+        print "%10d %s" % (count, function_name)
+
+
+if __name__ == "__main__":
+    main()
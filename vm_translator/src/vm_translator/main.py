@@ -1,40 +1,184 @@
 import sys
 import os
+import functools
+import itertools
+import multiprocessing
 
-from vm_translator.parser import parse_vm_file
-from vm_translator.code_generator import CodeGenerator
+from vm_translator.parser import parse_vm_file, declares_function
+from vm_translator.code_generator import CodeGenerator, INTRINSICS
+from vm_translator.optimizer import optimize, PATTERNS
+from vm_translator import call_graph
+from vm_translator import consts
+from vm_translator import inliner
 
-def translate_to_hack(file_paths, output_path):
-    code_generator = CodeGenerator()
-    for path in file_paths:
+# Programs of smaller total size of vm files (about half a second of
+# translation in single process) are translated without the pool by
+# default, starting it costs more than it saves (see
+# benchmarks/bench_vm_translator.py).
+POOL_MIN_SIZE = 2 ** 20
+
+def translate_file(program, shared_calls=False, optimizations=(),
+                   cache_top=False, track_sp=False, frame_pointers=None,
+                   intrinsics=False):
+    """
+    Translate single vm file, apart from the other files of the program.
+    :param program: tuple of (path, instructions), the file is parsed when
+    the instructions are None (cheaper than passing them to the pool).
+    :return: FileCode (see CodeGenerator.get_file_code).
+    """
+    path, instructions = program
+    if instructions is None:
         instructions = parse_vm_file(path)
-        code_generator.set_current_file(path)
+    if optimizations:
+        instructions = optimize(instructions, optimizations)
+
+    code_generator = CodeGenerator(shared_calls=shared_calls,
+                                   cache_top=cache_top,
+                                   track_sp=track_sp,
+                                   frame_pointers=frame_pointers,
+                                   intrinsics=intrinsics)
+    code_generator.set_current_file(path)
+    for instruction in instructions:
+        code_generator.process_instruction(instruction)
+    return code_generator.get_file_code()
 
-        for instruction in instructions:
-            code_generator.process_instruction(instruction)
+def declares_sys_init(program):
+    """
+    :param program: tuple of (path, instructions) like translate_file.
+    :return: Whether the file declares Sys.init.
+    """
+    path, instructions = program
+    if instructions is None:
+        return declares_function(path, consts.SYS_INIT)
+    return any(instruction.command == consts.FUNCTION and
+               instruction.function_name == consts.SYS_INIT
+               for instruction in instructions)
+
+def translate_to_hack(file_paths, output_path, shared_calls=False,
+                      optimizations=(), remove_dead_functions=False,
+                      cache_top=False, track_sp=False, processes=None,
+                      inline_max_size=0, light_calls=False, intrinsics=False):
+    """
+    Translate the files across a process pool, file per task, and write
+    them to the output as they are translated, in the given order.
+    :param shared_calls: Use the shared call / return routines.
+    :param optimizations: The names of the optimizer patterns to apply
+    (see optimizer.PATTERNS).
+    :param remove_dead_functions: Translate only the functions which are
+    called (directly or indirectly) from Sys.init.
+    :param cache_top: Keep the top of the stack in D (see CodeGenerator).
+    :param track_sp: Update SP once per straight line code (see
+    CodeGenerator).
+    :param processes: Number of worker processes (default, one per cpu for
+    programs of POOL_MIN_SIZE or larger, single process otherwise). Single
+    file, or single process, is translated without the pool.
+    :param inline_max_size: Inline the calls of leaf functions of up to
+    this number of instructions (0 - no inlining, see inliner).
+    :param light_calls: Save and restore only the pointers each function
+    sets at its call frames (see call_graph.find_frame_pointers).
+    :param intrinsics: Translate the calls of Math.multiply, Math.abs,
+    Memory.peek and Memory.poke to inline code (see CodeGenerator).
+    """
+    frame_pointers = None
+    if remove_dead_functions or inline_max_size or light_calls:
+        # Parse all the files first, the call graph spans the whole program.
+        programs = [(path, parse_vm_file(path)) for path in file_paths]
+        if inline_max_size:
+            programs = inliner.inline_functions(
+                programs, inline_max_size,
+                keep=INTRINSICS if intrinsics else ())
+        if remove_dead_functions:
+            programs = call_graph.remove_dead_functions(programs)
+        if light_calls:
+            frame_pointers = call_graph.find_frame_pointers(programs)
+    else:
+        programs = [(path, None) for path in file_paths]
 
-    return open(output_path, 'wb').write(code_generator.get_assembly_code())
+    options = dict(shared_calls=shared_calls, cache_top=cache_top,
+                   track_sp=track_sp, frame_pointers=frame_pointers,
+                   intrinsics=intrinsics)
+    translate = functools.partial(translate_file,
+                                  optimizations=optimizations, **options)
+    # The bootstrap code goes first, before any file is translated.
+    call_sys_init = any(declares_sys_init(program) for program in programs)
+    linker = CodeGenerator(**options)
+    if processes is None:
+        total_size = sum(os.path.getsize(path) for path in file_paths)
+        processes = (multiprocessing.cpu_count()
+                     if total_size >= POOL_MIN_SIZE else 1)
+    with open(output_path, 'wb') as output:
+        if processes == 1 or len(programs) < 2:
+            linker.write_program_code(output,
+                                      itertools.imap(translate, programs),
+                                      call_sys_init)
+            return
 
-def translate_to_hack_given_path(input_path):
+        pool = multiprocessing.Pool(processes)
+        try:
+            linker.write_program_code(
+                output, pool.imap(translate, programs, chunksize=1),
+                call_sys_init)
+        finally:
+            pool.close()
+            pool.join()
+
+def translate_to_hack_given_path(input_path, **options):
     if os.path.isdir(input_path):
         paths = [os.path.join(input_path, filename) for
-                 filename in os.listdir(input_path) if filename.endswith(".vm")]
+                 filename in sorted(os.listdir(input_path))
+                 if filename.endswith(".vm")]
         output_file =  os.path.join(input_path, os.path.basename(input_path) + ".asm")
     else:
         paths = [input_path]
         output_file = os.path.splitext(input_path)[0] + '.asm'
 
-    translate_to_hack(paths, output_file)
+    translate_to_hack(paths, output_file, **options)
+
+SHARED_CALLS_FLAG = "--shared-calls"
+OPTIMIZE_FLAG = "--optimize"
+REMOVE_DEAD_FUNCTIONS_FLAG = "--remove-dead-functions"
+CACHE_TOP_FLAG = "--cache-top"
+TRACK_SP_FLAG = "--track-sp"
+PROCESSES_FLAG = "--processes"
+INLINE_FLAG = "--inline"
+LIGHT_CALLS_FLAG = "--light-calls"
+INTRINSICS_FLAG = "--intrinsics"
 
 def parse_args():
-    if len(sys.argv) < 2:
-        print "Usage: %s <vm file/ directory>" % sys.argv[0]
+    """
+    :return: tuple of (input path, dict of the translation options)
+    """
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(args) != 1:
+        print "Usage: %s [%s] [%s[=pattern,...]] [%s] [%s] [%s] [%s=n] [%s[=size]] [%s] [%s] <vm file/ directory>" % (
+            sys.argv[0], SHARED_CALLS_FLAG, OPTIMIZE_FLAG,
+            REMOVE_DEAD_FUNCTIONS_FLAG, CACHE_TOP_FLAG, TRACK_SP_FLAG,
+            PROCESSES_FLAG, INLINE_FLAG, LIGHT_CALLS_FLAG, INTRINSICS_FLAG)
+        print "Optimizer patterns: %s" % ", ".join(PATTERNS)
         sys.exit(1)
-    return sys.argv[1]
+
+    options = dict(shared_calls=SHARED_CALLS_FLAG in sys.argv,
+                   remove_dead_functions=REMOVE_DEAD_FUNCTIONS_FLAG in sys.argv,
+                   cache_top=CACHE_TOP_FLAG in sys.argv,
+                   track_sp=TRACK_SP_FLAG in sys.argv,
+                   light_calls=LIGHT_CALLS_FLAG in sys.argv,
+                   intrinsics=INTRINSICS_FLAG in sys.argv)
+    for arg in sys.argv[1:]:
+        if arg == OPTIMIZE_FLAG:
+            options["optimizations"] = PATTERNS
+        elif arg.startswith(OPTIMIZE_FLAG + "="):
+            options["optimizations"] = arg.split("=", 1)[1].split(",")
+        elif arg.startswith(PROCESSES_FLAG + "="):
+            options["processes"] = int(arg.split("=", 1)[1])
+        elif arg == INLINE_FLAG:
+            options["inline_max_size"] = inliner.MAX_INLINE_SIZE
+        elif arg.startswith(INLINE_FLAG + "="):
+            options["inline_max_size"] = int(arg.split("=", 1)[1])
+    return args[0], options
 
 def main():
-    input_path = parse_args()
-    translate_to_hack_given_path(input_path)
+    input_path, options = parse_args()
+    translate_to_hack_given_path(input_path, **options)
 
 if __name__ == "__main__":
     main()  
@@ -0,0 +1,278 @@
+"""
+Peephole optimizer over the parsed vm instructions.
+
+Runs between the parser and the code generator and replaces common
+windows of the jack compiler output with fused instructions, which the
+code generator translates without going through the stack:
+
+    constant-arithmetic  push constant N / add (sub, and, or)
+    constant-unary       push constant N / not, push constant N / neg
+                         (folded to push of the result)
+    move                 push X / pop Y (dropped when X is Y)
+    conditional-goto     if-goto on compare (eq, gt, lt) or not, and
+                         "if-goto A / goto B / label A" as "jump to B if
+                         false" (the label is kept)
+    tail-call            call F n / return (the callee reuses the frame of
+                         the returning function)
+
+Every pattern can be switched on its own, see optimize.
+"""
+from vm_translator import consts
+from vm_translator.parser import Instruction, MemoryInstruction
+
+# The names of the patterns (see consts.py).
+PATTERNS = consts.OPTIMIZER_PATTERNS
+
+class ConstantArithmeticInstruction(Instruction):
+    __slots__ = _fields = ("command", "arithmetic", "value")
+
+    def __init__(self, command, arithmetic, value):
+        self.opcode = consts.OPCODES[command]
+        self.command = command
+        self.arithmetic = arithmetic
+        self.value = value
+
+
+class MoveInstruction(Instruction):
+    __slots__ = _fields = ("command", "source", "target")
+
+    def __init__(self, command, source, target):
+        self.opcode = consts.OPCODES[command]
+        self.command = command
+        self.source = source
+        self.target = target
+
+
+class ConditionalGotoInstruction(Instruction):
+    """
+    Jump to the label by the value computed from the top of the stack:
+    comparison None - the value itself, NOT - the value plus one (zero
+    exactly when "not value" is zero), EQ / GT / LT - X - Y of the two top
+    cells. jump is the hack jump mnemonic over the computed value.
+    """
+    __slots__ = _fields = ("command", "comparison", "jump", "label")
+
+    def __init__(self, command, comparison, jump, label):
+        self.opcode = consts.OPCODES[command]
+        self.command = command
+        self.comparison = comparison
+        self.jump = jump
+        self.label = label
+
+
+class TailCallInstruction(Instruction):
+    __slots__ = _fields = ("command", "function_name", "number_of_arguments")
+
+    def __init__(self, command, function_name, number_of_arguments):
+        self.opcode = consts.OPCODES[command]
+        self.command = command
+        self.function_name = function_name
+        self.number_of_arguments = number_of_arguments
+
+
+COMPARISON_TO_JUMP = {
+    consts.EQ: "JEQ",
+    consts.GT: "JGT",
+    consts.LT: "JLT",
+}
+
+INVERSE_JUMP = {
+    "JEQ": "JNE",
+    "JNE": "JEQ",
+    "JGT": "JLE",
+    "JLE": "JGT",
+    "JLT": "JGE",
+    "JGE": "JLT",
+}
+
+CONSTANT_ARITHMETIC_COMMANDS = (consts.ADD, consts.SUB, consts.AND, consts.OR)
+
+# Largest constant A instruction can load.
+MAX_CONSTANT = 0x7FFF
+
+
+def optimize(instructions, patterns=PATTERNS):
+    """
+    Replace the instruction windows matched by the patterns with fused
+    instructions, until nothing matches.
+    :param instructions: list of instructions of single vm file.
+    :param patterns: The names of the enabled patterns (see PATTERNS).
+    :return: list of instructions.
+    """
+    for pattern in patterns:
+        if pattern not in PATTERN_TO_RULES:
+            raise RuntimeError("Unknown optimization pattern: %s" % pattern)
+
+    # The rules which may match at instruction, indexed by its opcode (in
+    # the order of PATTERNS, the first matching rule wins).
+    opcode_to_rules = [[] for _ in consts.COMMANDS]
+    for pattern in PATTERNS:
+        if pattern in patterns:
+            for first_commands, rule in PATTERN_TO_RULES[pattern]:
+                for command in first_commands:
+                    opcode_to_rules[consts.OPCODES[command]].append(rule)
+
+    changed = True
+    while changed:
+        instructions, changed = _apply_rules(instructions, opcode_to_rules)
+    return instructions
+
+
+def _apply_rules(instructions, opcode_to_rules):
+    """
+    :return: tuple of (the instructions after single pass of the rules,
+    whether any rule matched).
+    """
+    optimized = []
+    changed = False
+    index = 0
+    length = len(instructions)
+    while index < length:
+        instruction = instructions[index]
+        for rule in opcode_to_rules[instruction.opcode]:
+            match = rule(instructions, index)
+            if match is not None:
+                replacement, window_length = match
+                optimized.extend(replacement)
+                index += window_length
+                changed = True
+                break
+        else:
+            optimized.append(instruction)
+            index += 1
+    return optimized, changed
+
+
+def _push_constant(value):
+    return MemoryInstruction(command=consts.PUSH, segment=consts.CONSTANT,
+                             index=value)
+
+
+# The rules get the instructions and the index of the first instruction of
+# the window, and return tuple of (replacement, window length) or None.
+# They are called only for the first commands they are listed with in
+# PATTERN_TO_RULES.
+
+def _constant_arithmetic_rule(instructions, index):
+    if index + 1 == len(instructions):
+        return None
+    push, arithmetic = instructions[index], instructions[index + 1]
+    if (push.segment == consts.CONSTANT and push.index >= 0 and
+            arithmetic.command in CONSTANT_ARITHMETIC_COMMANDS):
+        return [ConstantArithmeticInstruction(
+            command=consts.CONSTANT_ARITHMETIC,
+            arithmetic=arithmetic.command,
+            value=push.index)], 2
+    return None
+
+
+def _constant_unary_rule(instructions, index):
+    if index + 1 == len(instructions):
+        return None
+    push, unary = instructions[index], instructions[index + 1]
+    if push.segment != consts.CONSTANT:
+        return None
+
+    # Only the values which can be pushed as constant (see
+    # CodeGenerator._load_value_to_d) are folded.
+    value = push.index
+    if unary.command == consts.NOT and 0 <= value < MAX_CONSTANT:
+        return [_push_constant(~value)], 2
+    if unary.command == consts.NEG and value != 0:
+        return [_push_constant(-value)], 2
+    return None
+
+
+def _move_rule(instructions, index):
+    if index + 1 == len(instructions):
+        return None
+    source, target = instructions[index], instructions[index + 1]
+    if target.command == consts.POP:
+        if (source.segment, source.index) == (target.segment, target.index):
+            return [], 2
+        return [MoveInstruction(command=consts.MOVE, source=source,
+                                target=target)], 2
+    return None
+
+
+def _as_conditional_goto(instruction):
+    """
+    :return: ConditionalGotoInstruction equivalent to the instruction if it
+    is if-goto or conditional goto, None otherwise.
+    """
+    if instruction.command == consts.IF_GOTO:
+        return ConditionalGotoInstruction(command=consts.CONDITIONAL_GOTO,
+                                          comparison=None, jump="JNE",
+                                          label=instruction.label)
+    if instruction.command == consts.CONDITIONAL_GOTO:
+        return instruction
+    return None
+
+
+def _condition_rule(instructions, index):
+    # compare / not followed by if-goto on its result.
+    if index + 1 == len(instructions):
+        return None
+    conditional_goto = _as_conditional_goto(instructions[index + 1])
+    if conditional_goto is None:
+        return None
+
+    command = instructions[index].command
+    if command == consts.NOT and conditional_goto.comparison is None:
+        comparison = consts.NOT
+        jump = conditional_goto.jump
+    elif (command in COMPARISON_TO_JUMP and
+            conditional_goto.comparison in (None, consts.NOT)):
+        # The compare result is true (-1) or false (0). Jump on true:
+        # value != 0, or "not value" != 0 for false.
+        comparison = command
+        jump = COMPARISON_TO_JUMP[command]
+        if (conditional_goto.jump == "JNE") == \
+                (conditional_goto.comparison == consts.NOT):
+            jump = INVERSE_JUMP[jump]
+    else:
+        return None
+
+    return [conditional_goto._replace(comparison=comparison, jump=jump)], 2
+
+
+def _goto_over_goto_rule(instructions, index):
+    # if-goto A / goto B / label A, jump to B if the condition is false.
+    if index + 2 >= len(instructions):
+        return None
+    conditional_goto = _as_conditional_goto(instructions[index])
+    goto, label = instructions[index + 1], instructions[index + 2]
+    if (goto.command == consts.GOTO and label.command == consts.LABEL and
+            label.label == conditional_goto.label):
+        return [conditional_goto._replace(
+            jump=INVERSE_JUMP[conditional_goto.jump],
+            label=goto.label), label], 3
+    return None
+
+
+def _tail_call_rule(instructions, index):
+    if index + 1 == len(instructions):
+        return None
+    call = instructions[index]
+    if instructions[index + 1].command == consts.RETURN:
+        return [TailCallInstruction(
+            command=consts.TAIL_CALL,
+            function_name=call.function_name,
+            number_of_arguments=call.number_of_arguments)], 2
+    return None
+
+
+# Map between pattern, to its rules and the first commands of their windows.
+PATTERN_TO_RULES = {
+    consts.CONSTANT_ARITHMETIC: (
+        ((consts.PUSH,), _constant_arithmetic_rule),),
+    consts.CONSTANT_UNARY: (
+        ((consts.PUSH,), _constant_unary_rule),),
+    consts.MOVE: (
+        ((consts.PUSH,), _move_rule),),
+    consts.CONDITIONAL_GOTO: (
+        ((consts.IF_GOTO, consts.CONDITIONAL_GOTO), _goto_over_goto_rule),
+        ((consts.NOT,) + tuple(COMPARISON_TO_JUMP), _condition_rule)),
+    consts.TAIL_CALL: (
+        ((consts.CALL,), _tail_call_rule),),
+}
@@ -1,23 +1,86 @@
-from collections import namedtuple
-
 from vm_translator import consts
 
 
-ArithmeticInstruction = namedtuple("ArithmeticInstruction", ["command"])
+class Instruction(object):
+    """
+    Compact record of vm instruction: the command, its integer opcode (see
+    consts.OPCODES) and the fields of the command. Compared, hashed and
+    replaced by the fields like a namedtuple.
+    """
+    __slots__ = ("opcode",)
+    _fields = ()
+
+    def _values(self):
+        return tuple(getattr(self, field) for field in self._fields)
+
+    def _replace(self, **fields):
+        values = dict(zip(self._fields, self._values()))
+        values.update(fields)
+        return self.__class__(**values)
+
+    def __eq__(self, other):
+        return (self.__class__ is other.__class__ and
+                self._values() == other._values())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __reduce__(self):
+        return self.__class__, self._values()
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, ", ".join(
+            "%s=%r" % (field, getattr(self, field)) for field in self._fields))
+
+
+class ArithmeticInstruction(Instruction):
+    __slots__ = _fields = ("command",)
+
+    def __init__(self, command):
+        self.opcode = consts.OPCODES[command]
+        self.command = command
 
-MemoryInstruction = namedtuple("MemoryInstruction", ["command",
-                                                     "segment",
-                                                     "index"])
 
-ProgramFlowInstruction = namedtuple("ProgramFlowInstruction", ["command",
-                                                               "label"])
+# The index (and the number of arguments of FunctionProtocolInstruction) is
+# parsed to int once, here.
+class MemoryInstruction(Instruction):
+    __slots__ = _fields = ("command", "segment", "index")
 
-FunctionProtocolInstruction = namedtuple("FunctionProtocolInstruction",
-                                         ["command",
-                                          "function_name",
-                                          "number_of_arguments"])
+    def __init__(self, command, segment, index):
+        self.opcode = consts.OPCODES[command]
+        self.command = command
+        self.segment = segment
+        self.index = index
 
-ReturnInstruction = namedtuple("ReturnInstruction", ["command"])
+
+class ProgramFlowInstruction(Instruction):
+    __slots__ = _fields = ("command", "label")
+
+    def __init__(self, command, label):
+        self.opcode = consts.OPCODES[command]
+        self.command = command
+        self.label = label
+
+
+class FunctionProtocolInstruction(Instruction):
+    __slots__ = _fields = ("command", "function_name", "number_of_arguments")
+
+    def __init__(self, command, function_name, number_of_arguments):
+        self.opcode = consts.OPCODES[command]
+        self.command = command
+        self.function_name = function_name
+        self.number_of_arguments = number_of_arguments
+
+
+class ReturnInstruction(Instruction):
+    __slots__ = _fields = ("command",)
+
+    def __init__(self, command):
+        self.opcode = consts.OPCODES[command]
+        self.command = command
 
 
 def parse_vm_file(path):
@@ -46,6 +109,22 @@ def parse_vm_file_content(file_content):
     return instructions
 
 
+def declares_function(path, function_name):
+    """
+    Check whether vm file declares the function, by scanning its lines
+    without parsing them.
+    :param path: The file path.
+    :param function_name: The name of the function.
+    :return: bool.
+    """
+    with open(path) as vm_file:
+        for line in vm_file:
+            if strip_comments(line).split()[:2] == [consts.FUNCTION,
+                                                    function_name]:
+                return True
+    return False
+
+
 def strip_comments(line):
     COMMENT = "//"
     if COMMENT in line:
@@ -66,11 +145,14 @@ def parse_instruction(line):
     if instruction in consts.ARITHMETIC_INSTRUCTIONS:
         return ArithmeticInstruction(*terms)
     elif instruction in consts.MEMORY_INSTRUCTIONS:
-        return MemoryInstruction(*terms)
+        command, segment, index = terms
+        return MemoryInstruction(command, segment, int(index))
     elif instruction in consts.PROGRAM_FLOW_INSTRUCTIONS:
         return ProgramFlowInstruction(*terms)
     elif instruction in consts.FUNCTION_PROTOCOL_INSTRUCTIONS:
-        return FunctionProtocolInstruction(*terms)
+        command, function_name, number_of_arguments = terms
+        return FunctionProtocolInstruction(command, function_name,
+                                           int(number_of_arguments))
     elif instruction == consts.RETURN:
         return ReturnInstruction(*terms)
     else:
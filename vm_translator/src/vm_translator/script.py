@@ -0,0 +1,92 @@
+"""
+Run the VM emulator test scripts (*VME.tst) with the vm interpreter.
+
+Supports the commands of the CPU emulator scripts (see
+hack_emulator.script) with vmstep instead of ticktock, and the segment
+variables of the VM emulator (sp, local, argument[i], ...).
+"""
+import glob
+import os
+import re
+
+from hack_emulator.script import ScriptRunner
+
+from vm_translator.interpreter import (VMInterpreter, find_vm_files,
+                                       SP, LCL, ARG, THIS, THAT)
+from vm_translator.parser import parse_vm_file
+
+VME_TST_SUFFIX = "VME.tst"
+
+# <segment pointer>[<index>]
+_SEGMENT_CELL_REGEX = re.compile(r"^(\w+)\[(\d+)\]$")
+
+_VARIABLE_TO_POINTER = {
+    "sp": SP,
+    "local": LCL,
+    "argument": ARG,
+    "this": THIS,
+    "that": THAT,
+}
+
+
+class VMScriptRunner(ScriptRunner):
+
+    def __init__(self, tst_path):
+        super(VMScriptRunner, self).__init__(tst_path)
+        self._COMMAND_TO_PROCESS_METHOD["vmstep"] = self._process_vmstep
+
+    def _create_emulator(self):
+        # The interpreter is created by the load command.
+        return None
+
+    def _process_load(self, filename=None):
+        """
+        Load vm file, or all the vm files of the script directory.
+        """
+        path = self._path(filename) if filename else self._script_dir
+        self._emulator = VMInterpreter(
+            [(vm_path, parse_vm_file(vm_path))
+             for vm_path in find_vm_files(path)], halt_functions=())
+
+    def _process_vmstep(self):
+        self._emulator.step()
+
+    def _get(self, variable):
+        return self._emulator.ram[self._address(variable)]
+
+    def _set(self, variable, value):
+        self._emulator.ram[self._address(variable)] = value
+
+    def _address(self, variable):
+        if variable in _VARIABLE_TO_POINTER:
+            return _VARIABLE_TO_POINTER[variable]
+
+        match = _SEGMENT_CELL_REGEX.match(variable)
+        if match is None:
+            raise RuntimeError("Unsupported variable: %s" % variable)
+        name, index = match.group(1), int(match.group(2))
+        if name == "RAM":
+            return index
+        if name in _VARIABLE_TO_POINTER and name != "sp":
+            return self._emulator.ram[_VARIABLE_TO_POINTER[name]] + index
+        raise RuntimeError("Unsupported variable: %s" % variable)
+
+
+def find_vm_test_script(program_dir):
+    """
+    :return: The path of the VM emulator test script of program directory.
+    """
+    tst_paths = glob.glob(os.path.join(program_dir, "*" + VME_TST_SUFFIX))
+    if len(tst_paths) != 1:
+        raise RuntimeError("Expected single %s file at %s" % (VME_TST_SUFFIX,
+                                                              program_dir))
+    return tst_paths[0]
+
+
+def run_vm_test_script(tst_path):
+    """
+    Run single VM emulator test script.
+    :param tst_path: Path to *VME.tst file.
+    :return: ScriptResult (see hack_emulator.script).
+    """
+    return VMScriptRunner(tst_path).run()
@@ -21,12 +21,18 @@ NAND2TETRIS_TOOLS = os.environ.get("NAND2TETRIS_TOOLS", None)
 
 @pytest.fixture
 def cpu_emulator():
+    """
+    :return: callable which executes test script (.tst) and writes its
+    output file. Uses the java CPUEmulator when NAND2TETRIS_TOOLS is defined,
+    and the built in hack_emulator otherwise.
+    """
     if NAND2TETRIS_TOOLS is None:
-        pytest.skip("NAND2TETRIS_TOOLS environment variable not defined.")
+        from hack_emulator.script import run_test_script
+        return run_test_script
 
     cpu_emulator_bin = py.path.local(NAND2TETRIS_TOOLS).join("CPUEmulator.bat")
 
     if not cpu_emulator_bin.check(file=1):
         pytest.skip("CPUEmulator not found at %s" % cpu_emulator_bin)
 
-    return cpu_emulator_bin
\ No newline at end of file
+    return cpu_emulator_bin.sysexec
\ No newline at end of file
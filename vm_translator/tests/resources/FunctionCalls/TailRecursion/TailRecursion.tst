@@ -0,0 +1,12 @@
+// TailRecursion.asm is the result of translating both Main.vm and Sys.vm.
+
+load TailRecursion.asm,
+output-file TailRecursion.out,
+compare-to TailRecursion.cmp,
+output-list RAM[0]%D1.6.1 RAM[261]%D1.6.1;
+
+repeat 30000 {
+  ticktock;
+}
+
+output;
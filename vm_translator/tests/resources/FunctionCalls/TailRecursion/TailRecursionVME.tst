@@ -0,0 +1,12 @@
+load,  // Load all the VM files from the current directory
+output-file TailRecursion.out,
+compare-to TailRecursion.cmp,
+output-list RAM[0]%D1.6.1 RAM[261]%D1.6.1;
+
+set sp 261,
+
+repeat 2500 {
+  vmstep;
+}
+
+output;
@@ -0,0 +1,117 @@
+import pytest
+
+from vm_translator.call_graph import (split_functions, build_call_graph,
+                                      find_reachable_functions,
+                                      remove_dead_functions,
+                                      find_frame_pointers)
+from vm_translator.parser import parse_vm_file_content
+
+MAIN_VM = """
+function Sys.init 0
+call Main.main 0
+label LOOP
+goto LOOP
+function Main.main 0
+call Main.used 0
+return
+function Main.unused 0
+call Main.used 0
+call Main.unused 0
+return
+"""
+
+USED_VM = """
+function Main.used 0
+push constant 0
+return
+function Main.recursive 1
+call Main.recursive 0
+return
+"""
+
+
+def _programs():
+    return [("Main.vm", parse_vm_file_content(MAIN_VM)),
+            ("Used.vm", parse_vm_file_content(USED_VM))]
+
+
+def test_split_functions():
+    head, functions = split_functions(
+        parse_vm_file_content("push constant 1\n" + USED_VM))
+    assert head == parse_vm_file_content("push constant 1")
+    assert [name for name, _ in functions] == ["Main.used", "Main.recursive"]
+    assert functions[0][1] == parse_vm_file_content(
+        "function Main.used 0\npush constant 0\nreturn")
+
+
+def test_build_call_graph():
+    assert build_call_graph(_programs()) == {
+        "Sys.init": {"Main.main"},
+        "Main.main": {"Main.used"},
+        "Main.unused": {"Main.used", "Main.unused"},
+        "Main.used": set(),
+        "Main.recursive": {"Main.recursive"},
+    }
+
+
+@pytest.mark.parametrize(("roots", "expected_functions"),
+    [
+        (("Sys.init",), {"Sys.init", "Main.main", "Main.used"}),
+        (("Main.unused",), {"Main.unused", "Main.used"}),
+        (("Main.recursive", "Missing.function"), {"Main.recursive"}),
+    ])
+def test_find_reachable_functions(roots, expected_functions):
+    assert find_reachable_functions(build_call_graph(_programs()),
+                                    roots) == expected_functions
+
+
+def test_remove_dead_functions():
+    live_main = MAIN_VM.split("function Main.unused")[0]
+    live_used = USED_VM.split("function Main.recursive")[0]
+    assert remove_dead_functions(_programs()) == [
+        ("Main.vm", parse_vm_file_content(live_main)),
+        ("Used.vm", parse_vm_file_content(live_used)),
+    ]
+
+
+def test_remove_dead_functions_without_sys_init():
+    programs = [("Used.vm", parse_vm_file_content(USED_VM))]
+    assert remove_dead_functions(programs) == programs
+
+
+def test_find_frame_pointers():
+    programs = _programs() + [("Box.vm", parse_vm_file_content("""
+function Box.new 0
+push constant 2
+call Memory.alloc 1
+pop pointer 0
+push pointer 0
+return
+function Box.get 0
+push argument 0
+pop pointer 0
+push argument 1
+push this 0
+add
+pop pointer 1
+push that 0
+return
+function Box.peek 0
+push that 0
+call Box.new 0
+return
+"""))]
+    programs[0][1].extend(parse_vm_file_content(
+        "call Box.get 2\ncall Box.peek 0"))
+    assert find_frame_pointers(programs) == {
+        # Sys.init is called by the bootstrap code.
+        "Sys.init": ("THIS", "THAT"),
+        "Main.unused": (),
+        "Box.new": ("THIS",),
+        "Main.main": (),
+        "Main.used": (),
+        "Main.recursive": (),
+        "Box.get": ("THIS", "THAT"),
+        # Box.new restores THIS on return.
+        "Box.peek": (),
+    }
@@ -0,0 +1,155 @@
+import pytest
+
+from vm_translator.inliner import (inline_functions, find_inlinees,
+                                   has_balanced_stack)
+from vm_translator.interpreter import VMInterpreter
+from vm_translator.parser import parse_vm_file_content
+
+MAIN_VM = """
+function Sys.init 0
+push constant 7
+neg
+call Math.abs 1
+push constant 3
+call Math.abs 1
+add
+pop static 0
+push constant 2000
+pop pointer 0
+push constant 3000
+call Box.get 1
+pop static 1
+push pointer 0
+pop static 2
+push constant 4
+push constant 5
+call Box.sum 2
+pop static 3
+call Box.count 0
+pop static 4
+label LOOP
+goto LOOP
+"""
+
+MATH_VM = """
+function Math.abs 0
+push argument 0
+push constant 0
+lt
+if-goto NEGATIVE
+push argument 0
+return
+label NEGATIVE
+push argument 0
+neg
+return
+"""
+
+BOX_VM = """
+function Box.get 0
+push argument 0
+pop pointer 0
+push this 1
+return
+function Box.sum 1
+push argument 0
+push argument 1
+add
+pop local 0
+push local 0
+push local 0
+add
+return
+function Box.count 0
+push static 0
+push constant 1
+add
+pop static 0
+push static 0
+return
+function Box.forward 0
+push argument 0
+call Math.abs 1
+return
+function Box.halt 0
+label HALT
+goto HALT
+"""
+
+
+def _programs():
+    return [("Main.vm", parse_vm_file_content(MAIN_VM)),
+            ("Math.vm", parse_vm_file_content(MATH_VM)),
+            ("Box.vm", parse_vm_file_content(BOX_VM))]
+
+
+def _run(programs):
+    interpreter = VMInterpreter(programs)
+    interpreter.ram[3001] = 42
+    interpreter.bootstrap()
+    interpreter.run()
+    assert interpreter.halted
+    return interpreter
+
+
+@pytest.mark.parametrize(("body", "balanced"),
+    [
+        ("push constant 1\nreturn", True),
+        ("return", False),
+        ("push constant 1\npush constant 2\nreturn", False),
+        ("push constant 1", False),
+        ("pop temp 0\npush constant 1\nreturn", False),
+        (MATH_VM.split("\n", 2)[2], True),
+        ("goto END\nlabel END\npush constant 0\nreturn", True),
+        ("label LOOP\npush constant 0\nif-goto LOOP\npush constant 0\nreturn",
+         True),
+        ("push constant 0\nif-goto END\npush constant 1\nlabel END\n"
+         "push constant 0\nreturn", False),
+        ("push constant 0\ngoto END\npush constant 1\nlabel END\nreturn",
+         False),
+    ])
+def test_has_balanced_stack(body, balanced):
+    assert has_balanced_stack(parse_vm_file_content(body)) == balanced
+
+
+def test_find_inlinees():
+    inlinees = find_inlinees(_programs())
+    # Sys.init and Box.forward call other functions, Box.halt never
+    # returns.
+    assert sorted(inlinees) == ["Box.count", "Box.get", "Box.sum",
+                                "Math.abs"]
+    assert inlinees["Box.get"].pointers == {0}
+    assert inlinees["Box.sum"].locals == 1
+    assert inlinees["Box.count"].uses_static
+    assert sorted(find_inlinees(_programs(), max_size=4)) == ["Box.get"]
+
+
+def test_inline_functions():
+    inlined_programs = inline_functions(_programs())
+    calls = [instruction.function_name
+             for _, instructions in inlined_programs
+             for instruction in instructions if instruction.command == "call"]
+    # Box.count uses the statics of Box.vm.
+    assert calls == ["Box.count"]
+
+    expected = _run(_programs())
+    interpreter = _run(inlined_programs)
+    assert interpreter.ram[16:21] == expected.ram[16:21] == [10, 42, 2000,
+                                                           18, 1]
+    assert interpreter.call_counts["Math.abs"] == 0
+
+
+def test_sys_halt_is_not_inlined():
+    programs = [("Sys.vm", parse_vm_file_content("""
+function Sys.halt 0
+label WHILE_EXP0
+push constant 0
+not
+not
+if-goto WHILE_END0
+goto WHILE_EXP0
+label WHILE_END0
+push constant 0
+return
+"""))]
+    assert find_inlinees(programs) == {}
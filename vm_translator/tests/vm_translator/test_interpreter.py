@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from vm_translator.interpreter import VMInterpreter, load_vm_program, SP
+from vm_translator.parser import parse_vm_file_content
+from vm_translator.script import find_vm_test_script, run_vm_test_script
+
+
+def test_vm_test_script(vm_program):
+    result = run_vm_test_script(find_vm_test_script(vm_program))
+    assert result.passed, "Comparison failure at line %s" % result.failure_line
+
+
+def _run(program):
+    interpreter = VMInterpreter([("Main.vm", parse_vm_file_content(program))])
+    interpreter.ram[SP] = 256
+    interpreter.run()
+    assert interpreter.halted
+    return interpreter
+
+
+@pytest.mark.parametrize(("program", "expected_top"),
+    [
+        ("push constant 32767\npush constant 1\nadd", -32768),
+        ("push constant 0\npush constant 1\nsub\nneg", 1),
+        ("push constant 0\npush constant 32767\nsub\npush constant 1\nsub\n"
+         "neg", -32768),
+        ("push constant 3\npush constant 5\nlt", -1),
+        ("push constant 5\nnot", -6),
+        ("push constant 12\npush constant 10\nand\npush constant 1\nor", 9),
+    ])
+def test_arithmetic(program, expected_top):
+    interpreter = _run(program)
+    assert interpreter.ram[interpreter.ram[SP] - 1] == expected_top
+
+
+def test_static_and_flow():
+    interpreter = _run("""
+push constant 0
+pop static 0
+label LOOP
+push static 0
+push constant 1
+add
+pop static 1
+push static 1
+pop static 0
+push static 0
+push constant 10
+lt
+if-goto LOOP
+label END
+goto END
+""")
+    assert interpreter.ram[16] == 10
+    assert interpreter.ram[SP] == 256
+
+
+def test_call_counts():
+    program_dir = os.path.join(os.path.dirname(__file__), "..", "resources",
+                               "FunctionCalls", "FibonacciElement")
+    interpreter = load_vm_program(program_dir)
+    interpreter.bootstrap()
+    interpreter.run()
+
+    assert interpreter.halted
+    # fib(4)
+    assert interpreter.ram[interpreter.ram[SP] - 1] == 3
+    assert interpreter.call_counts == {"Sys.init": 1, "Main.fibonacci": 9}
+
+
+def test_unknown_function():
+    interpreter = VMInterpreter([("Main.vm", parse_vm_file_content(
+        "function Main.main 0\ncall Missing.function 0\nreturn"))])
+    with pytest.raises(RuntimeError):
+        interpreter.run()
@@ -1,8 +1,12 @@
+import pickle
+
 import py
 import pytest
 
+from vm_translator import consts
 from vm_translator.parser import (parse_instruction, parse_vm_file_content,
-                                  MemoryInstruction, ArithmeticInstruction)
+                                  declares_function, MemoryInstruction,
+                                  ArithmeticInstruction)
 
 
 @pytest.mark.parametrize(
@@ -10,7 +14,7 @@ from vm_translator.parser import (parse_instruction, parse_vm_file_content,
     [
         ("push constant 122", MemoryInstruction(command="push",
                                                segment="constant",
-                                               index="122")),
+                                               index=122)),
         ("eq", ArithmeticInstruction(command="eq"))
     ]
 )
@@ -18,6 +22,38 @@ def test_simple_content(instruction_line, expected_instruction):
     assert parse_instruction(instruction_line) == expected_instruction
 
 
+def test_instruction_record():
+    instruction = parse_instruction("pop local 3")
+    assert instruction.opcode == consts.OPCODES[consts.POP]
+    assert consts.COMMANDS[instruction.opcode] == instruction.command
+    assert repr(instruction) == \
+        "MemoryInstruction(command='pop', segment='local', index=3)"
+
+    replaced = instruction._replace(command=consts.PUSH)
+    assert replaced.opcode == consts.OPCODES[consts.PUSH]
+    assert replaced == parse_instruction("push local 3")
+    assert replaced != instruction
+    assert pickle.loads(pickle.dumps(instruction)) == instruction
+    assert len(set([instruction, parse_instruction("pop local 3")])) == 1
+
+
 def test_parse_files(vm_file):
     instructions = parse_vm_file_content(vm_file.read())
-    assert len(instructions) > 0
\ No newline at end of file
+    assert len(instructions) > 0
+
+
+def test_declares_function(vm_file):
+    instructions = parse_vm_file_content(vm_file.read())
+    declared = any(instruction.command == "function" and
+                   instruction.function_name == "Sys.init"
+                   for instruction in instructions)
+    assert declares_function(vm_file.strpath, "Sys.init") == declared
+
+
+def test_declares_function_ignores_comments(tmpdir):
+    vm_path = tmpdir.join("Sys.vm")
+    vm_path.write("// function Sys.init 0\n"
+                  "function Sys.initialize 0 // Sys.init\n"
+                  "return\n")
+    assert not declares_function(vm_path.strpath, "Sys.init")
+    assert declares_function(vm_path.strpath, "Sys.initialize")
@@ -0,0 +1,90 @@
+import pytest
+
+from vm_translator import consts
+from vm_translator.consts import (CONSTANT_ARITHMETIC, CONSTANT_UNARY, MOVE,
+                                  CONDITIONAL_GOTO)
+from vm_translator.optimizer import (optimize, PATTERNS,
+                                     ConstantArithmeticInstruction,
+                                     MoveInstruction,
+                                     ConditionalGotoInstruction,
+                                     TailCallInstruction)
+from vm_translator.parser import parse_vm_file_content, parse_instruction
+
+
+def _conditional_goto(comparison, jump, label):
+    return ConditionalGotoInstruction(command=consts.CONDITIONAL_GOTO,
+                                      comparison=comparison, jump=jump,
+                                      label=label)
+
+
+@pytest.mark.parametrize(("program", "expected_instructions"),
+    [
+        ("push constant 7\nadd",
+         [ConstantArithmeticInstruction(command=consts.CONSTANT_ARITHMETIC,
+                                        arithmetic=consts.ADD, value=7)]),
+        ("push constant 0\nnot", [parse_instruction("push constant -1")]),
+        ("push constant 5\nneg", [parse_instruction("push constant -5")]),
+        # Folded constant is not used by constant arithmetic.
+        ("push constant 0\nnot\nand",
+         [parse_instruction("push constant -1"), parse_instruction("and")]),
+        ("push local 1\npop that 0",
+         [MoveInstruction(command=consts.MOVE,
+                          source=parse_instruction("push local 1"),
+                          target=parse_instruction("pop that 0"))]),
+        ("push static 3\npop static 3", []),
+        ("if-goto A", [parse_instruction("if-goto A")]),
+        ("lt\nif-goto A", [_conditional_goto(consts.LT, "JLT", "A")]),
+        ("lt\nnot\nif-goto A", [_conditional_goto(consts.LT, "JGE", "A")]),
+        ("eq\nnot\nif-goto A", [_conditional_goto(consts.EQ, "JNE", "A")]),
+        ("not\nif-goto A", [_conditional_goto(consts.NOT, "JNE", "A")]),
+        ("if-goto A\ngoto B\nlabel A",
+         [_conditional_goto(None, "JEQ", "B"), parse_instruction("label A")]),
+        ("gt\nif-goto A\ngoto B\nlabel A",
+         [_conditional_goto(consts.GT, "JLE", "B"),
+          parse_instruction("label A")]),
+        ("gt\nnot\nif-goto A\ngoto B\nlabel A",
+         [_conditional_goto(consts.GT, "JGT", "B"),
+          parse_instruction("label A")]),
+        ("call Main.f 2\nreturn",
+         [TailCallInstruction(command=consts.TAIL_CALL,
+                              function_name="Main.f",
+                              number_of_arguments=2)]),
+        ("call Main.f 2\npop temp 0",
+         parse_vm_file_content("call Main.f 2\npop temp 0")),
+        # Labels in between are kept.
+        ("push local 0\nlabel A\npop local 1",
+         parse_vm_file_content("push local 0\nlabel A\npop local 1")),
+        ("if-goto A\ngoto B\nlabel C",
+         parse_vm_file_content("if-goto A\ngoto B\nlabel C")),
+    ])
+def test_optimize(program, expected_instructions):
+    assert optimize(parse_vm_file_content(program)) == expected_instructions
+
+
+SINGLE_PATTERN_PROGRAM = "push constant 0\nnot\nnot\nif-goto A"
+
+
+@pytest.mark.parametrize(("pattern", "expected_instructions"),
+    [
+        (CONSTANT_ARITHMETIC, parse_vm_file_content(SINGLE_PATTERN_PROGRAM)),
+        (CONSTANT_UNARY, parse_vm_file_content(
+            "push constant -1\nnot\nif-goto A")),
+        (MOVE, parse_vm_file_content(SINGLE_PATTERN_PROGRAM)),
+        (CONDITIONAL_GOTO, parse_vm_file_content("push constant 0\nnot") +
+            [_conditional_goto(consts.NOT, "JNE", "A")]),
+    ])
+def test_optimize_single_pattern(pattern, expected_instructions):
+    assert optimize(parse_vm_file_content(SINGLE_PATTERN_PROGRAM),
+                    patterns=[pattern]) == expected_instructions
+
+
+def test_optimize_all_patterns():
+    assert optimize(parse_vm_file_content(SINGLE_PATTERN_PROGRAM),
+                    patterns=PATTERNS) == [
+        parse_instruction("push constant -1"),
+        _conditional_goto(consts.NOT, "JNE", "A")]
+
+
+def test_unknown_pattern():
+    with pytest.raises(RuntimeError):
+        optimize([], patterns=["no-such-pattern"])
@@ -1,8 +1,48 @@
+import multiprocessing
+import os
+
 import py
+import pytest
+from hack_assembler.assembler import compile_file
+from hack_emulator.emulator import HackEmulator, parse_hack
 
-from vm_translator.main import translate_to_hack_given_path
+from vm_translator import code_generator
+from vm_translator.code_generator import CodeGenerator
+from vm_translator.consts import TAIL_CALL
+from vm_translator.inliner import MAX_INLINE_SIZE
+from vm_translator.main import translate_to_hack, translate_to_hack_given_path
+from vm_translator.optimizer import PATTERNS
+from vm_translator.parser import parse_vm_file_content
 
-def test_vm_translator(vm_program, cpu_emulator):
+@pytest.mark.parametrize(("options",),
+                         [
+                             (dict(),),
+                             (dict(shared_calls=True),),
+                             (dict(optimizations=PATTERNS),),
+                             (dict(remove_dead_functions=True),),
+                             (dict(cache_top=True),),
+                             (dict(cache_top=True, optimizations=PATTERNS),),
+                             (dict(track_sp=True),),
+                             (dict(track_sp=True, cache_top=True,
+                                   optimizations=PATTERNS),),
+                             (dict(inline_max_size=MAX_INLINE_SIZE),),
+                             (dict(inline_max_size=MAX_INLINE_SIZE,
+                                   remove_dead_functions=True, cache_top=True,
+                                   track_sp=True, optimizations=PATTERNS,
+                                   light_calls=True),),
+                             (dict(light_calls=True),),
+                             (dict(light_calls=True, shared_calls=True,
+                                   optimizations=PATTERNS),),
+                         ] + [(dict(optimizations=[pattern]),)
+                              for pattern in PATTERNS],
+                         ids=["default", "shared_calls", "optimize",
+                              "remove_dead_functions", "cache_top",
+                              "cache_top_optimize", "track_sp",
+                              "track_sp_cache_top_optimize", "inline",
+                              "inline_all", "light_calls",
+                              "light_calls_shared_calls_optimize"] +
+                             ["optimize_" + pattern for pattern in PATTERNS])
+def test_vm_translator(vm_program, cpu_emulator, options):
     vm_program_path = py.path.local(vm_program)
 
 
@@ -15,7 +55,7 @@ def test_vm_translator(vm_program, cpu_emulator):
     for out_path in vm_program_path.visit("*.out"):
         out_path.remove(ignore_errors=True)
 
-    translate_to_hack_given_path(input_path=vm_program)
+    translate_to_hack_given_path(input_path=vm_program, **options)
 
     assert len(list(vm_program_path.visit("*.asm"))), \
             ("Check that the program was translated successfully.")
@@ -26,8 +66,189 @@ def test_vm_translator(vm_program, cpu_emulator):
     assert tst_path.check(file = 1)
     assert cmp_path.check(file = 1)
 
-    cpu_emulator.sysexec(tst_path.strpath)
+    cpu_emulator(tst_path.strpath)
 
     out_path = vm_program_path.join(vm_program_path.basename + '.out')
     assert out_path.check(file=1), "Expected output file to be created"
-    assert out_path.read() == cmp_path.read(), "Expected output to be the same as .cmp"
\ No newline at end of file
+    assert out_path.read() == cmp_path.read(), "Expected output to be the same as .cmp"
+
+@pytest.mark.parametrize(("options",),
+                         [
+                             (dict(),),
+                             (dict(shared_calls=True),),
+                             (dict(remove_dead_functions=True),),
+                         ],
+                         ids=["default", "shared_calls",
+                              "remove_dead_functions"])
+def test_parallel_translation(vm_program, tmpdir, options):
+    vm_paths = sorted(py.path.local(vm_program).visit("*.vm"))
+    outputs = []
+    for processes in (1, 2, 2):
+        asm_path = tmpdir.join("%d.asm" % len(outputs))
+        translate_to_hack([vm_path.strpath for vm_path in vm_paths],
+                          asm_path.strpath, processes=processes, **options)
+        outputs.append(asm_path.read())
+
+    assert outputs[0] == outputs[1] == outputs[2]
+    # The files are translated apart, their labels must not collide.
+    labels = [line for line in outputs[0].splitlines()
+              if line.startswith("(")]
+    assert len(labels) == len(set(labels))
+
+
+@pytest.mark.parametrize(("options",),
+                         [
+                             (dict(),),
+                             (dict(shared_calls=True),),
+                         ],
+                         ids=["default", "shared_calls"])
+def test_chunked_output(vm_program, tmpdir, monkeypatch, options):
+    vm_paths = [vm_path.strpath for vm_path in
+                sorted(py.path.local(vm_program).visit("*.vm"))]
+    outputs = []
+    for chunk_lines in (code_generator.WRITE_CHUNK_LINES, 1, 7):
+        monkeypatch.setattr(code_generator, "WRITE_CHUNK_LINES", chunk_lines)
+        asm_path = tmpdir.join("%d.asm" % chunk_lines)
+        translate_to_hack(vm_paths, asm_path.strpath, processes=1, **options)
+        outputs.append(asm_path.read())
+
+    assert outputs[0] == outputs[1] == outputs[2]
+    assert "\n\n" not in outputs[0] and not outputs[0].endswith("\n")
+
+
+PUSH_D = ["@SP", "A=M", "M=D", "@SP", "M=M+1"]
+POP_D = ["@SP", "AM=M-1", "D=M"]
+
+
+@pytest.mark.parametrize(("vm_line", "expected_lines"),
+                         [
+                             ("push local 0", ["@LCL", "A=M", "D=M"] + PUSH_D),
+                             ("push argument 2",
+                              ["@ARG", "A=M+1", "A=A+1", "D=M"] + PUSH_D),
+                             ("push this 3",
+                              ["@THIS", "D=M", "@3", "A=D+A", "D=M"] + PUSH_D),
+                             ("push temp 3", ["@R8", "D=M"] + PUSH_D),
+                             ("push pointer 1", ["@THAT", "D=M"] + PUSH_D),
+                             ("pop local 0", POP_D + ["@LCL", "A=M", "M=D"]),
+                             ("pop that 5", POP_D + ["@THAT", "A=M+1"] +
+                              ["A=A+1"] * 4 + ["M=D"]),
+                             ("pop temp 7", POP_D + ["@R12", "M=D"]),
+                             ("pop pointer 0", POP_D + ["@THIS", "M=D"]),
+                             ("pop argument 6",
+                              ["@ARG", "D=M", "@6", "D=D+A", "@R13", "M=D"] +
+                              POP_D + ["@R13", "A=M", "M=D"]),
+                         ])
+def test_memory_access_code(vm_line, expected_lines):
+    generator = CodeGenerator()
+    generator.set_current_file("Main.vm")
+    for instruction in parse_vm_file_content(vm_line):
+        generator.process_instruction(instruction)
+    assert generator.get_file_code().assembly_lines == expected_lines
+
+
+TAIL_RECURSION_DIR = os.path.join(os.path.dirname(__file__), "..", "resources",
+                                  "FunctionCalls", "TailRecursion")
+
+
+@pytest.mark.parametrize(("options", "constant_depth"),
+                         [
+                             (dict(), False),
+                             (dict(optimizations=[TAIL_CALL]), True),
+                             (dict(optimizations=PATTERNS, cache_top=True,
+                                   track_sp=True, shared_calls=True), True),
+                             (dict(optimizations=[TAIL_CALL],
+                                   light_calls=True), True),
+                         ],
+                         ids=["calls", "tail_calls", "tail_calls_all",
+                              "tail_calls_light_calls"])
+def test_tail_call_stack_depth(tmpdir, options, constant_depth):
+    asm_path = tmpdir.join("TailRecursion.asm")
+    vm_paths = sorted(py.path.local(TAIL_RECURSION_DIR).visit("*.vm"))
+    translate_to_hack([vm_path.strpath for vm_path in vm_paths],
+                      asm_path.strpath, **options)
+    emulator = HackEmulator(parse_hack(compile_file(asm_path.strpath)))
+    emulator.run(30000)
+    assert emulator.ram[0] == 262 and emulator.ram[261] == 5050
+
+    # 150 calls deep, the frames reach far above the stack base unless
+    # they are reused.
+    stack_top = max(address for address in xrange(256, 2048)
+                    if emulator.ram[address])
+    assert (stack_top < 300) == constant_depth
+
+
+def _push_constant(value):
+    if value == -32768:
+        return "push constant 32767\nneg\npush constant 1\nsub\n"
+    if value < 0:
+        return "push constant %d\nneg\n" % -value
+    return "push constant %d\n" % value
+
+
+def _wrap(value):
+    return (value + 32768) % 65536 - 32768
+
+
+MULTIPLY_CASES = [(7, 6), (-3, 5), (123, -45), (-181, -181), (300, 300),
+                  (32767, 2), (-32768, 1), (0, -1), (1, -32768), (-1, -1)]
+ABS_CASES = [5, -5, 0, 32767, -32767, -32768]
+
+
+@pytest.mark.parametrize(("options",),
+                         [
+                             (dict(intrinsics=True),),
+                             (dict(intrinsics=True, cache_top=True),),
+                             (dict(intrinsics=True, optimizations=PATTERNS,
+                                   cache_top=True, track_sp=True,
+                                   shared_calls=True, light_calls=True,
+                                   inline_max_size=MAX_INLINE_SIZE),),
+                         ],
+                         ids=["intrinsics", "intrinsics_cache_top",
+                              "intrinsics_all"])
+def test_intrinsics(tmpdir, options):
+    # Without the intrinsics the calls would jump to undefined functions.
+    code = "function Sys.init 0\n"
+    expected = []
+    for x, y in MULTIPLY_CASES:
+        code += _push_constant(x) + _push_constant(y)
+        code += "call Math.multiply 2\npop static %d\n" % len(expected)
+        expected.append(_wrap(x * y))
+    for x in ABS_CASES:
+        code += _push_constant(x)
+        code += "call Main.abs 1\npop static %d\n" % len(expected)
+        expected.append(x if x > 0 else _wrap(-x))
+    for address, value in ((3000, 17), (3001, -2)):
+        code += _push_constant(address) + _push_constant(value)
+        code += "call Memory.poke 2\npop static %d\n" % len(expected)
+        code += _push_constant(address)
+        code += "call Memory.peek 1\npop static %d\n" % (len(expected) + 1)
+        expected.extend([0, value])
+    code += "label END\ngoto END\n"
+    # call and return, fused to tail call by the optimizer.
+    code += "function Main.abs 0\npush argument 0\ncall Math.abs 1\nreturn\n"
+
+    vm_path = tmpdir.join("Sys.vm")
+    vm_path.write(code)
+    asm_path = tmpdir.join("Sys.asm")
+    translate_to_hack([vm_path.strpath], asm_path.strpath, **options)
+    assert "@Math." not in asm_path.read()
+    emulator = HackEmulator(parse_hack(compile_file(asm_path.strpath)))
+    emulator.run(100000)
+    assert list(emulator.ram[16:16 + len(expected)]) == expected
+    assert list(emulator.ram[3000:3002]) == [17, -2]
+    assert emulator.ram[0] == 261
+
+
+def test_small_program_translated_without_pool(vm_program, tmpdir,
+                                               monkeypatch):
+    vm_paths = [vm_path.strpath for vm_path in
+                sorted(py.path.local(vm_program).visit("*.vm"))]
+    asm_path = tmpdir.join("Program.asm")
+    translate_to_hack(vm_paths, asm_path.strpath, processes=1)
+    expected = asm_path.read()
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("Small programs are translated without pool")
+    monkeypatch.setattr(multiprocessing, "Pool", no_pool)
+    translate_to_hack(vm_paths, asm_path.strpath)
+    assert asm_path.read() == expected